@@ -0,0 +1,104 @@
+import time
+import asyncio
+import traceback
+from typing import Any, Awaitable, Callable
+
+class BootstrapStage:
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    # A stage is skipped if any of its dependencies failed (or were skipped).
+    SKIPPED = "skipped"
+
+    def __init__(self, name: str, run: Callable[..., Awaitable[Any]], dependencies: list[str]):
+        self.name = name
+        self.run = run
+        self.dependencies = dependencies
+        self.status = self.PENDING
+        self.started_at: float | None = None
+        self.duration: float | None = None
+        self.error: str | None = None
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "dependencies": self.dependencies,
+            "status": self.status,
+            "started_at": self.started_at,
+            "duration": self.duration,
+            "error": self.error
+        }
+
+
+class Bootstrap:
+    """ Runs the backend's setup steps as a dependency graph. Each stage starts as soon as every stage
+    it depends on is done, so independent stages run concurrently. A stage is called with the results
+    of its dependencies as keyword arguments, e.g. a stage depending on "course" gets `course=...`. """
+    def __init__(self):
+        self.stages: dict[str, BootstrapStage] = {}
+        self.started_at: float | None = None
+        self.duration: float | None = None
+        self._tasks: dict[str, asyncio.Task] = {}
+
+    def add_stage(self, name: str, run: Callable[..., Awaitable[Any]], dependencies: list[str] = []) -> None:
+        for dependency in dependencies:
+            if dependency not in self.stages:
+                # Requiring dependencies to be added first also rules out cycles.
+                raise ValueError(f"Stage '{ name }' depends on unknown stage '{ dependency }'")
+        self.stages[name] = BootstrapStage(name, run, list(dependencies))
+
+    @property
+    def ready(self) -> bool:
+        return len(self.stages) > 0 and all(stage.status == BootstrapStage.DONE for stage in self.stages.values())
+
+    @property
+    def failed(self) -> bool:
+        return any(stage.status == BootstrapStage.FAILED for stage in self.stages.values())
+
+    async def _run_stage(self, stage: BootstrapStage):
+        dependency_results = {}
+        for dependency in stage.dependencies:
+            try:
+                dependency_results[dependency] = await self._tasks[dependency]
+            except Exception:
+                stage.status = BootstrapStage.SKIPPED
+                raise
+
+        stage.status = BootstrapStage.RUNNING
+        stage.started_at = time.time()
+        start = time.perf_counter()
+        try:
+            result = await stage.run(**dependency_results)
+        except Exception:
+            stage.status = BootstrapStage.FAILED
+            stage.error = traceback.format_exc()
+            raise
+        finally:
+            stage.duration = time.perf_counter() - start
+        stage.status = BootstrapStage.DONE
+        return result
+
+    async def run(self) -> dict[str, Any]:
+        """ Run every stage, returning their results by name. Raises the first failure, after every stage has settled. """
+        self.started_at = time.time()
+        start = time.perf_counter()
+        for name, stage in self.stages.items():
+            self._tasks[name] = asyncio.ensure_future(self._run_stage(stage))
+        try:
+            results = await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+        finally:
+            self.duration = time.perf_counter() - start
+
+        for stage, result in zip(self.stages.values(), results):
+            if stage.status == BootstrapStage.FAILED: raise result
+        return dict(zip(self.stages.keys(), results))
+
+    def to_dict(self) -> dict:
+        return {
+            "ready": self.ready,
+            "failed": self.failed,
+            "started_at": self.started_at,
+            "duration": self.duration,
+            "stages": [stage.to_dict() for stage in self.stages.values()]
+        }
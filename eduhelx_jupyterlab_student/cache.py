@@ -0,0 +1,220 @@
+import copy
+import json
+import time
+import asyncio
+import inspect
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Hashable, Iterable
+from eduhelx_utils.api import Api
+from .git import InvalidGitRepositoryException
+from .git_backend import get_backend as get_git_backend
+from .metrics import API_CALL_DURATION
+
+class TTLCache:
+    """ Simple in-memory cache where each entry expires after its own time-to-live. """
+    def __init__(self):
+        # key -> (expires_at, value)
+        self._entries: dict[Hashable, tuple[float, Any]] = {}
+        # Bumped by invalidation, so that fetches which started before it don't cache what they got.
+        # key (or name, see `invalidate`) -> generation
+        self._generations: dict[Hashable, int] = {}
+        self._clears = 0
+
+    def get(self, key: Hashable, default=None):
+        entry = self._entries.get(key)
+        if entry is None: return default
+        expires_at, value = entry
+        if time.monotonic() >= expires_at:
+            del self._entries[key]
+            return default
+        return value
+
+    def set(self, key: Hashable, value, ttl: float) -> None:
+        if ttl <= 0: return
+        self._entries[key] = (time.monotonic() + ttl, value)
+
+    def __contains__(self, key: Hashable) -> bool:
+        sentinel = object()
+        return self.get(key, sentinel) is not sentinel
+
+    def _get_generation(self, key: Hashable) -> tuple[int, int, int]:
+        name = key[0] if isinstance(key, tuple) else key
+        return (self._clears, self._generations.get(name, 0), self._generations.get(key, 0))
+
+    async def get_or_fetch(self, key: Hashable, ttl: float, fetch: Callable[[], Awaitable[Any]]):
+        sentinel = object()
+        value = self.get(key, sentinel)
+        if value is sentinel:
+            generation = self._get_generation(key)
+            value = await fetch()
+            # If the key was invalidated during the fetch, the value may predate whatever invalidated it.
+            if self._get_generation(key) == generation:
+                self.set(key, value, ttl)
+        return value
+
+    def invalidate(self, *keys: Hashable) -> None:
+        """ Invalidate the given keys. Tuple keys are also invalidated by their first element,
+        e.g. invalidate("get_my_submissions") drops ("get_my_submissions", <assignment_id>) for every assignment. """
+        for key in keys:
+            self._generations[key] = self._generations.get(key, 0) + 1
+        for key in list(self._entries.keys()):
+            name = key[0] if isinstance(key, tuple) else key
+            if key in keys or name in keys:
+                del self._entries[key]
+
+    def clear(self) -> None:
+        self._clears += 1
+        self._entries.clear()
+
+
+class SingleFlight:
+    """ Coalesces concurrent computations with the same key, so that callers asking for something that's
+    already being computed wait on the in-flight computation instead of starting their own.
+    Nothing is kept once the computation finishes; the next call after that starts a fresh one. """
+    def __init__(self):
+        self._in_flight: dict[Hashable, asyncio.Future] = {}
+
+    def __len__(self) -> int:
+        return len(self._in_flight)
+
+    async def run(self, key: Hashable, compute: Callable[[], Awaitable[Any]]):
+        future = self._in_flight.get(key)
+        if future is None:
+            future = self._in_flight[key] = asyncio.ensure_future(compute())
+            future.add_done_callback(lambda future: self._finish(key, future))
+        # One caller giving up (e.g. a long-polling client disconnecting) mustn't cancel the computation for the rest.
+        return await asyncio.shield(future)
+
+    def _finish(self, key: Hashable, future: asyncio.Future) -> None:
+        if self._in_flight.get(key) is future: del self._in_flight[key]
+        # Mark the exception as retrieved, in case every caller gave up before it finished.
+        if not future.cancelled(): future.exception()
+
+    def forget(self, *keys: Hashable) -> None:
+        """ Stop new callers from joining computations that may have started before something changed.
+        Keys are matched like `TTLCache.invalidate`. If no keys are given, forget everything. """
+        for key in list(self._in_flight.keys()):
+            name = key[0] if isinstance(key, tuple) else key
+            if len(keys) == 0 or key in keys or name in keys:
+                del self._in_flight[key]
+
+
+class CachedApi:
+    """ Wraps the grader API so that reads are served from memory for a per-endpoint TTL.
+    Writes are passed through to the API and invalidate any cached reads that they affect.
+    Anything that isn't explicitly wrapped here is passed straight through to the underlying API.
+
+    Note: cached values are deep-copied on the way out, since handlers freely mutate API responses. """
+    def __init__(self, api: Api, ttls: dict[str, float]):
+        self._api = api
+        self._ttls = ttls
+        self._cache = TTLCache()
+        # Concurrent reads of an endpoint that isn't cached yet share one request.
+        self._fetches = SingleFlight()
+
+    def __getattr__(self, name):
+        attr = getattr(self._api, name)
+        if not inspect.iscoroutinefunction(attr): return attr
+        async def timed_call(*args, **kwargs):
+            return await self._call(name, *args, **kwargs)
+        return timed_call
+
+    @property
+    def uncached(self) -> Api:
+        return self._api
+
+    def invalidate(self, *endpoints: str) -> None:
+        """ Invalidate cached reads by endpoint name. If no endpoints are given, invalidate everything. """
+        if len(endpoints) == 0: self._cache.clear()
+        else: self._cache.invalidate(*endpoints)
+        self._fetches.forget(*endpoints)
+
+    async def _call(self, endpoint: str, *args, **kwargs):
+        """ Call the underlying API, recording how long it takes. """
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            value = await getattr(self._api, endpoint)(*args, **kwargs)
+            outcome = "success"
+            return value
+        finally:
+            API_CALL_DURATION.observe(time.perf_counter() - start, method=endpoint, outcome=outcome)
+
+    async def _cached(self, endpoint: str, *args):
+        value = await self._cache.get_or_fetch(
+            (endpoint, *args),
+            self._ttls.get(endpoint, 0),
+            lambda: self._fetches.run((endpoint, *args), lambda: self._call(endpoint, *args))
+        )
+        return copy.deepcopy(value)
+
+    async def get_course(self):
+        return await self._cached("get_course")
+
+    async def get_my_user(self):
+        return await self._cached("get_my_user")
+
+    async def get_my_assignments(self):
+        return await self._cached("get_my_assignments")
+
+    async def get_my_submissions(self, assignment_id: int):
+        return await self._cached("get_my_submissions", assignment_id)
+
+    async def get_settings(self):
+        return await self._cached("get_settings")
+
+    async def create_submission(self, *args, **kwargs):
+        try:
+            return await self._call("create_submission", *args, **kwargs)
+        finally:
+            # Assignments carry the student's current attempt count, so they're stale after submitting too.
+            self.invalidate("get_my_submissions", "get_my_assignments")
+
+    async def mark_my_fork_as_cloned(self, *args, **kwargs):
+        try:
+            return await self._call("mark_my_fork_as_cloned", *args, **kwargs)
+        finally:
+            self.invalidate("get_my_user")
+
+
+class CommitInfoCache:
+    """ Persistent memo of commit metadata, keyed by commit id.
+    Commits are immutable, so entries never have to be invalidated. Only commits that
+    aren't memoized yet are looked up in git, and they're all looked up in one batch.
+
+    If some commits aren't in the repository (e.g. because its history is shallow), `fetch_missing`
+    is given a chance to fetch them before giving up. """
+    def __init__(self, memo_path: Path, fetch_missing: Callable[[list[str]], Awaitable[None]] | None = None):
+        self.memo_path = Path(memo_path)
+        self.fetch_missing = fetch_missing
+        self._memo: dict[str, dict] | None = None
+
+    def _load(self) -> dict[str, dict]:
+        if self._memo is None:
+            try:
+                self._memo = json.loads(self.memo_path.read_text())
+            except (OSError, ValueError):
+                self._memo = {}
+        return self._memo
+
+    def _save(self) -> None:
+        self.memo_path.parent.mkdir(parents=True, exist_ok=True)
+        # Write to a temporary file first so that a crash can't leave a truncated memo behind.
+        tmp_path = self.memo_path.with_name(self.memo_path.name + ".tmp")
+        tmp_path.write_text(json.dumps(self._memo))
+        tmp_path.replace(self.memo_path)
+
+    async def get_commit_infos(self, commit_ids: Iterable[str], path="./") -> dict[str, dict]:
+        commit_ids = list(commit_ids)
+        memo = self._load()
+        missing_ids = [commit_id for commit_id in commit_ids if commit_id not in memo]
+        if len(missing_ids) > 0:
+            try:
+                commit_infos = await get_git_backend().get_commit_infos(missing_ids, path=path)
+            except InvalidGitRepositoryException:
+                if self.fetch_missing is None: raise
+                await self.fetch_missing(missing_ids)
+                commit_infos = await get_git_backend().get_commit_infos(missing_ids, path=path)
+            memo.update(commit_infos)
+            self._save()
+        return { commit_id: copy.deepcopy(memo[commit_id]) for commit_id in commit_ids }
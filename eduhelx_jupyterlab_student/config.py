@@ -20,6 +20,23 @@ class Config:
     USER_AUTOGEN_PASSWORD: str = ""
     LOCAL: bool = False
     UPSTREAM_SYNC_INTERVAL: int = 60
+    # While the remotes stay idle, the sync interval is multiplied by this factor after each sync, up to the max interval.
+    UPSTREAM_SYNC_BACKOFF_FACTOR: float = 2
+    UPSTREAM_SYNC_MAX_INTERVAL: int = 600
+    # How many sync runs to keep in the sync journal (under .git/eduhelx in the student's repository).
+    SYNC_JOURNAL_MAX_ENTRIES: int = 500
+    # How to clone the student's repository: "full", "blobless" (file contents are only downloaded once they're needed),
+    # or "shallow" (only the last CLONE_DEPTH commits of history, which is deepened on demand when merging).
+    CLONE_STRATEGY: str = "full"
+    CLONE_DEPTH: int = 50
+    # Only check out the directories of the student's assignments (cone-mode sparse checkout),
+    # which is kept up to date as assignments are added or removed.
+    SPARSE_CHECKOUT: bool = False
+    # Directory of upstream mirrors maintained by `python -m eduhelx_jupyterlab_student.mirror`, e.g. on a volume shared
+    # by every student server on a node. Repositories borrow objects from their upstream's mirror (via git alternates),
+    # so they only download and store the student's own changes. The volume must stay mounted while this is set.
+    # Existing repositories start borrowing on the next server start, when their copies of the mirror's objects are repacked away.
+    SHARED_OBJECT_STORE_PATH: str = ""
     # Which credential helper to use in Git
     CREDENTIAL_HELPER: str = "store"
     # How far ahead of time the API should refresh the access token
@@ -29,6 +46,33 @@ class Config:
     LONG_POLLING_TIMEOUT_SECONDS: int = 60
     # For polling that depends on unobservable data, how long to sleep in between data fetches.
     LONG_POLLING_SLEEP_INTERVAL_SECONDS: int = 5
+    # How long to serve grader API reads from memory before refetching them (0 disables caching).
+    # Writes made through the extension (e.g. creating a submission) invalidate affected reads immediately.
+    COURSE_CACHE_TTL_SECONDS: int = 300
+    USER_CACHE_TTL_SECONDS: int = 60
+    ASSIGNMENTS_CACHE_TTL_SECONDS: int = 15
+    SUBMISSIONS_CACHE_TTL_SECONDS: int = 15
+    SETTINGS_CACHE_TTL_SECONDS: int = 300
+    # Without filesystem notifications (the watch extra), how long to serve `git status` from memory while the index
+    # and HEAD are unchanged. Edits to files the student hasn't staged show up once it expires (0 disables caching).
+    REPO_STATUS_CACHE_TTL_SECONDS: int = 5
+    # Maximum number of git processes the extension runs concurrently in the background.
+    MAX_CONCURRENT_GIT_PROCESSES: int = 4
+    # How long a local git command may run before it is killed.
+    GIT_TIMEOUT_SECONDS: int = 60
+    # How long a git command that talks to a remote (fetch, push) may run before it is killed.
+    GIT_NETWORK_TIMEOUT_SECONDS: int = 300
+    # How to read git repositories: "subprocess" runs git, "pygit2" reads them in-process with libgit2
+    # (requires the pygit2 extra). Commands that modify the repository always run git.
+    GIT_BACKEND: str = "subprocess"
+    # How often to recompute the state pushed to websocket clients. Clients are only sent state that has changed.
+    STATE_PUSH_INTERVAL_SECONDS: int = 2
+    # The largest student notebook that can be submitted (the whole notebook is sent to the grader API).
+    MAX_SUBMISSION_NOTEBOOK_BYTES: int = 50 * 1024 * 1024
+    # How many messages can be waiting to be written to a single websocket client before it's disconnected.
+    WEBSOCKET_QUEUE_MAX_MESSAGES: int = 100
+    # How many broadcast messages to keep for replaying to websocket clients when they reconnect.
+    WEBSOCKET_REPLAY_LOG_MAX_MESSAGES: int = 200
     
     """
     Map environment variables to class fields according to these rules:
@@ -84,7 +128,33 @@ class Config:
         if self.USER_AUTOGEN_PASSWORD and self.ACCESS_TOKEN:
             print("Warning: both password and identity token provided, defaulting to password auth...")
         return self.USER_AUTOGEN_PASSWORD != "" or self.ACCESS_TOKEN != ""
-        
+
+    @validator("clone strategy must be one of full, blobless or shallow")
+    def validate_clone_strategy(self) -> bool:
+        return self.CLONE_STRATEGY in ["full", "blobless", "shallow"]
+
+    @validator("clone depth must be positive")
+    def validate_clone_depth(self) -> bool:
+        return self.CLONE_DEPTH > 0
+
+    @validator("git backend must be one of subprocess or pygit2")
+    def validate_git_backend(self) -> bool:
+        return self.GIT_BACKEND in ["subprocess", "pygit2"]
+
+    @validator("max submission notebook size must be positive")
+    def validate_max_submission_notebook_bytes(self) -> bool:
+        return self.MAX_SUBMISSION_NOTEBOOK_BYTES > 0
+
+    @validator("websocket queue and replay log sizes must be positive")
+    def validate_websocket_queue_sizes(self) -> bool:
+        return self.WEBSOCKET_QUEUE_MAX_MESSAGES > 0 and self.WEBSOCKET_REPLAY_LOG_MAX_MESSAGES > 0
+
+
+    def process_CLONE_STRATEGY(self, value: str):
+        return value.lower()
+
+    def process_GIT_BACKEND(self, value: str):
+        return value.lower()
 
     """ Add a trailing slash to the URL if not present """
     def process_GRADER_API_URL(self, value: str):
@@ -0,0 +1,98 @@
+import re
+import posixpath
+
+def _translate_component(component: str) -> str:
+    """ Translate a single path component of a glob into a regex. Like fnmatch, but wildcards never match "/". """
+    i, n = 0, len(component)
+    regex = []
+    while i < n:
+        c = component[i]
+        i += 1
+        if c == "*":
+            regex.append("[^/]*")
+        elif c == "?":
+            regex.append("[^/]")
+        elif c == "[":
+            j = i
+            if j < n and component[j] == "!": j += 1
+            if j < n and component[j] == "]": j += 1
+            while j < n and component[j] != "]": j += 1
+            if j >= n:
+                # Unterminated character class, so the bracket is literal.
+                regex.append("\\[")
+                continue
+            chars = component[i:j].replace("\\", "\\\\")
+            if chars.startswith("!"): chars = "^" + chars[1:]
+            elif chars.startswith("^"): chars = "\\" + chars
+            regex.append(f"[{ chars }]")
+            i = j + 1
+        else:
+            regex.append(re.escape(c))
+    return "".join(regex)
+
+def translate_glob(pattern: str) -> str:
+    """ Translate a glob, relative to some directory, into a regex matching relative posix paths.
+    `*`, `?` and `[...]` match within a single path component, and a `**` component matches zero or
+    more directories. A trailing `**` matches everything beneath its directory. """
+    parts = [part for part in pattern.split("/") if part not in ("", ".")]
+    regex = ""
+    for i, part in enumerate(parts):
+        is_last = i == len(parts) - 1
+        if part == "**":
+            regex += ".*" if is_last else "(?:[^/]+/)*"
+        else:
+            regex += _translate_component(part) + ("" if is_last else "/")
+    return regex
+
+
+class AssignmentFileMatcher:
+    """ Matches repository paths against the `protected_files` and `overwritable_files` globs of every assignment.
+    The globs are compiled up front, so classifying a path doesn't have to walk the filesystem and works
+    just as well for paths that don't exist on disk (e.g. files deleted on one side of a merge). """
+    def __init__(self, assignments):
+        self._protected = self._compile(assignments, "protected_files")
+        self._overwritable = self._compile(assignments, "overwritable_files")
+
+    @staticmethod
+    def get_key(assignments) -> tuple:
+        """ Identifies the globs the matcher was compiled from. """
+        return tuple(
+            (assignment["directory_path"], tuple(assignment["protected_files"]), tuple(assignment["overwritable_files"]))
+            for assignment in assignments
+        )
+
+    @staticmethod
+    def _compile(assignments, field: str) -> re.Pattern | None:
+        patterns = []
+        for assignment in assignments:
+            directory_path = posixpath.normpath(assignment["directory_path"])
+            prefix = "" if directory_path == "." else re.escape(directory_path) + "/"
+            patterns += [prefix + translate_glob(glob_pattern) for glob_pattern in assignment[field]]
+        if len(patterns) == 0: return None
+        return re.compile("(?:" + "|".join(patterns) + r")\Z", re.DOTALL)
+
+    @staticmethod
+    def _match(regex: re.Pattern | None, path) -> bool:
+        if regex is None: return False
+        return regex.match(posixpath.normpath(str(path))) is not None
+
+    def is_protected(self, path) -> bool:
+        """ `path` is relative to the repository root. """
+        return self._match(self._protected, path)
+
+    def is_overwritable(self, path) -> bool:
+        """ `path` is relative to the repository root. """
+        return self._match(self._overwritable, path)
+
+
+_matcher_key: tuple | None = None
+_matcher: AssignmentFileMatcher | None = None
+
+def get_assignment_file_matcher(assignments) -> AssignmentFileMatcher:
+    """ Get a matcher for the assignments, which is only recompiled when their globs change. """
+    global _matcher_key, _matcher
+    key = AssignmentFileMatcher.get_key(assignments)
+    if key != _matcher_key:
+        _matcher = AssignmentFileMatcher(assignments)
+        _matcher_key = key
+    return _matcher
@@ -1,6 +1,9 @@
 import re
-from typing import List, Tuple
-from .process import execute
+import asyncio
+from typing import Dict, Iterable, List, Tuple
+import os
+import hashlib
+from .process import execute, execute_async, execute_to_file
 
 class GitException(Exception):
     pass
@@ -41,6 +44,43 @@ def get_commit_info(commit_id: str, path="./"):
         "committer_email": committer_email
     }
 
+def _get_commit_infos_cmd() -> List[str]:
+    # Fields are separated by the unit separator and records by NUL (-z), since commit messages can contain newlines.
+    fmt = "%H%x1f%an%x1f%ae%x1f%cn%x1f%ce%x1f%B"
+    return ["git", "log", "--no-walk=unsorted", "--ignore-missing", "--stdin", "-z", f"--format={ fmt }"]
+
+def _parse_commit_infos(out: str, commit_ids: List[str]) -> Dict[str, dict]:
+    infos_by_full_id = {}
+    for record in out.split("\0"):
+        if record == "": continue
+        [full_id, author_name, author_email, committer_name, committer_email, message] = record.split("\x1f", 5)
+        infos_by_full_id[full_id] = {
+            "message": message,
+            "author_name": author_name,
+            "author_email": author_email,
+            "committer_name": committer_name,
+            "committer_email": committer_email
+        }
+
+    commit_infos = {}
+    for commit_id in commit_ids:
+        full_id = next((full_id for full_id in infos_by_full_id if full_id.startswith(commit_id)), None)
+        if full_id is None:
+            # The commit doesn't exist in the repository.
+            raise InvalidGitRepositoryException()
+        commit_infos[commit_id] = { "id": commit_id, **infos_by_full_id[full_id] }
+    return commit_infos
+
+def get_commit_infos(commit_ids: Iterable[str], path="./") -> Dict[str, dict]:
+    """ Batched version of `get_commit_info`. Looks up every commit in a single `git log` process. """
+    commit_ids = list(dict.fromkeys(commit_ids))
+    if len(commit_ids) == 0: return {}
+
+    (out, err, exit_code) = execute(_get_commit_infos_cmd(), stdin_input="\n".join(commit_ids) + "\n", cwd=path)
+    if exit_code != 0:
+        raise InvalidGitRepositoryException()
+    return _parse_commit_infos(out, commit_ids)
+
 def get_head_commit_id(path="./") -> str:
     (out, err, exit_code) = execute(["git", "rev-parse", "HEAD"], cwd=path)
     if err != "":
@@ -64,17 +104,90 @@ def clone_repository(remote: str, path="./"):
     if last_line.startswith("fatal:"):
         raise GitException(last_line)
 
+def get_repo_name_from_url(remote_url: str) -> str:
+    """ Equivalent to `basename -s .git <remote_url>`, e.g. "repo" for "git@host:org/repo.git". """
+    name = os.path.basename(remote_url.rstrip("/"))
+    if name.endswith(".git") and name != ".git": name = name[:-len(".git")]
+    return name
+
 def get_repo_name(path="./") -> str:
     (out, err, exit_code) = execute(["git", "config", "--get", "remote.origin.url"], cwd=path)
     if out == "" or err != "":
         raise InvalidGitRepositoryException()
-    # Technically, a git remote URL can contain quotes, so it could break out of the quotations around `out`.
-    # However, since execute is not executing in shell mode, it can't perform command substitution so there isn't
-    # any risk involved here.
-    (out, err, exit_code) = execute(["basename", "-s", ".git", out])
-    if err != "":
+    return get_repo_name_from_url(out)
+
+def stash_create(path="./") -> str | None:
+    """ Create a stash commit of the tracked changes in the worktree and index without touching either
+    of them or the stash list. Returns None if there are no changes to stash. """
+    (out, err, exit_code) = execute(["git", "stash", "create"], cwd=path)
+    if exit_code != 0:
+        raise InvalidGitRepositoryException()
+    return out if out != "" else None
+
+def write_blob_to_file(rev: str, file_path: str, destination: str, path="./") -> int | None:
+    """ Stream the content of `file_path` (relative to the repository root) at `rev` into `destination`.
+    Returns the number of bytes written, or None if the file doesn't exist at `rev`. """
+    with open(destination, "wb") as f:
+        (err, exit_code) = execute_to_file(["git", "cat-file", "blob", f"{ rev }:{ file_path }"], f, cwd=path)
+    if exit_code != 0:
+        os.remove(destination)
+        return None
+    return os.path.getsize(destination)
+
+def hash_blob(content: bytes) -> str:
+    """ Compute the id git would give `content` as a blob (like `git hash-object`, without any filters). """
+    return hashlib.sha1(f"blob { len(content) }\0".encode("utf-8") + content).hexdigest()
+
+def _get_alternates_path(path) -> str:
+    return os.path.join(path, ".git", "objects", "info", "alternates")
+
+def get_alternates(path="./") -> List[str]:
+    """ Get the object directories that the repository borrows objects from. """
+    try:
+        with open(_get_alternates_path(path)) as f:
+            return [line for line in f.read().splitlines() if line != "" and not line.startswith("#")]
+    except FileNotFoundError:
+        return []
+
+def set_alternates(object_dirs: List[str], path="./"):
+    alternates_path = _get_alternates_path(path)
+    if len(object_dirs) == 0:
+        if os.path.exists(alternates_path): os.remove(alternates_path)
+        return
+    os.makedirs(os.path.dirname(alternates_path), exist_ok=True)
+    with open(alternates_path, "w") as f:
+        f.write("".join(f"{ object_dir }\n" for object_dir in object_dirs))
+
+def _get_local_config_path(path) -> str:
+    return os.path.join(path, ".git", "config")
+
+def get_local_config(path="./") -> Dict[str, List[str]]:
+    """ Read the repository's local config. Keys are normalized the way git normalizes them
+    (section and variable names lowercased), and map to every value set for them, in order.
+    The config file is read directly, so this also works on a repository that's only partially set up. """
+    (out, err, exit_code) = execute(["git", "config", "--file", _get_local_config_path(path), "--list", "-z"], cwd=path)
+    if exit_code != 0:
+        raise InvalidGitRepositoryException()
+
+    config = {}
+    for entry in out.split("\0"):
+        if entry == "": continue
+        # A key without a value (e.g. `[core] bare`) has no newline.
+        key, _, value = entry.partition("\n")
+        config.setdefault(key, []).append(value)
+    return config
+
+def set_local_config(key: str, values: List[str], path="./"):
+    """ Replace every value of `key` in the repository's local config with `values`. If `values` is empty, `key` is unset. """
+    config_path = _get_local_config_path(path)
+    (out, err, exit_code) = execute(["git", "config", "--file", config_path, "--unset-all", key], cwd=path)
+    # Exit code 5 means the key wasn't set to begin with.
+    if exit_code not in (0, 5):
         raise GitException(err)
-    return out
+    for value in values:
+        (out, err, exit_code) = execute(["git", "config", "--file", config_path, "--add", key, value], cwd=path)
+        if exit_code != 0:
+            raise GitException(err)
 
 def add_remote(remote_name: str, remote_url: str, path="./"):
     (out, err, exit_code) = execute(["git", "remote", "add", remote_name, remote_url], cwd=path)
@@ -106,4 +219,275 @@ def commit(summary: str, description: str | None = None, path="./") -> str:
 def push(remote_name: str, branch_name: str, path="./"):
     (out, err, exit_code) = execute(["git", "push", remote_name, branch_name], cwd=path)
     if exit_code != 0:
-        raise InvalidGitRepositoryException()
\ No newline at end of file
+        raise InvalidGitRepositoryException()
+
+
+""" Async variants of the helpers above. These don't block the event loop while git runs,
+so they should be preferred inside of request handlers and the background sync. """
+
+async def get_commit_infos_async(commit_ids: Iterable[str], path="./") -> Dict[str, dict]:
+    commit_ids = list(dict.fromkeys(commit_ids))
+    if len(commit_ids) == 0: return {}
+
+    (out, err, exit_code) = await execute_async(_get_commit_infos_cmd(), stdin_input="\n".join(commit_ids) + "\n", cwd=path)
+    if exit_code != 0:
+        raise InvalidGitRepositoryException()
+    return _parse_commit_infos(out, commit_ids)
+
+async def get_repo_root_async(path="./") -> str:
+    (root, err, exit_code) = await execute_async(["git", "rev-parse", "--show-toplevel"], cwd=path)
+    if exit_code != 0:
+        raise InvalidGitRepositoryException()
+    return root
+
+async def get_remote_async(name="origin", path="./") -> str:
+    (remote, err, exit_code) = await execute_async(["git", "remote", "get-url", name], cwd=path)
+    if exit_code != 0:
+        raise InvalidGitRepositoryException()
+    return remote
+
+async def get_head_commit_id_async(commit="HEAD", path="./") -> str:
+    (out, err, exit_code) = await execute_async(["git", "rev-parse", commit], cwd=path)
+    if exit_code != 0:
+        raise InvalidGitRepositoryException()
+    return out
+
+def _get_history_args(filter_spec: str | None, depth: int | None, deepen: int | None, unshallow: bool) -> List[str]:
+    history_args = []
+    if filter_spec is not None: history_args.append(f"--filter={ filter_spec }")
+    if depth is not None: history_args.append(f"--depth={ depth }")
+    if deepen is not None: history_args.append(f"--deepen={ deepen }")
+    if unshallow: history_args.append("--unshallow")
+    return history_args
+
+async def fetch_repository_async(
+    remote_name: str,
+    path="./",
+    timeout=None,
+    filter_spec: str | None = None,
+    depth: int | None = None,
+    deepen: int | None = None,
+    unshallow: bool = False
+):
+    history_args = _get_history_args(filter_spec, depth, deepen, unshallow)
+    (out, err, exit_code) = await execute_async(["git", "fetch", *history_args, remote_name], cwd=path, timeout=timeout)
+    if exit_code != 0:
+        raise GitException(err)
+
+async def set_promisor_remote_async(remote_name: str, filter_spec: str, path="./"):
+    """ Mark a remote as a promisor, which objects left out of a partial fetch are lazily fetched from.
+    git only does this by itself for the first remote fetched with a filter (extensions.partialclone). """
+    for key, value in [("promisor", "true"), ("partialclonefilter", filter_spec)]:
+        (out, err, exit_code) = await execute_async(["git", "config", f"remote.{ remote_name }.{ key }", value], cwd=path)
+        if exit_code != 0:
+            raise GitException(err)
+
+async def fetch_remotes_async(
+    remote_names: List[str],
+    path="./",
+    timeout=None,
+    filter_spec: str | None = None,
+    depth: int | None = None,
+    deepen: int | None = None,
+    unshallow: bool = False
+):
+    """ Fetch several remotes at once, taking about as long as the slowest one.
+    `filter_spec` (e.g. "blob:none") makes this a partial fetch, which also marks the remotes as promisors so
+    that later fetches reuse the filter. `depth`, `deepen` and `unshallow` control shallow history. """
+    if filter_spec is None and depth is None and deepen is None and not unshallow:
+        (out, err, exit_code) = await execute_async(
+            ["git", "fetch", f"--jobs={ len(remote_names) }", "--multiple", *remote_names],
+            cwd=path,
+            timeout=timeout
+        )
+        if exit_code != 0:
+            raise GitException(err)
+        return
+
+    # `git fetch --multiple` rejects filters and silently ignores depths, so each remote gets its own fetch.
+    if filter_spec is not None:
+        for remote_name in remote_names:
+            await set_promisor_remote_async(remote_name, filter_spec, path=path)
+    fetch_options = { "path": path, "timeout": timeout, "filter_spec": filter_spec, "depth": depth, "deepen": deepen, "unshallow": unshallow }
+    if depth is None and deepen is None and not unshallow:
+        await asyncio.gather(*[fetch_repository_async(remote_name, **fetch_options) for remote_name in remote_names])
+    else:
+        # Fetches that change the history each take .git/shallow.lock, so they can't overlap.
+        for remote_name in remote_names:
+            await fetch_repository_async(remote_name, **fetch_options)
+
+async def fetch_commits_async(remote_name: str, commit_ids: List[str], path="./", depth: int | None = None, timeout=None):
+    """ Fetch specific commits (by full id) from a remote, even if they aren't the tip of any branch. """
+    depth_args = [f"--depth={ depth }"] if depth is not None else []
+    (out, err, exit_code) = await execute_async(
+        ["git", "fetch", *depth_args, remote_name, *commit_ids],
+        cwd=path,
+        timeout=timeout
+    )
+    if exit_code != 0:
+        raise GitException(err)
+
+async def is_shallow_repository_async(path="./") -> bool:
+    (out, err, exit_code) = await execute_async(["git", "rev-parse", "--is-shallow-repository"], cwd=path)
+    if exit_code != 0:
+        raise InvalidGitRepositoryException()
+    return out == "true"
+
+async def get_blob_id_async(rev: str, file_path: str, path="./") -> str | None:
+    """ Get the blob id of `file_path` (relative to the repository root) at `rev`, or None if it doesn't exist there. """
+    (out, err, exit_code) = await execute_async(["git", "rev-parse", "--verify", "--quiet", f"{ rev }:{ file_path }"], cwd=path)
+    if exit_code != 0:
+        return None
+    return out
+
+async def get_merge_base_async(commit_a: str, commit_b: str, path="./") -> str | None:
+    """ Returns None if the commits have no common ancestor (in the history that's available locally). """
+    (out, err, exit_code) = await execute_async(["git", "merge-base", commit_a, commit_b], cwd=path)
+    if exit_code == 1:
+        return None
+    if exit_code != 0:
+        raise GitException(err)
+    return out
+
+async def is_ancestor_commit_async(descendant: str, ancestor: str, path="./") -> bool:
+    (out, err, exit_code) = await execute_async(["git", "merge-base", "--is-ancestor", ancestor, descendant], cwd=path)
+    if exit_code > 1:
+        raise GitException(err)
+    return exit_code == 0
+
+async def merge_tree_async(ours: str, theirs: str, path="./") -> Tuple[str, List[str]]:
+    """ Merge two commits in memory, without touching the index or worktree (requires git 2.38+).
+    Returns the id of the merged tree and the paths that conflicted, if any. With conflicts,
+    the tree contains conflict markers, so it shouldn't be committed. """
+    (out, err, exit_code) = await execute_async(
+        ["git", "merge-tree", "--write-tree", "--name-only", "--no-messages", "-z", ours, theirs],
+        cwd=path
+    )
+    if exit_code not in (0, 1):
+        raise GitException(err)
+    [tree_id, *conflicts] = [record for record in out.split("\0") if record != ""]
+    return tree_id, list(dict.fromkeys(conflicts))
+
+async def commit_tree_async(tree_id: str, parents: List[str], message: str, path="./") -> str:
+    parent_args = [arg for parent in parents for arg in ("-p", parent)]
+    (out, err, exit_code) = await execute_async(["git", "commit-tree", tree_id, *parent_args, "-m", message], cwd=path)
+    if exit_code != 0:
+        raise GitException(err)
+    return out
+
+async def get_changed_paths_async(old_tree: str, new_tree: str, path="./") -> List[str]:
+    """ Paths (relative to the repository root) that differ between two trees, or commits. """
+    (out, err, exit_code) = await execute_async(
+        ["git", "diff-tree", "-r", "--name-only", "--no-renames", "-z", old_tree, new_tree],
+        cwd=path
+    )
+    if exit_code != 0:
+        raise GitException(err)
+    return [record for record in out.split("\0") if record != ""]
+
+async def read_tree_async(old_tree: str, new_tree: str, path="./"):
+    """ Move the index and worktree from `old_tree` to `new_tree`, like a checkout that only writes the files that
+    differ between them. Fails without changing anything if that would overwrite local changes or untracked files. """
+    (out, err, exit_code) = await execute_async(["git", "read-tree", "-m", "-u", old_tree, new_tree], cwd=path)
+    if exit_code != 0:
+        raise GitException(err)
+
+async def update_ref_async(ref: str, new_value: str, old_value: str | None = None, message: str | None = None, path="./"):
+    """ Point `ref` at `new_value`. If `old_value` is given, fails unless the ref currently points at it. """
+    message_args = ["-m", message] if message is not None else []
+    old_value_args = [old_value] if old_value is not None else []
+    (out, err, exit_code) = await execute_async(["git", "update-ref", *message_args, ref, new_value, *old_value_args], cwd=path)
+    if exit_code != 0:
+        raise GitException(err)
+
+async def set_sparse_checkout_async(directories: List[str], path="./"):
+    """ Check out only the files in the repository root and beneath `directories` (cone mode). """
+    (out, err, exit_code) = await execute_async(["git", "sparse-checkout", "set", "--cone", "--", *directories], cwd=path)
+    if exit_code != 0:
+        raise GitException(err)
+
+async def disable_sparse_checkout_async(path="./"):
+    (out, err, exit_code) = await execute_async(["git", "sparse-checkout", "disable"], cwd=path)
+    if exit_code != 0:
+        raise GitException(err)
+
+async def repack_async(local=False, path="./", timeout=None):
+    """ Repack every object the repository can reach into its own object store, including objects
+    it currently borrows through alternates, so that the alternates can safely be removed.
+    If `local`, objects available through alternates are left out instead, dropping the repository's own copies of them. """
+    args = ["git", "repack", "-a", "-d"]
+    if local: args.append("-l")
+    (out, err, exit_code) = await execute_async(args, cwd=path, timeout=timeout)
+    if exit_code != 0:
+        raise GitException(err)
+
+async def get_remote_head_async(remote_name: str, branch_name: str, path="./", timeout=None) -> str | None:
+    """ Ask the remote for the commit its branch points to, without fetching anything.
+    Returns None if the branch doesn't exist on the remote. """
+    (out, err, exit_code) = await execute_async(
+        ["git", "ls-remote", "--heads", remote_name, f"refs/heads/{ branch_name }"],
+        cwd=path,
+        timeout=timeout
+    )
+    if exit_code != 0:
+        raise GitException(err)
+    if out == "": return None
+    return out.split()[0]
+
+async def get_modified_paths_async(untracked=False, path="./") -> List[dict]:
+    """ Paths are relative to the repository root. `modification_type` is the two-letter XY status code
+    from `git status --porcelain`, e.g. " M" or "??". Renamed paths are reported under their new name. """
+    untracked_args = ["--untracked-files=all"] if untracked else []
+    # --no-optional-locks stops status from refreshing (and thereby rewriting) the index.
+    (out, err, exit_code) = await execute_async(
+        ["git", "--no-optional-locks", "status", "--porcelain", "-z", *untracked_args],
+        cwd=path
+    )
+    if exit_code != 0:
+        raise InvalidGitRepositoryException()
+
+    modified_paths = []
+    records = iter(out.split("\0"))
+    for record in records:
+        if record == "": continue
+        modification_type, file_path = record[:2], record[3:]
+        # Renames and copies are followed by an extra record holding the original path.
+        if "R" in modification_type or "C" in modification_type: next(records, None)
+        modified_paths.append({ "path": file_path, "modification_type": modification_type })
+    return modified_paths
+
+async def checkout_tracking_branch_async(branch_name: str, remote_name: str, path="./"):
+    """ Check out a new local branch that tracks `branch_name` on `remote_name`. """
+    (out, err, exit_code) = await execute_async(
+        ["git", "checkout", "--track", f"{ remote_name }/{ branch_name }"],
+        cwd=path
+    )
+    if exit_code != 0:
+        raise GitException(err)
+
+async def stage_files_async(files: str | List[str], path="./") -> List[Tuple[str,]]:
+    if isinstance(files, str): files = [files]
+
+    (out, err, exit_code) = await execute_async(["git", "add", "--verbose", *files], cwd=path)
+    if exit_code != 0:
+        raise InvalidGitRepositoryException()
+
+    return [line.split(" ", 1) for line in out.splitlines()]
+
+async def commit_async(summary: str, description: str | None = None, path="./") -> str:
+    description_args = ["-m", description] if description is not None else []
+    (out, err, exit_code) = await execute_async(["git", "commit", "--allow-empty", "-m", summary, *description_args], cwd=path)
+    if exit_code != 0:
+        raise GitException(out or err)
+
+    return await get_head_commit_id_async(path=path)
+
+async def reset_async(target: str, path="./"):
+    (out, err, exit_code) = await execute_async(["git", "reset", target], cwd=path)
+    if exit_code != 0:
+        raise GitException(err)
+
+async def push_async(remote_name: str, branch_name: str, path="./", timeout=None):
+    (out, err, exit_code) = await execute_async(["git", "push", remote_name, branch_name], cwd=path, timeout=timeout)
+    if exit_code != 0:
+        raise GitException(err)
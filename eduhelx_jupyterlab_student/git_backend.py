@@ -0,0 +1,230 @@
+import os
+import asyncio
+from abc import ABC, abstractmethod
+from typing import Dict, Iterable, List
+from .git import (
+    GitException, InvalidGitRepositoryException, get_repo_name_from_url,
+    get_repo_root_async, get_remote_async, get_head_commit_id_async, get_commit_infos_async,
+    get_merge_base_async, is_ancestor_commit_async, is_shallow_repository_async, get_modified_paths_async
+)
+
+try:
+    import pygit2
+except ImportError:
+    pygit2 = None
+
+class GitBackend(ABC):
+    """ The read-only git operations that handlers and the sync run constantly.
+    Anything that changes the repository still runs the git CLI, see `git.py`. """
+    name: str = None
+
+    @abstractmethod
+    async def get_repo_root(self, path="./") -> str:
+        raise NotImplementedError()
+
+    @abstractmethod
+    async def get_remote(self, name="origin", path="./") -> str:
+        raise NotImplementedError()
+
+    async def get_repo_name(self, path="./") -> str:
+        return get_repo_name_from_url(await self.get_remote("origin", path=path))
+
+    @abstractmethod
+    async def rev_parse(self, rev="HEAD", path="./") -> str:
+        raise NotImplementedError()
+
+    @abstractmethod
+    async def get_commit_infos(self, commit_ids: Iterable[str], path="./") -> Dict[str, dict]:
+        """ Raises `InvalidGitRepositoryException` if any of the commits don't exist. """
+        raise NotImplementedError()
+
+    @abstractmethod
+    async def get_merge_base(self, commit_a: str, commit_b: str, path="./") -> str | None:
+        raise NotImplementedError()
+
+    @abstractmethod
+    async def is_ancestor(self, descendant: str, ancestor: str, path="./") -> bool:
+        """ A commit counts as its own ancestor, as with `git merge-base --is-ancestor`. """
+        raise NotImplementedError()
+
+    @abstractmethod
+    async def is_shallow(self, path="./") -> bool:
+        raise NotImplementedError()
+
+    @abstractmethod
+    async def get_modified_paths(self, untracked=False, path="./") -> List[dict]:
+        """ Same format as `get_modified_paths_async`. """
+        raise NotImplementedError()
+
+
+class SubprocessGitBackend(GitBackend):
+    """ Runs a git process per operation. """
+    name = "subprocess"
+
+    async def get_repo_root(self, path="./") -> str:
+        return await get_repo_root_async(path=path)
+
+    async def get_remote(self, name="origin", path="./") -> str:
+        return await get_remote_async(name, path=path)
+
+    async def rev_parse(self, rev="HEAD", path="./") -> str:
+        return await get_head_commit_id_async(rev, path=path)
+
+    async def get_commit_infos(self, commit_ids: Iterable[str], path="./") -> Dict[str, dict]:
+        return await get_commit_infos_async(commit_ids, path=path)
+
+    async def get_merge_base(self, commit_a: str, commit_b: str, path="./") -> str | None:
+        return await get_merge_base_async(commit_a, commit_b, path=path)
+
+    async def is_ancestor(self, descendant: str, ancestor: str, path="./") -> bool:
+        return await is_ancestor_commit_async(descendant, ancestor, path=path)
+
+    async def is_shallow(self, path="./") -> bool:
+        return await is_shallow_repository_async(path=path)
+
+    async def get_modified_paths(self, untracked=False, path="./") -> List[dict]:
+        return await get_modified_paths_async(untracked=untracked, path=path)
+
+
+class Pygit2GitBackend(GitBackend):
+    """ Reads repositories in-process through libgit2, so reads don't pay for starting a process.
+    Unlike `git status`, `get_modified_paths` doesn't detect renames: a staged rename is
+    reported as the deletion of the old path and the addition of the new one.
+    libgit2 doesn't support sparse checkouts, so their status is read with `git status` instead. """
+    name = "pygit2"
+
+    def __init__(self):
+        if pygit2 is None:
+            raise ImportError("The pygit2 git backend requires the pygit2 package")
+        # realpath of the path a repository was opened from -> repository
+        self._repositories: dict[str, "pygit2.Repository"] = {}
+
+    def _open(self, path) -> "pygit2.Repository":
+        path = os.path.realpath(path)
+        repository = self._repositories.get(path)
+        if repository is None:
+            git_dir = pygit2.discover_repository(path)
+            if git_dir is None:
+                raise InvalidGitRepositoryException()
+            repository = self._repositories[path] = pygit2.Repository(git_dir)
+        return repository
+
+    def _lookup_commit(self, repository: "pygit2.Repository", rev: str) -> "pygit2.Commit":
+        try:
+            return repository.revparse_single(rev).peel(pygit2.Commit)
+        except (KeyError, ValueError, pygit2.GitError):
+            raise InvalidGitRepositoryException()
+
+    async def get_repo_root(self, path="./") -> str:
+        repository = self._open(path)
+        if repository.workdir is None:
+            raise InvalidGitRepositoryException()
+        return repository.workdir.rstrip("/")
+
+    async def get_remote(self, name="origin", path="./") -> str:
+        try:
+            return self._open(path).remotes[name].url
+        except KeyError:
+            raise InvalidGitRepositoryException()
+
+    async def rev_parse(self, rev="HEAD", path="./") -> str:
+        return str(self._lookup_commit(self._open(path), rev).id)
+
+    async def get_commit_infos(self, commit_ids: Iterable[str], path="./") -> Dict[str, dict]:
+        repository = self._open(path)
+        commit_infos = {}
+        for commit_id in dict.fromkeys(commit_ids):
+            commit = self._lookup_commit(repository, commit_id)
+            commit_infos[commit_id] = {
+                "id": commit_id,
+                "message": commit.message,
+                "author_name": commit.author.name,
+                "author_email": commit.author.email,
+                "committer_name": commit.committer.name,
+                "committer_email": commit.committer.email
+            }
+        return commit_infos
+
+    async def get_merge_base(self, commit_a: str, commit_b: str, path="./") -> str | None:
+        repository = self._open(path)
+        try:
+            merge_base = repository.merge_base(
+                self._lookup_commit(repository, commit_a).id,
+                self._lookup_commit(repository, commit_b).id
+            )
+        except pygit2.GitError as e:
+            raise GitException(str(e))
+        return str(merge_base) if merge_base is not None else None
+
+    async def is_ancestor(self, descendant: str, ancestor: str, path="./") -> bool:
+        repository = self._open(path)
+        descendant_id = self._lookup_commit(repository, descendant).id
+        ancestor_id = self._lookup_commit(repository, ancestor).id
+        return descendant_id == ancestor_id or repository.descendant_of(descendant_id, ancestor_id)
+
+    async def is_shallow(self, path="./") -> bool:
+        return self._open(path).is_shallow
+
+    @staticmethod
+    def _get_modification_type(flags: int) -> str:
+        """ Translate libgit2 status flags into the XY code of `git status --porcelain`. """
+        if flags & pygit2.GIT_STATUS_CONFLICTED: return "UU"
+        if flags & pygit2.GIT_STATUS_WT_NEW and not flags & pygit2.GIT_STATUS_INDEX_NEW: return "??"
+        index_code = " "
+        if flags & pygit2.GIT_STATUS_INDEX_NEW: index_code = "A"
+        elif flags & pygit2.GIT_STATUS_INDEX_MODIFIED: index_code = "M"
+        elif flags & pygit2.GIT_STATUS_INDEX_DELETED: index_code = "D"
+        elif flags & pygit2.GIT_STATUS_INDEX_RENAMED: index_code = "R"
+        elif flags & pygit2.GIT_STATUS_INDEX_TYPECHANGE: index_code = "T"
+        worktree_code = " "
+        if flags & pygit2.GIT_STATUS_WT_MODIFIED: worktree_code = "M"
+        elif flags & pygit2.GIT_STATUS_WT_DELETED: worktree_code = "D"
+        elif flags & pygit2.GIT_STATUS_WT_RENAMED: worktree_code = "R"
+        elif flags & pygit2.GIT_STATUS_WT_TYPECHANGE: worktree_code = "T"
+        return index_code + worktree_code
+
+    @classmethod
+    def _get_modified_paths(cls, git_dir: str, untracked: bool) -> List[dict]:
+        # Status has to hash every file that looks modified, so it runs on its own repository handle in a thread.
+        repository = pygit2.Repository(git_dir)
+        status = repository.status(untracked_files="all" if untracked else "normal")
+        return [
+            { "path": file_path, "modification_type": cls._get_modification_type(flags) }
+            for file_path, flags in status.items()
+            if not flags & pygit2.GIT_STATUS_IGNORED
+        ]
+
+    @staticmethod
+    def _is_sparse_checkout(repository: "pygit2.Repository") -> bool:
+        try:
+            return repository.config.get_bool("core.sparseCheckout")
+        except KeyError:
+            return False
+
+    async def get_modified_paths(self, untracked=False, path="./") -> List[dict]:
+        repository = self._open(path)
+        if self._is_sparse_checkout(repository):
+            # libgit2 ignores the skip-worktree flag, so every file outside of the sparse checkout would look deleted.
+            return await get_modified_paths_async(untracked=untracked, path=path)
+        return await asyncio.to_thread(self._get_modified_paths, repository.path, untracked)
+
+
+GIT_BACKENDS = {
+    SubprocessGitBackend.name: SubprocessGitBackend,
+    Pygit2GitBackend.name: Pygit2GitBackend
+}
+
+# Overridden by `configure` once the extension config is loaded.
+_backend: GitBackend = SubprocessGitBackend()
+
+def configure(backend_name: str) -> GitBackend:
+    global _backend
+    try:
+        _backend = GIT_BACKENDS[backend_name]()
+    except ImportError as e:
+        print(f"Can't use the { backend_name } git backend ({ e }), falling back to { SubprocessGitBackend.name }")
+        _backend = SubprocessGitBackend()
+    return _backend
+
+def get_backend() -> GitBackend:
+    return _backend
@@ -5,10 +5,13 @@ import requests
 import subprocess
 import tempfile
 import shutil
+import filecmp
 import tornado
 import time
 import asyncio
 import traceback
+import hashlib
+import posixpath
 from urllib.parse import urlparse
 from jupyter_server.base.handlers import APIHandler, JupyterHandler
 from jupyter_server.base.websocket import WebSocketMixin as WSMixin
@@ -18,20 +21,38 @@ from jupyter_server.utils import url_path_join
 from pathlib import Path
 from datetime import datetime
 from collections.abc import Iterable
+from typing import Awaitable, Callable
 from .config import ExtensionConfig
+from .cache import CachedApi, CommitInfoCache, SingleFlight
+from .notebook_index import NotebookIndex
+from .repo_status import RepoStatusCache
+from .watcher import TreeWatcher
+from .file_matcher import AssignmentFileMatcher, get_assignment_file_matcher
+from .submission_jobs import SubmissionJob, SubmissionJobQueue, SubmissionInProgressException, get_error_message
+from .git import (
+    stage_files_async, commit_async, reset_async, push_async, stash_create, write_blob_to_file,
+    get_remote_head_async, get_local_config, set_local_config, fetch_remotes_async,
+    fetch_commits_async, checkout_tracking_branch_async, merge_tree_async, commit_tree_async,
+    get_changed_paths_async, read_tree_async, update_ref_async, set_sparse_checkout_async,
+    disable_sparse_checkout_async, get_alternates, set_alternates, repack_async, hash_blob,
+    get_blob_id_async, GitException
+)
+from .mirror import get_mirror_path, get_mirror_object_dir
+from .git_backend import configure as configure_git_backend, get_backend as get_git_backend
+from .process import configure as configure_processes, execute_async
+from .metrics import REGISTRY as METRICS_REGISTRY, Gauge, HANDLER_DURATION, WEBSOCKET_MESSAGES
+from .sync_journal import SyncRun, SyncJournal
+from .bootstrap import Bootstrap
+from .websocket_queue import EventLog, ClientQueue, OutboundMessage, QueueOverflowError
 from eduhelx_utils.git import (
     InvalidGitRepositoryException,
-    clone_repository, fetch_repository, init_repository,
-    get_tail_commit_id, get_repo_name, add_remote,
-    stage_files, commit, push, get_commit_info,
-    get_modified_paths, get_repo_root as get_git_repo_root,
-    checkout, reset as git_reset, get_head_commit_id, merge as git_merge,
-    abort_merge, delete_local_branch, is_ancestor_commit,
+    clone_repository, init_repository,
+    get_tail_commit_id, add_remote, commit, get_modified_paths,
+    checkout, merge as git_merge, abort_merge, delete_local_branch,
     stash_changes, pop_stash, diff_status as git_diff_status,
     restore as git_restore, rm as git_rm
 )
 from eduhelx_utils.api import Api, AuthType, APIException
-from eduhelx_utils.process import execute
 from .student_repo import StudentClassRepo, NotStudentClassRepositoryException
 from ._version import __version__
 
@@ -46,21 +67,108 @@ class AppContext:
         )
         # If autogen password happens to be set (e.g. if running locally), then use it for convenience.
         if self.config.USER_AUTOGEN_PASSWORD != "":
-            self.api = Api(
+            api = Api(
                 **api_config,
                 user_autogen_password=self.config.USER_AUTOGEN_PASSWORD,
                 auth_type=AuthType.PASSWORD
             )
         else:
-            self.api = Api(
+            api = Api(
                 **api_config,
                 appstore_access_token=self.config.ACCESS_TOKEN,
                 auth_type=AuthType.APPSTORE_STUDENT
             )
+        # Handlers are polled constantly, so serve their API reads from memory where possible.
+        self.api = CachedApi(api, ttls={
+            "get_course": self.config.COURSE_CACHE_TTL_SECONDS,
+            "get_my_user": self.config.USER_CACHE_TTL_SECONDS,
+            "get_my_assignments": self.config.ASSIGNMENTS_CACHE_TTL_SECONDS,
+            "get_my_submissions": self.config.SUBMISSIONS_CACHE_TTL_SECONDS,
+            "get_settings": self.config.SETTINGS_CACHE_TTL_SECONDS
+        })
+        self._commit_info_caches: dict[Path, CommitInfoCache] = {}
+        # Shared by everything that needs to know when the repository's worktree changes.
+        self._tree_watchers: dict[Path, TreeWatcher] = {}
+        self._notebook_indices: dict[Path, NotebookIndex] = {}
+        self._repo_status_caches: dict[Path, RepoStatusCache] = {}
+        self._sync_journals: dict[Path, SyncJournal] = {}
+        self._repo_locks: dict[Path, asyncio.Lock] = {}
+        # Handler values are requested by every poller in every open tab, often at the same moment.
+        self.computations = SingleFlight()
+        self.bootstrap = Bootstrap()
+        self.websocket_events = EventLog(self.config.WEBSOCKET_REPLAY_LOG_MAX_MESSAGES)
+        self.state_publisher = StatePublisher(self.config.STATE_PUSH_INTERVAL_SECONDS)
+        self.submission_jobs = SubmissionJobQueue(on_progress=lambda job: WebsocketHandler.emit({
+            "type": "submission",
+            "job": job.to_dict()
+        }, coalesce_key=("submission", job.id)))
+        # The upstream head that was last fully merged into the student's repo by the sync loop.
+        self.synced_upstream_head: str | None = None
+        configure_processes(
+            max_concurrent_processes=self.config.MAX_CONCURRENT_GIT_PROCESSES,
+            default_timeout=self.config.GIT_TIMEOUT_SECONDS
+        )
+        configure_git_backend(self.config.GIT_BACKEND)
 
     async def get_repo_root(self):
         course = await self.api.get_course()
         return StudentClassRepo._compute_repo_root(course["name"])
+
+    async def get_commit_infos(self, commit_ids, repo_root) -> dict[str, dict]:
+        repo_root = Path(repo_root).resolve()
+        if repo_root not in self._commit_info_caches:
+            memo_path = repo_root / ".git" / "eduhelx" / "commit-info.json"
+            fetch_missing = None
+            if self.config.CLONE_STRATEGY == "shallow":
+                # Submissions made before the start of the shallow history have to be fetched on demand.
+                fetch_missing = lambda commit_ids: fetch_commits_async(
+                    StudentClassRepo.ORIGIN_REMOTE_NAME,
+                    commit_ids,
+                    path=repo_root,
+                    depth=1,
+                    timeout=self.config.GIT_NETWORK_TIMEOUT_SECONDS
+                )
+            self._commit_info_caches[repo_root] = CommitInfoCache(memo_path, fetch_missing=fetch_missing)
+        return await self._commit_info_caches[repo_root].get_commit_infos(commit_ids, path=repo_root)
+
+    def get_tree_watcher(self, repo_root) -> TreeWatcher:
+        repo_root = Path(repo_root).resolve()
+        if repo_root not in self._tree_watchers:
+            self._tree_watchers[repo_root] = TreeWatcher(repo_root)
+        return self._tree_watchers[repo_root]
+
+    def get_notebook_index(self, repo_root) -> NotebookIndex:
+        repo_root = Path(repo_root).resolve()
+        if repo_root not in self._notebook_indices:
+            self._notebook_indices[repo_root] = NotebookIndex(repo_root, self.get_tree_watcher(repo_root))
+        notebook_index = self._notebook_indices[repo_root]
+        notebook_index.refresh()
+        return notebook_index
+
+    def get_repo_status(self, repo_root) -> RepoStatusCache:
+        repo_root = Path(repo_root).resolve()
+        if repo_root not in self._repo_status_caches:
+            self._repo_status_caches[repo_root] = RepoStatusCache(
+                repo_root,
+                self.get_tree_watcher(repo_root),
+                ttl_seconds=self.config.REPO_STATUS_CACHE_TTL_SECONDS
+            )
+        return self._repo_status_caches[repo_root]
+
+    def get_repo_lock(self, repo_root) -> asyncio.Lock:
+        """ Held by anything that modifies the repository's refs, index or worktree (submissions and the sync),
+        since git runs asynchronously and their commands would otherwise interleave. """
+        repo_root = Path(repo_root).resolve()
+        if repo_root not in self._repo_locks:
+            self._repo_locks[repo_root] = asyncio.Lock()
+        return self._repo_locks[repo_root]
+
+    def get_sync_journal(self, repo_root) -> SyncJournal:
+        repo_root = Path(repo_root).resolve()
+        if repo_root not in self._sync_journals:
+            journal_path = repo_root / ".git" / "eduhelx" / "sync-journal.jsonl"
+            self._sync_journals[repo_root] = SyncJournal(journal_path, self.config.SYNC_JOURNAL_MAX_ENTRIES)
+        return self._sync_journals[repo_root]
         
 
 class BaseHandler(APIHandler):
@@ -74,6 +182,22 @@ class BaseHandler(APIHandler):
     def api(self) -> Api:
         return self.context.api
 
+    def prepare(self, *args, **kwargs):
+        self._request_start_time = time.perf_counter()
+        return super().prepare(*args, **kwargs)
+
+    def on_finish(self):
+        # Websocket connections never go through prepare, so they aren't timed.
+        start_time = getattr(self, "_request_start_time", None)
+        if start_time is not None:
+            HANDLER_DURATION.observe(
+                time.perf_counter() - start_time,
+                handler=type(self).__name__,
+                method=self.request.method,
+                status=self.get_status()
+            )
+        super().on_finish()
+
     # Default error handling
     def write_error(self, status_code, **kwargs):
         # If exc_info is present, the error is unhandled.
@@ -95,8 +219,14 @@ class BaseHandler(APIHandler):
             self.finish(exc.response.text)
     
 class WebsocketHandler(WSMixin, WSHandler, BaseHandler):
+    """ Every client has its own bounded outbound queue (see `ClientQueue`). Broadcast events are sequenced
+    and logged, so a client reconnecting with `?epoch=...&last_seq=...` is replayed the events it missed. """
     clients = []
-    queued_messages = []
+
+    def initialize(self, *args, **kwargs):
+        super().initialize(*args, **kwargs)
+        # Only created once the client is authenticated in `open`.
+        self.outbound: ClientQueue | None = None
 
     def check_origin(self, origin):
         return True
@@ -115,28 +245,112 @@ class WebsocketHandler(WSMixin, WSHandler, BaseHandler):
 
     @ws_authenticated
     async def open(self):
+        events = self.context.websocket_events
+        self.outbound = ClientQueue(self.write_message, self.config.WEBSOCKET_QUEUE_MAX_MESSAGES)
         if self not in self.clients: self.clients.append(self)
-        while len(self.queued_messages) > 0:
-            message = self.queued_messages.pop()
-            self.emit(*message[0], **message[1])
+
+        epoch = self.get_query_argument("epoch", None)
+        last_seq = self.get_query_argument("last_seq", None)
+        if epoch == events.epoch and last_seq is not None and last_seq.isdigit():
+            missed_messages, missed = events.get_messages_after(int(last_seq))
+        else:
+            # A new client (or one from before a server restart) only gets what was emitted while nobody was connected.
+            missed_messages, missed = events.get_messages_after(events.delivered_seq)
+            missed = False
+        events.delivered_seq = events.seq
+        # `missed` tells the client that some of the events it missed are no longer in the replay log.
+        self.send(OutboundMessage({ "type": "hello", "epoch": events.epoch, "missed": missed }))
+        for outbound in missed_messages:
+            self.send(outbound)
+
+    def send(self, outbound: OutboundMessage) -> None:
+        if self not in self.clients: return
+        try:
+            self.outbound.put(outbound)
+        except QueueOverflowError:
+            # Rather than drop messages, drop the client. It resumes from the last message it got once it reconnects.
+            WEBSOCKET_MESSAGES.inc(delivery="dropped")
+            self._disconnect()
+            self.close(1013, "Outbound message queue overflowed")
 
     def on_message(self, message):
-        print("message", message)
+        try:
+            data = json.loads(message)
+        except ValueError:
+            print("Received malformed websocket message", message)
+            return
+        if data.get("type") == "subscribe":
+            self.context.state_publisher.subscribe(self, data.get("path"), data.get("versions"))
 
     def on_close(self):
+        self._disconnect()
+
+    def _disconnect(self):
         if self in self.clients: self.clients.remove(self)
+        if self.outbound is not None: self.outbound.close()
+        self.context.state_publisher.unsubscribe(self)
 
     @classmethod
-    def emit(cls, *args, **kwargs):
+    def emit(cls, message: dict, coalesce_key=None, merge: Callable[[dict, dict], dict] | None = None):
+        """ Broadcast `message` to every client. A message with a `coalesce_key` supersedes any message with the
+        same key that a client hasn't been sent yet, either replacing it or, if given, combined with it by `merge`. """
+        events = cls.context.websocket_events
+        outbound = events.append(message, coalesce_key, merge)
         if len(cls.clients) == 0:
-            cls.queued_messages.append((args, kwargs))
-        for client in cls.clients:
-            client.write_message(*args, **kwargs)
+            WEBSOCKET_MESSAGES.inc(delivery="queued")
+            return
+        events.delivered_seq = outbound.seq
+        for client in list(cls.clients):
+            client.send(outbound)
+
+Gauge("eduhelx_websocket_clients", "Connected websocket clients", lambda: len(WebsocketHandler.clients))
+Gauge(
+    "eduhelx_websocket_queued_messages",
+    "Messages waiting to be written to websocket clients",
+    lambda: sum(len(client.outbound) for client in WebsocketHandler.clients)
+)
+Gauge(
+    "eduhelx_websocket_replay_log_messages",
+    "Broadcast messages kept for replaying to reconnecting websocket clients",
+    lambda: len(BaseHandler.context.websocket_events) if BaseHandler.context is not None else 0
+)
+
+class LongPollingHandler(BaseHandler):
+    """ Holds a request open until its value no longer matches the version that the client already has,
+    or until LONG_POLLING_TIMEOUT_SECONDS have passed. Changes we're notified of (e.g. submissions and
+    upstream syncs) are picked up immediately, everything else is re-checked every LONG_POLLING_SLEEP_INTERVAL_SECONDS. """
+    client_disconnected = False
+
+    def on_connection_close(self):
+        self.client_disconnected = True
+
+    async def long_poll(self, get_value: Callable[[], Awaitable[str]]):
+        client_version = self.get_argument("version", None)
+        deadline = time.monotonic() + self.config.LONG_POLLING_TIMEOUT_SECONDS
+        while True:
+            value = await get_value()
+            version = get_state_version(value)
+            remaining = deadline - time.monotonic()
+            if version != client_version or remaining <= 0: break
+            await self.context.state_publisher.wait_for_change(
+                min(self.config.LONG_POLLING_SLEEP_INTERVAL_SECONDS, remaining)
+            )
+            if self.client_disconnected: return
+
+        self.finish(json.dumps({
+            "version": version,
+            "value": json.loads(value)
+        }))
 
 class CourseAndStudentHandler(BaseHandler):
-    async def get_value(self):
-        student = await self.api.get_my_user()
-        course = await self.api.get_course()
+    @classmethod
+    async def get_value(cls):
+        return await cls.context.computations.run("course_student", cls._compute_value)
+
+    @classmethod
+    async def _compute_value(cls):
+        student = await cls.context.api.get_my_user()
+        course = await cls.context.api.get_course()
         return json.dumps({
             "student": student,
             "course": course
@@ -146,13 +360,25 @@ class CourseAndStudentHandler(BaseHandler):
     async def get(self):
         self.finish(await self.get_value())
 
+class CourseAndStudentPollHandler(LongPollingHandler):
+    @tornado.web.authenticated
+    async def get(self):
+        await self.long_poll(CourseAndStudentHandler.get_value)
+
 class AssignmentsHandler(BaseHandler):
-    async def get_value(self, current_path: str):
+    @classmethod
+    async def get_value(cls, current_path: str):
         current_path_abs = os.path.realpath(current_path)
+        return await cls.context.computations.run(
+            ("assignments", current_path_abs),
+            lambda: cls._compute_value(current_path_abs)
+        )
 
-        student = await self.api.get_my_user()
-        assignments = await self.api.get_my_assignments()
-        course = await self.api.get_course()
+    @classmethod
+    async def _compute_value(cls, current_path_abs: str):
+        student = await cls.context.api.get_my_user()
+        assignments = await cls.context.api.get_my_assignments()
+        course = await cls.context.api.get_course()
 
         value = {
             "current_assignment": None,
@@ -186,22 +412,22 @@ class AssignmentsHandler(BaseHandler):
             # If user is not in an assignment, we're done. Just leave current_assignment as None.
             return json.dumps(value)
         
-        submissions = await self.api.get_my_submissions(current_assignment["id"])
+        submissions = await cls.context.api.get_my_submissions(current_assignment["id"])
+        commit_infos = await cls.context.get_commit_infos(
+            [submission["commit_id"] for submission in submissions],
+            student_repo.repo_root
+        )
         for submission in submissions:
-            submission["commit"] = get_commit_info(submission["commit_id"], path=student_repo.repo_root)
+            submission["commit"] = commit_infos[submission["commit_id"]]
         current_assignment["submissions"] = submissions
         current_assignment["staged_changes"] = []
-        for modified_path in get_modified_paths(path=student_repo.repo_root):
+        repo_status = cls.context.get_repo_status(student_repo.repo_root)
+        for modified_path in await repo_status.get_modified_paths(current_assignment["directory_path"]):
             full_modified_path = Path(student_repo.repo_root) / modified_path["path"]
             abs_assn_path = Path(student_repo.repo_root) / current_assignment["directory_path"]
-            try:
-                path_relative_to_assn = full_modified_path.relative_to(abs_assn_path)
-                modified_path["path_from_repo"] = modified_path["path"]
-                modified_path["path_from_assn"] = str(path_relative_to_assn)
-                current_assignment["staged_changes"].append(modified_path)
-            except ValueError:
-                # This path is not part of the current assignment directory
-                pass
+            modified_path["path_from_repo"] = modified_path["path"]
+            modified_path["path_from_assn"] = str(full_modified_path.relative_to(abs_assn_path))
+            current_assignment["staged_changes"].append(modified_path)
         
         value["current_assignment"] = current_assignment
         return json.dumps(value)
@@ -210,6 +436,12 @@ class AssignmentsHandler(BaseHandler):
     async def get(self):
         current_path: str = self.get_argument("path")
         self.finish(await self.get_value(current_path))
+
+class AssignmentsPollHandler(LongPollingHandler):
+    @tornado.web.authenticated
+    async def get(self):
+        current_path: str = self.get_argument("path")
+        await self.long_poll(lambda: AssignmentsHandler.get_value(current_path))
             
 
 class SubmissionHandler(BaseHandler):
@@ -253,70 +485,191 @@ class SubmissionHandler(BaseHandler):
             self.finish(json.dumps({
                 "message": "Student notebook does not exist"
             }))
-        student_notebook_content = student_notebook_path.read_text()
-        
-        rollback_id = get_head_commit_id(path=student_repo.repo_root)
-        stage_files(".", path=student_repo.current_assignment_path)
-        
+            return
+
+        too_large_message = get_notebook_too_large_message(self.config, student_notebook_path)
+        if too_large_message is not None:
+            self.set_status(413)
+            self.finish(json.dumps({
+                "message": too_large_message
+            }))
+            return
+
+        repo_root = str(Path(student_repo.repo_root).resolve())
+        # A repeated request (e.g. a double click) gets the submission that's already running, rather than a conflict.
+        active_job = self.context.submission_jobs.get_active_job(repo_root)
+        if active_job is not None:
+            self.set_status(202)
+            self.finish(json.dumps({
+                "job": active_job.to_dict()
+            }))
+            return
+
+        job = SubmissionJob(repo_root, student_repo.current_assignment["id"])
         try:
-            commit_id = commit(
+            self.context.submission_jobs.submit(job, lambda job: self.run_job(
+                job,
+                student_repo,
+                student_notebook_path,
                 submission_summary,
-                submission_description if submission_description else None,
-                path=student_repo.current_assignment_path
-            )
-        except Exception as e:
-            # If the commit fails then unstage the assignment files.
-            git_reset(".", path=student_repo.current_assignment_path)
-            self.set_status(500)
-            self.finish(str(e))
+                submission_description if submission_description else None
+            ))
+        except SubmissionInProgressException:
+            self.set_status(409)
+            self.finish(json.dumps({
+                "message": "A submission is already in progress"
+            }))
             return
 
-        try:
-            await self.api.create_submission(
-                student_repo.current_assignment["id"],
-                commit_id,
-                student_notebook_content
-            )
-        except Exception as e:
-            # If the submission fails create in the API, rollback the local commit to the previous head.
-            git_reset(rollback_id, path=student_repo.repo_root)
-            self.set_status(e.response.status_code)
-            self.finish(e.response.text)
+        # The submission runs in the background. Its progress is sent over the websocket,
+        # and can also be checked through the submission jobs endpoint.
+        self.set_status(202)
+        self.finish(json.dumps({
+            "job": job.to_dict()
+        }))
+
+    @classmethod
+    async def run_job(
+        cls,
+        job: SubmissionJob,
+        student_repo: StudentClassRepo,
+        student_notebook_path: Path,
+        submission_summary: str,
+        submission_description: str | None
+    ):
+        context = cls.context
+        # The notebook may have grown since the request was accepted.
+        too_large_message = get_notebook_too_large_message(context.config, student_notebook_path)
+        if too_large_message is not None:
+            job.fail(too_large_message)
             return
-        
-        # We need to create the submission in the API before we push the changes to the remote,
-        # so that we don't push the stages changes without actually creating a submission for the user
-        # (which would be very misleading)
+        # Read once: the same bytes are hashed and sent as the submission's notebook content.
+        student_notebook_bytes = await asyncio.to_thread(student_notebook_path.read_bytes)
+        student_notebook_content = student_notebook_bytes.decode("utf-8")
+        # Comparing blob ids means the previous submission's content never has to be read.
+        # This is only informational (the UI warns about resubmitting an unchanged notebook), so it never fails the job.
         try:
-            push(StudentClassRepo.ORIGIN_REMOTE_NAME, StudentClassRepo.MAIN_BRANCH_NAME, path=student_repo.current_assignment_path)
-            self.finish()
-        except Exception as e:
-            # Need to rollback the commit if push failed too.
-            git_reset(rollback_id, path=student_repo.repo_root)
-            self.set_status(500)
-            self.finish(str(e))
+            notebook_blob_id = hash_blob(student_notebook_bytes)
+            previous_blob_id = await get_previous_submission_notebook_blob_id(context, student_repo, student_notebook_path)
+            job.notebook_unchanged = notebook_blob_id == previous_blob_id
+        except Exception:
+            print("Couldn't compare the notebook to the previous submission", traceback.format_exc())
+            job.notebook_unchanged = None
+
+        # Keeps the sync from touching the repository between staging and pushing (or rolling back).
+        async with context.get_repo_lock(student_repo.repo_root):
+            rollback_id = await get_git_backend().rev_parse(path=student_repo.repo_root)
+            await stage_files_async(".", path=student_repo.current_assignment_path)
+            job.advance(SubmissionJob.STAGED)
+        
+            try:
+                job.commit_id = await commit_async(
+                    submission_summary,
+                    submission_description,
+                    path=student_repo.current_assignment_path
+                )
+            except Exception as e:
+                # If the commit fails then unstage the assignment files.
+                await reset_async(".", path=student_repo.current_assignment_path)
+                job.fail(get_error_message(e))
+                return
+            job.advance(SubmissionJob.COMMITTED)
 
-class NotebookFilesHandler(BaseHandler):
+            try:
+                await context.api.create_submission(
+                    student_repo.current_assignment["id"],
+                    job.commit_id,
+                    student_notebook_content
+                )
+            except Exception as e:
+                # If the submission fails create in the API, rollback the local commit to the previous head.
+                await reset_async(rollback_id, path=student_repo.repo_root)
+                job.fail(e.response.text if isinstance(e, APIException) else get_error_message(e), rolled_back=True)
+                return
+            job.advance(SubmissionJob.REGISTERED)
+        
+            # We need to create the submission in the API before we push the changes to the remote,
+            # so that we don't push the stages changes without actually creating a submission for the user
+            # (which would be very misleading)
+            try:
+                await push_async(
+                    StudentClassRepo.ORIGIN_REMOTE_NAME,
+                    StudentClassRepo.MAIN_BRANCH_NAME,
+                    path=student_repo.current_assignment_path,
+                    timeout=context.config.GIT_NETWORK_TIMEOUT_SECONDS
+                )
+            except Exception as e:
+                # Need to rollback the commit if push failed too.
+                await reset_async(rollback_id, path=student_repo.repo_root)
+                job.fail(get_error_message(e), rolled_back=True)
+                return
+            job.advance(SubmissionJob.PUSHED)
+            # Anything still being computed may predate the submission.
+            context.computations.forget()
+            context.state_publisher.notify()
+
+def get_notebook_too_large_message(config: ExtensionConfig, student_notebook_path: Path) -> str | None:
+    size = os.path.getsize(student_notebook_path)
+    if size <= config.MAX_SUBMISSION_NOTEBOOK_BYTES: return None
+    return (
+        f"The student notebook is too large to submit ({ size / 1024 / 1024 :.1f} MB, the limit is "
+        f"{ config.MAX_SUBMISSION_NOTEBOOK_BYTES / 1024 / 1024 :.1f} MB). Clearing large cell outputs, such as images, will make it smaller."
+    )
+
+async def get_previous_submission_notebook_blob_id(context: AppContext, student_repo: StudentClassRepo, student_notebook_path: Path) -> str | None:
+    """ The blob id of the student notebook in the assignment's most recent submission, if there is one. """
+    submissions = await context.api.get_my_submissions(student_repo.current_assignment["id"])
+    if len(submissions) == 0: return None
+    previous_submission = max(submissions, key=lambda submission: submission["submission_time"])
+    repo_root = Path(student_repo.repo_root).resolve()
+    notebook_path = Path(student_notebook_path).resolve().relative_to(repo_root).as_posix()
+    return await get_blob_id_async(previous_submission["commit_id"], notebook_path, path=repo_root)
+
+class SubmissionJobHandler(BaseHandler):
     @tornado.web.authenticated
-    async def get(self):
-        course = await self.api.get_course()
-        assignments = await self.api.get_my_assignments()
+    async def get(self, job_id: str):
+        job = self.context.submission_jobs.get(job_id)
+        if job is None:
+            self.set_status(404)
+            self.finish(json.dumps({
+                "message": "Submission job does not exist"
+            }))
+            return
+        self.finish(json.dumps({
+            "job": job.to_dict()
+        }))
+
+class NotebookFilesHandler(BaseHandler):
+    @classmethod
+    async def get_value(cls):
+        return await cls.context.computations.run("notebook_files", cls._compute_value)
+
+    @classmethod
+    async def _compute_value(cls):
+        course = await cls.context.api.get_course()
+        assignments = await cls.context.api.get_my_assignments()
+
+        repo_root = StudentClassRepo._compute_repo_root(course["name"]).resolve()
+        notebook_index = cls.context.get_notebook_index(repo_root)
 
         assignment_notebooks = {}
         for assignment in assignments:
-            repo_root = StudentClassRepo._compute_repo_root(course["name"]).resolve()
             assignment_path = repo_root / assignment["directory_path"]
+            assignment_notebooks[assignment["id"]] = notebook_index.get_notebooks(assignment_path)
 
-            notebooks = [path.relative_to(assignment_path) for path in assignment_path.rglob("*.ipynb")]
-            notebooks = [path for path in notebooks if ".ipynb_checkpoints" not in path.parts]
-            # Sort by nestedness, then alphabetically
-            notebooks.sort(key=lambda path: (len(path.parents), str(path)))
+        return json.dumps({
+            "notebooks": assignment_notebooks,
+            "version": notebook_index.version
+        })
 
-            assignment_notebooks[assignment["id"]] = [str(path) for path in notebooks]
+    @tornado.web.authenticated
+    async def get(self):
+        self.finish(await self.get_value())
 
-        self.finish(json.dumps({
-            "notebooks": assignment_notebooks
-        }))
+class NotebookFilesPollHandler(LongPollingHandler):
+    @tornado.web.authenticated
+    async def get(self):
+        await self.long_poll(NotebookFilesHandler.get_value)
 
 class SettingsHandler(BaseHandler):
     @tornado.web.authenticated
@@ -329,20 +682,160 @@ class SettingsHandler(BaseHandler):
             "repoRoot": str(repo_root)
         }))
 
+class SyncHistoryHandler(BaseHandler):
+    @tornado.web.authenticated
+    async def get(self):
+        limit = self.get_argument("limit", None)
+        outcome = self.get_argument("outcome", None)
+        if limit is not None:
+            try:
+                limit = int(limit)
+            except ValueError:
+                self.set_status(400)
+                self.finish(json.dumps({
+                    "message": "limit must be an integer"
+                }))
+                return
+            # The journal never holds more than SYNC_JOURNAL_MAX_ENTRIES runs anyway.
+            limit = min(max(limit, 1), self.context.config.SYNC_JOURNAL_MAX_ENTRIES)
+        repo_root = await self.context.get_repo_root()
+        runs = self.context.get_sync_journal(repo_root).get_runs(
+            limit=limit,
+            outcome=outcome
+        )
+        self.finish(json.dumps({
+            "runs": runs
+        }))
+
+class ReadinessHandler(BaseHandler):
+    @tornado.web.authenticated
+    async def get(self):
+        self.finish(json.dumps(self.context.bootstrap.to_dict()))
+
+class MetricsHandler(BaseHandler):
+    @tornado.web.authenticated
+    async def get(self):
+        self.set_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.finish(METRICS_REGISTRY.render())
+
+
+def get_state_version(value: str) -> str:
+    return hashlib.sha1(value.encode("utf-8")).hexdigest()[:16]
+
+class StatePublisher:
+    """ Computes assignment, course and notebook state on the server and pushes it to subscribed websocket clients.
+    Each piece of state is versioned by its content, and is only sent to a client when it differs from the
+    version that client last received. Call `notify` to republish immediately after something has changed. """
+    def __init__(self, interval: float):
+        self.interval = interval
+        # client -> { "path": <current path of the client's file browser>, "versions": { <state key>: <version> } }
+        self.subscriptions = {}
+        self._wakeup = asyncio.Event()
+        # Replaced every time it's set, so that each waiter observes only changes that happen after it started waiting.
+        self._changed = asyncio.Event()
+
+    def subscribe(self, client, path: str | None, versions: dict | None = None) -> None:
+        subscription = self.subscriptions.get(client)
+        if subscription is None:
+            subscription = self.subscriptions[client] = { "path": path, "versions": {} }
+        elif subscription["path"] != path:
+            # The client discards its assignment state when it changes directories, so it always needs a fresh copy.
+            subscription["path"] = path
+            subscription["versions"].pop("assignments", None)
+        if versions is not None:
+            subscription["versions"].update(versions)
+        self.notify()
+
+    def unsubscribe(self, client) -> None:
+        self.subscriptions.pop(client, None)
+
+    def notify(self) -> None:
+        self._wakeup.set()
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def wait_for_change(self, timeout: float) -> None:
+        """ Wait until `notify` is called, or until `timeout` seconds have passed. """
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def publish(self) -> None:
+        if len(self.subscriptions) == 0: return
+
+        shared_values = {
+            "course_student": await CourseAndStudentHandler.get_value(),
+            "notebook_files": await NotebookFilesHandler.get_value()
+        }
+        assignments_by_path = {}
+        for client, subscription in list(self.subscriptions.items()):
+            values = dict(shared_values)
+            path = subscription["path"]
+            if path is not None:
+                if path not in assignments_by_path:
+                    assignments_by_path[path] = await AssignmentsHandler.get_value(path)
+                values["assignments"] = assignments_by_path[path]
+
+            for key, value in values.items():
+                version = get_state_version(value)
+                # The client may have disconnected while we were computing state.
+                if client not in self.subscriptions: break
+                if subscription["versions"].get(key) == version: continue
+                message = {
+                    "type": "state",
+                    "key": key,
+                    "version": version,
+                    "value": json.loads(value)
+                }
+                # Assignment state depends on the directory the client was in when it was computed.
+                if key == "assignments": message["path"] = path
+                # Only the latest value of each piece of state needs to reach the client.
+                client.send(OutboundMessage(message, coalesce_key=("state", key)))
+                subscription["versions"][key] = version
+
+    async def run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.publish()
+            except Exception:
+                print("Failed to publish state to websocket clients", traceback.format_exc())
+
+
+# How many times to deepen a shallow repository looking for a merge base, before fetching its full history.
+SHALLOW_DEEPEN_ATTEMPTS = 3
 
 async def create_repo_root_if_not_exists(context: AppContext, course) -> None:
     repo_root = StudentClassRepo._compute_repo_root(course["name"])
     if not repo_root.exists():
         repo_root.mkdir(parents=True)
 
-async def create_ssh_config_if_not_exists(context: AppContext, course, student) -> None:
-    settings = await context.api.get_settings()
+async def create_ssh_key_if_not_exists(context: AppContext, course) -> Path:
+    """ Generate the student's SSH key, returning the path to its public key. """
     repo_root = StudentClassRepo._compute_repo_root(course["name"]).resolve()
     ssh_config_dir = repo_root / ".ssh"
-    ssh_config_file = ssh_config_dir / "config"
     ssh_identity_file = ssh_config_dir / "id_gitea"
     ssh_public_key_file = ssh_config_dir / "id_gitea.pub"
 
+    if not ssh_identity_file.exists():
+        ssh_config_dir.mkdir(parents=True, exist_ok=True)
+        await execute_async(["chmod", "700", ssh_config_dir])
+        await execute_async(["ssh-keygen", "-t", "rsa", "-f", ssh_identity_file, "-N", ""])
+        await execute_async(["chmod", "444", ssh_public_key_file])
+        await execute_async(["chmod", "600", ssh_identity_file])
+    return ssh_public_key_file
+
+async def create_ssh_config(context: AppContext, course, student, settings) -> None:
+    repo_root = StudentClassRepo._compute_repo_root(course["name"]).resolve()
+    ssh_config_dir = repo_root / ".ssh"
+    ssh_config_file = ssh_config_dir / "config"
+    ssh_identity_file = ssh_config_dir / "id_gitea"
+
     ssh_public_url = student["fork_remote_url"]
     if not urlparse(ssh_public_url).scheme:
         ssh_public_url = "ssh://" + ssh_public_url
@@ -358,13 +851,7 @@ async def create_ssh_config_if_not_exists(context: AppContext, course, student)
     ssh_private_hostname = ssh_private_url_parsed.hostname
     ssh_port = ssh_private_url_parsed.port or 2222
     ssh_user = ssh_private_url_parsed.username or "git"
-    
-    if not ssh_identity_file.exists():
-        ssh_config_dir.mkdir(parents=True, exist_ok=True)
-        execute(["chmod", "700", ssh_config_dir])
-        execute(["ssh-keygen", "-t", "rsa", "-f", ssh_identity_file, "-N", ""])
-        execute(["chmod", "444", ssh_public_key_file])
-        execute(["chmod", "600", ssh_identity_file])
+
     with open(ssh_config_file, "w+") as f:
         # Host (public Gitea URL) is rewritten as an alias to HostName (private ssh URL)
         f.write( 
@@ -377,16 +864,202 @@ async def create_ssh_config_if_not_exists(context: AppContext, course, student)
             f"   StrictHostKeyChecking no\n" \
             f"   UserKnownHostsFile /dev/null\n"
         )
+
+async def register_ssh_key(context: AppContext, ssh_public_key_file: Path) -> None:
     with open(ssh_public_key_file, "r") as f:
         public_key = f.read()
         await context.api.set_ssh_key("jls-client", public_key)
 
+def get_clone_fetch_options(config: ExtensionConfig) -> dict:
+    """ Options for the initial fetch of the student's repository, according to CLONE_STRATEGY. """
+    if config.CLONE_STRATEGY == "blobless": return { "filter_spec": "blob:none" }
+    if config.CLONE_STRATEGY == "shallow": return { "depth": config.CLONE_DEPTH }
+    return {}
+
+def get_sync_fetch_options(config: ExtensionConfig) -> dict:
+    """ Options for fetches after the repository has been cloned. A shallow repository is fetched normally,
+    which only downloads the new commits, since passing a depth again could cut its existing history short. """
+    if config.CLONE_STRATEGY == "blobless": return { "filter_spec": "blob:none" }
+    return {}
+
+async def ensure_merge_base(context: AppContext, repo_root: Path, local_head: str, upstream_head: str) -> None:
+    """ In a shallow repository, the local and upstream heads may not share any history that's available locally,
+    which would make them look unrelated to git. Deepen the history until they do, unshallowing as a last resort. """
+    git_backend = get_git_backend()
+    if not await git_backend.is_shallow(path=repo_root): return
+    remote_names = [StudentClassRepo.UPSTREAM_REMOTE_NAME, StudentClassRepo.ORIGIN_REMOTE_NAME]
+    for _ in range(SHALLOW_DEEPEN_ATTEMPTS):
+        if await git_backend.get_merge_base(local_head, upstream_head, path=repo_root) is not None: return
+        print(f"No merge base in shallow history, deepening by { context.config.CLONE_DEPTH } commits...")
+        await fetch_remotes_async(
+            remote_names,
+            path=repo_root,
+            timeout=context.config.GIT_NETWORK_TIMEOUT_SECONDS,
+            deepen=context.config.CLONE_DEPTH
+        )
+    if await git_backend.get_merge_base(local_head, upstream_head, path=repo_root) is None:
+        print("Still no merge base in shallow history, fetching the full history...")
+        # One at a time, since git refuses to unshallow a repository that the previous remote already completed.
+        for remote_name in remote_names:
+            if not await git_backend.is_shallow(path=repo_root): break
+            await fetch_remotes_async(
+                [remote_name],
+                path=repo_root,
+                timeout=context.config.GIT_NETWORK_TIMEOUT_SECONDS,
+                unshallow=True
+            )
+
+def get_overlapping_paths(paths: Iterable[str], other_paths: Iterable[str]) -> list[str]:
+    """ Get the paths that are, are inside of, or contain any of `other_paths`. """
+    other_paths = set(other_paths)
+    other_path_dirs = {
+        str(parent) for other_path in other_paths for parent in Path(other_path).parents if str(parent) != "."
+    }
+    return [
+        path for path in paths
+        if path in other_paths or path in other_path_dirs
+        or any(str(parent) in other_paths for parent in Path(path).parents)
+    ]
+
+async def merge_upstream_in_memory(context: AppContext, repo_root: Path, local_head: str, upstream_head: str, run: SyncRun) -> bool:
+    """ Merge the upstream head into main without a merge branch, stash or checkout. The merge is computed in memory,
+    and only the files that it changes are written to the worktree, so files the student has open are left alone.
+    Returns False, having changed nothing, if the merge conflicts, changes any files that the student has
+    changed locally, or main moves underneath it. Those merges are left to the full sync.
+
+    The caller must hold the repository's lock, since the index and worktree are updated before main is. """
+    if not context.get_repo_lock(repo_root).locked():
+        raise RuntimeError("The repository lock must be held while merging upstream changes in memory")
+
+    with run.phase(SyncRun.MERGE):
+        try:
+            merged_tree, conflicts = await merge_tree_async(local_head, upstream_head, path=repo_root)
+        except GitException as e:
+            # E.g. if git is older than 2.38.
+            print("Couldn't merge upstream changes in memory", e)
+            return False
+        run.merge_conflicts = len(conflicts)
+        if len(conflicts) > 0:
+            print(f"Upstream changes conflict with { len(conflicts) } file(s) in the student's history")
+            return False
+
+        changed_paths = await get_changed_paths_async(local_head, merged_tree, path=repo_root)
+        local_paths = [f["path"] for f in await get_git_backend().get_modified_paths(untracked=True, path=repo_root)]
+        overlapping_paths = get_overlapping_paths(changed_paths, local_paths)
+        if len(overlapping_paths) > 0:
+            print(f"Upstream changes touch { len(overlapping_paths) } file(s) that the student has changed locally")
+            return False
+
+        merge_commit = await commit_tree_async(
+            merged_tree,
+            [local_head, upstream_head],
+            f"Merge remote-tracking branch '{ StudentClassRepo.UPSTREAM_TRACKING_BRANCH }'",
+            path=repo_root
+        )
+
+    with run.phase(SyncRun.FAST_FORWARD):
+        try:
+            await read_tree_async(local_head, merge_commit, path=repo_root)
+        except GitException as e:
+            print("Couldn't update the worktree with the in-memory merge", e)
+            return False
+        try:
+            await update_ref_async(
+                f"refs/heads/{ StudentClassRepo.MAIN_BRANCH_NAME }",
+                merge_commit,
+                old_value=local_head,
+                message=f"sync: merge { StudentClassRepo.UPSTREAM_TRACKING_BRANCH }",
+                path=repo_root
+            )
+        except GitException as e:
+            # Main moved while we were merging (e.g. the student committed from a terminal),
+            # so put the worktree back the way we found it.
+            print("Main moved during the in-memory merge", e)
+            try:
+                await read_tree_async(merge_commit, local_head, path=repo_root)
+            except GitException as e:
+                print("Failed to restore the worktree after the in-memory merge", e)
+            return False
+    return True
+
+def get_sparse_checkout_directories(assignments) -> list[str] | None:
+    """ The directories to check out in cone mode, or None if an assignment needs the entire repository. """
+    directories = set()
+    for assignment in assignments:
+        directory_path = posixpath.normpath(assignment["directory_path"])
+        if directory_path == ".": return None
+        directories.add(directory_path)
+    return sorted(directories)
+
+async def update_sparse_checkout(context: AppContext, repo_root: Path, assignments) -> None:
+    """ Keep the sparse checkout in line with the student's assignments, or turn it off if SPARSE_CHECKOUT is disabled.
+    The directories we applied last are remembered along with the stat of the sparse-checkout file at the time,
+    so git only runs when the assignments change (or someone else changed the sparse checkout). """
+    sparse_checkout_path = repo_root / ".git" / "info" / "sparse-checkout"
+    state_path = repo_root / ".git" / "eduhelx" / "sparse-checkout-state.json"
+    directories = get_sparse_checkout_directories(assignments) if context.config.SPARSE_CHECKOUT else None
+    try:
+        state = json.loads(state_path.read_text())
+    except (OSError, ValueError):
+        state = {}
+
+    if directories is None:
+        # Only turn off a sparse checkout that we set up.
+        if state.get("directories") is None: return
+        print("Disabling sparse checkout...")
+        await disable_sparse_checkout_async(path=repo_root)
+    else:
+        if state.get("directories") == directories and state.get("stat") == get_file_stat(sparse_checkout_path): return
+        print(f"Setting sparse checkout to { len(directories) } assignment directories...")
+        await set_sparse_checkout_async(directories, path=repo_root)
+
+    state_path.parent.mkdir(parents=True, exist_ok=True)
+    state_path.write_text(json.dumps({
+        "directories": directories,
+        "stat": get_file_stat(sparse_checkout_path)
+    }))
+
+async def update_shared_object_store(context: AppContext, repo_root: Path, course) -> None:
+    """ Borrow objects from the shared mirror of the course's upstream, if SHARED_OBJECT_STORE_PATH is set and the
+    mirror exists. Otherwise, stop borrowing from it, after first copying the borrowed objects into the repository.
+    When a repository (e.g. one cloned before the store was set up) starts borrowing, its own copies of the
+    mirror's objects are dropped with a one-time repack. """
+    store_path = context.config.SHARED_OBJECT_STORE_PATH
+    master_repository_url = course["master_remote_url"]
+    mirror_object_dir = get_mirror_object_dir(store_path, master_repository_url) if store_path != "" else None
+    # The mirror's directory name doesn't depend on where the store is mounted.
+    mirror_name = get_mirror_path("", master_repository_url).name
+
+    alternates = get_alternates(path=repo_root)
+    other_alternates = [alternate for alternate in alternates if Path(alternate).parent.name != mirror_name]
+    desired_alternates = other_alternates + ([str(mirror_object_dir)] if mirror_object_dir is not None else [])
+    if alternates == desired_alternates: return
+
+    stale_alternates = [alternate for alternate in alternates if alternate not in desired_alternates]
+    if any(not os.path.isdir(alternate) for alternate in stale_alternates):
+        # The borrowed objects can't be copied out of a store that isn't mounted,
+        # and dropping the alternate without them would leave the repository broken.
+        print(f"Can't stop borrowing from the shared object store at { ', '.join(stale_alternates) }, since it's unavailable")
+        return
+
+    if len(stale_alternates) > 0:
+        print("Copying objects borrowed from the shared object store into the repository...")
+        await repack_async(path=repo_root, timeout=context.config.GIT_NETWORK_TIMEOUT_SECONDS)
+    set_alternates(desired_alternates, path=repo_root)
+    if mirror_object_dir is not None and str(mirror_object_dir) not in alternates:
+        print(f"Borrowing objects from the shared object store at { mirror_object_dir }")
+        await repack_async(local=True, path=repo_root, timeout=context.config.GIT_NETWORK_TIMEOUT_SECONDS)
+
 async def clone_repo_if_not_exists(context: AppContext, course, student) -> None:
     repo_root = StudentClassRepo._compute_repo_root(course["name"])
     try:
         # We're just confirming that the repo root is a git repository.
         # If it is, don't need to clone
-        get_git_repo_root(path=repo_root)
+        await get_git_backend().get_repo_root(path=repo_root)
+        try:
+            await update_shared_object_store(context, repo_root, course)
+        except Exception as e:
+            print("Failed to update the shared object store", e)
     except InvalidGitRepositoryException:
         # We're not going to bother checking if fork_cloned is False actually.
         # If the repo isn't properly setup for any reason, we'll just rename
@@ -421,19 +1094,33 @@ async def clone_repo_if_not_exists(context: AppContext, course, student) -> None
         """ Now we're working with a new, empty directory. """
         try:
             # This block should never fail. If it does, just abort.
-            init_repository(repo_root)
+            await asyncio.to_thread(init_repository, repo_root)
             await set_git_authentication(context, course, student)
-            add_remote(StudentClassRepo.UPSTREAM_REMOTE_NAME, master_repository_url, path=repo_root)
-            add_remote(StudentClassRepo.ORIGIN_REMOTE_NAME, student_repository_url, path=repo_root)
+            await asyncio.to_thread(add_remote, StudentClassRepo.UPSTREAM_REMOTE_NAME, master_repository_url, path=repo_root)
+            await asyncio.to_thread(add_remote, StudentClassRepo.ORIGIN_REMOTE_NAME, student_repository_url, path=repo_root)
+            # Before fetching, so that anything in the shared object store isn't downloaded again.
+            await update_shared_object_store(context, repo_root, course)
 
             @backoff.on_exception(backoff.constant, Exception, interval=2.5, max_time=15)
-            def try_fetch(remote):
-                fetch_repository(remote, path=repo_root)
-
-            # If either of these reach backoff and fail, just abort
-            try_fetch(StudentClassRepo.ORIGIN_REMOTE_NAME)
-            checkout(f"{ StudentClassRepo.MAIN_BRANCH_NAME }", path=repo_root)
-            try_fetch(StudentClassRepo.UPSTREAM_REMOTE_NAME)
+            async def try_fetch():
+                # Fetch both remotes in parallel.
+                await fetch_remotes_async(
+                    [StudentClassRepo.ORIGIN_REMOTE_NAME, StudentClassRepo.UPSTREAM_REMOTE_NAME],
+                    path=repo_root,
+                    timeout=context.config.GIT_NETWORK_TIMEOUT_SECONDS,
+                    **get_clone_fetch_options(context.config)
+                )
+
+            # If this reaches backoff and fails, just abort
+            await try_fetch()
+            # Set up the sparse checkout before checking anything out, so that other directories are never written.
+            await update_sparse_checkout(context, repo_root, await context.api.get_my_assignments())
+            # Both remotes have a main branch, so say which one the local main branch should track.
+            await checkout_tracking_branch_async(
+                StudentClassRepo.MAIN_BRANCH_NAME,
+                StudentClassRepo.ORIGIN_REMOTE_NAME,
+                path=repo_root
+            )
 
             @backoff.on_exception(backoff.constant, Exception, interval=2.5, max_time=15)
             async def mark_as_cloned():
@@ -446,39 +1133,64 @@ async def clone_repo_if_not_exists(context: AppContext, course, student) -> None
             shutil.rmtree(repo_root)
             raise e
 
+def get_file_stat(path: Path) -> list[int] | None:
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return [stat.st_mtime_ns, stat.st_size]
+
+def get_fingerprint(value) -> str:
+    return hashlib.sha256(json.dumps(value, sort_keys=True).encode("utf-8")).hexdigest()
+
 async def set_git_authentication(context: AppContext, course, student) -> None:
+    """ Bring the repository's identity and credential config up to date.
+    The config we applied last is remembered (by fingerprint) along with the stat of .git/config at the time,
+    so if neither has changed since, the config doesn't need to be read at all. Otherwise, the current config is
+    read in one go and only the keys that differ are rewritten. With password auth, the credential is always
+    approved, since it's cheap and the helper may have lost it. """
     repo_root = StudentClassRepo._compute_repo_root(course["name"]).resolve()
     student_repository_url = student["fork_remote_url"]
     ssh_config_file = repo_root / ".ssh" / "config"
     ssh_identity_file = repo_root / ".ssh" / "id_gitea"
     use_password_auth = urlparse(student_repository_url).scheme in ["http", "https"]
-    
+    ssh_command = f"ssh -F { ssh_config_file } -i { ssh_identity_file }"
+
+    config_path = repo_root / ".git" / "config"
+    config_state_path = repo_root / ".git" / "eduhelx" / "config-state.json"
+    # Keys are normalized the way git reports them (lowercase section and variable names).
+    desired_config = {
+        "user.name": [context.config.USER_NAME],
+        "user.email": [student["email"]],
+        "author.name": [context.config.USER_NAME],
+        "author.email": [student["email"]],
+        "committer.name": [context.config.USER_NAME],
+        "committer.email": [student["email"]],
+        # The empty helper clears any helpers inherited from the global/system config.
+        "credential.helper": ["", context.config.CREDENTIAL_HELPER] if use_password_auth else [],
+        "core.sshcommand": [ssh_command] if not use_password_auth else []
+    }
+    config_fingerprint = get_fingerprint(desired_config)
+
     try:
-        get_git_repo_root(path=repo_root)
-        execute(["git", "config", "--local", "--unset-all", "credential.helper"], cwd=repo_root)
-        execute(["git", "config", "--local", "--unset-all", "core.sshCommand"], cwd=repo_root)
-
-        execute(["git", "config", "--local", "user.name", context.config.USER_NAME], cwd=repo_root)
-        execute(["git", "config", "--local", "user.email", student["email"]], cwd=repo_root)
-        execute(["git", "config", "--local", "author.name", context.config.USER_NAME], cwd=repo_root)
-        execute(["git", "config", "--local", "author.email", student["email"]], cwd=repo_root)
-        execute(["git", "config", "--local", "committer.name", context.config.USER_NAME], cwd=repo_root)
-        execute(["git", "config", "--local", "committer.email", student["email"]], cwd=repo_root)
-
-        if use_password_auth:
-            execute(["git", "config", "--local", "credential.helper", ""], cwd=repo_root)
-            execute(["git", "config", "--local", "--add", "credential.helper", context.config.CREDENTIAL_HELPER], cwd=repo_root)
-        else:
-            execute(["git", "config", "--local", "core.sshCommand", f'ssh -F { ssh_config_file } -i { ssh_identity_file }'], cwd=repo_root)
-    except InvalidGitRepositoryException:
-        config_path = repo_root / ".git" / "config"
+        config_state = json.loads(config_state_path.read_text())
+    except (OSError, ValueError):
+        config_state = {}
+
+    config_changed = config_state.get("config") != config_fingerprint or config_state.get("config_stat") != get_file_stat(config_path)
+    if config_changed and config_path.exists():
+        current_config = await asyncio.to_thread(get_local_config, path=repo_root)
+        for key, values in desired_config.items():
+            if current_config.get(key, []) != values:
+                await asyncio.to_thread(set_local_config, key, values, path=repo_root)
+    elif config_changed:
         config_path.parent.mkdir(parents=True, exist_ok=True)
         with open(config_path, "w+") as f:
             ssh_credential_config = (
-                f"    sshCommand = ssh -F { ssh_config_file } -i { ssh_identity_file }\n"
+                f"    sshCommand = { ssh_command }\n"
             ) if not use_password_auth else ""
             password_credential_config = (
-                f"    helper = ''\n"
+                f"    helper = \"\"\n"
                 f"    helper = { context.config.CREDENTIAL_HELPER }\n"
             ) if use_password_auth else ""
             credential_config = (
@@ -497,6 +1209,9 @@ async def set_git_authentication(context: AppContext, course, student) -> None:
                 f"{ password_credential_config }"
             )
             f.write(credential_config)
+    if config_changed:
+        config_state["config"] = config_fingerprint
+        config_state["config_stat"] = get_file_stat(config_path)
 
     if use_password_auth:
         parsed = urlparse(student_repository_url)
@@ -506,7 +1221,12 @@ async def set_git_authentication(context: AppContext, course, student) -> None:
             f"host={ host }\n" \
             f"username={ context.config.USER_NAME }\n" \
             f"password={ context.config.USER_AUTOGEN_PASSWORD }"
-        execute(["git", "credential", "approve"], stdin_input=credentials, cwd=repo_root)
+        # Always approved, even if the config is unchanged: the credential helper's storage (e.g. the cache helper's
+        # memory, or a store that's wiped when the server restarts) may not have outlived the repository's config.
+        await execute_async(["git", "credential", "approve"], stdin_input=credentials, cwd=repo_root)
+
+    config_state_path.parent.mkdir(parents=True, exist_ok=True)
+    config_state_path.write_text(json.dumps(config_state))
 
 async def set_root_folder_permissions(context: AppContext) -> None:
     # repo_root = await context.get_repo_root()
@@ -515,20 +1235,139 @@ async def set_root_folder_permissions(context: AppContext) -> None:
     # execute(["chmod", "a-w", repo_root.parent])
     ...
 
-async def sync_upstream_repository(context: AppContext, course) -> None:
+async def have_remotes_changed(context: AppContext, repo_root: Path) -> bool:
+    """ Compare the branch tips advertised by the remotes against our remote tracking branches.
+    This is a single round trip per remote, and much cheaper than a fetch. """
+    for remote_name in (StudentClassRepo.UPSTREAM_REMOTE_NAME, StudentClassRepo.ORIGIN_REMOTE_NAME):
+        try:
+            remote_head = await get_remote_head_async(
+                remote_name,
+                StudentClassRepo.MAIN_BRANCH_NAME,
+                path=repo_root,
+                timeout=context.config.GIT_NETWORK_TIMEOUT_SECONDS
+            )
+            tracking_head = await get_git_backend().rev_parse(f"{ remote_name }/{ StudentClassRepo.MAIN_BRANCH_NAME }", path=repo_root)
+        except Exception:
+            # If we can't tell, assume that it changed.
+            return True
+        if remote_head != tracking_head:
+            return True
+    return False
+
+async def sync_upstream_repository(context: AppContext, course) -> bool:
+    """ Merge upstream changes into the student's repository, recording the run in the sync journal.
+    Returns False if the remotes were idle and there was nothing to do, otherwise True. """
+    run = SyncRun()
+    repo_root = StudentClassRepo._compute_repo_root(course["name"])
+    try:
+        async with context.get_repo_lock(repo_root):
+            return await _sync_upstream_repository(context, course, run)
+    except Exception:
+        run.outcome, run.error = "error", traceback.format_exc()
+        raise
+    finally:
+        run.finish(run.outcome or "error", run.error)
+        if run.outcome not in ("idle", "up_to_date", "merged"):
+            # Only skip the next sync while idle if this one left upstream fully merged, so failures are retried.
+            context.synced_upstream_head = None
+        try:
+            context.get_sync_journal(repo_root).append(run)
+        except Exception:
+            print("Failed to record sync run", traceback.format_exc())
+
+async def _sync_upstream_repository(context: AppContext, course, run: SyncRun) -> bool:
     assignments = await context.api.get_my_assignments()
     repo_root = StudentClassRepo._compute_repo_root(course["name"])
+    # Conflicts are classified against the globs directly, so paths deleted on either side of the merge are covered too.
+    file_matcher = get_assignment_file_matcher(assignments)
+
+    # Assignments can be added or removed without anything changing upstream, so this happens even on idle syncs.
+    try:
+        await update_sparse_checkout(context, repo_root, assignments)
+    except GitException as e:
+        print("Failed to update the sparse checkout", e)
+
+    # If the last sync fully merged upstream and neither remote has moved since, there's nothing to fetch or merge.
+    if context.synced_upstream_head is not None:
+        with run.phase(SyncRun.REMOTE_CHECK):
+            remotes_changed = await have_remotes_changed(context, repo_root)
+        if not remotes_changed:
+            print("Remotes haven't changed since the last sync, nothing to sync...")
+            run.outcome = "idle"
+            return False
+
+    try:
+        with run.phase(SyncRun.FETCH):
+            # Origin is fetched too, in case we've pushed directly to the student's repository on the remote
+            # for some reason (through Gitea-Assist)
+            await fetch_remotes_async(
+                [StudentClassRepo.UPSTREAM_REMOTE_NAME, StudentClassRepo.ORIGIN_REMOTE_NAME],
+                path=repo_root,
+                timeout=context.config.GIT_NETWORK_TIMEOUT_SECONDS,
+                **get_sync_fetch_options(context.config)
+            )
+    except Exception as e:
+        print("Fatal: Couldn't fetch remote tracking branches, aborting sync...")
+        run.outcome, run.error = "fetch_failed", str(e)
+        return True
+
+    with run.phase(SyncRun.ANCESTRY_CHECK):
+        await asyncio.to_thread(checkout, StudentClassRepo.MAIN_BRANCH_NAME, path=repo_root)
+        git_backend = get_git_backend()
+        local_head = await git_backend.rev_parse(path=repo_root)
+        upstream_head = await git_backend.rev_parse(StudentClassRepo.UPSTREAM_TRACKING_BRANCH, path=repo_root)
+        # The ancestry check and merge both need the heads' common history to be available locally.
+        try:
+            await ensure_merge_base(context, repo_root, local_head, upstream_head)
+        except Exception as e:
+            print("Fatal: Couldn't fetch the history needed to merge, aborting sync...")
+            run.local_head, run.upstream_head = local_head, upstream_head
+            run.outcome, run.error = "fetch_failed", str(e)
+            return True
+        already_merged = await git_backend.is_ancestor(local_head, upstream_head, path=repo_root)
+    run.local_head, run.upstream_head = local_head, upstream_head
+    if already_merged:
+        # If the local head is a descendant of the local head,
+        # then any upstream changes have already been merged in.
+        print(f"Upstream and local heads are merged, nothing to sync...")
+        context.synced_upstream_head = upstream_head
+        run.outcome = "up_to_date"
+        return True
+
+    # Most syncs merge cleanly and don't touch anything the student is working on, so try that first.
+    if await merge_upstream_in_memory(context, repo_root, local_head, upstream_head, run):
+        run.merge_strategy = SyncRun.IN_MEMORY_MERGE
+        context.synced_upstream_head = upstream_head
+        run.outcome = "merged"
+        await notify_downsync(context, repo_root, local_head, upstream_head)
+        return True
+    run.merge_strategy = SyncRun.STASH_MERGE
+    # The stash merge is a long series of blocking git commands, so it runs in a thread rather than on the event loop.
+    await asyncio.to_thread(stash_merge_upstream, repo_root, file_matcher, local_head, upstream_head, run)
+    if run.outcome == "merge_failed": return True
+    if run.outcome == "merged": context.synced_upstream_head = upstream_head
+    await notify_downsync(context, repo_root, local_head, upstream_head)
+    return True
+
+def stash_merge_upstream(repo_root: Path, file_matcher: AssignmentFileMatcher, local_head: str, upstream_head: str, run: SyncRun) -> None:
+    """ Merge the upstream head into main on a merge branch, stashing the student's changes around the merge.
+    Conflicts are resolved in favor of upstream, backing up the student's version where needed.
+    Runs git synchronously, so call it in a thread. The outcome is recorded on `run`. """
+    merge_branch_name = StudentClassRepo.MERGE_STAGING_BRANCH_NAME.format(local_head[:8], upstream_head[:8])
 
-    def backup_file(conflict_path: Path):
+    def backup_file(conflict_path: Path, source_path: Path | None = None):
+        """ Backup the student's pre-merge version of a file. The content is streamed either from `source_path`
+        or, for tracked files, from the pre-merge snapshot in git, so it's never held in memory. """
         print("BACKING UP FILE", conflict_path)
-        full_conflict_path = repo_root / conflict_path
-        if full_conflict_path in file_contents:
-            # Backup the student's changes to a new file.
-            backup_path = repo_root / Path(f"{ conflict_path }~{ isonow }~backup")
-            with open(backup_path, "wb+") as f:
-                f.write(file_contents[full_conflict_path])
+        backup_path = repo_root / Path(f"{ conflict_path }~{ isonow }~backup")
+        if source_path is not None:
+            shutil.copyfile(source_path, backup_path)
+            run.record_backup(os.path.getsize(backup_path))
         else:
-            print(str(conflict_path), "deleted locally, cannot create a backup.")
+            backup_size = write_blob_to_file(pre_merge_rev, str(conflict_path), backup_path, path=repo_root)
+            if backup_size is None:
+                print(str(conflict_path), "deleted locally, cannot create a backup.")
+            run.record_backup(backup_size)
 
     def move_untracked_files():
         # In case there are no files, we still want to make the dir so no error when deleting later.
@@ -549,20 +1388,11 @@ async def sync_upstream_repository(context: AppContext, course) -> None:
                 # If the file doesn't exist post-merge, it hasn't been changed at all, and we can just
                 # move the file back to its original path in the repo.
                 untracked_path.rename(full_original_file_path)
-            elif full_original_file_path.read_bytes() != untracked_path.read_bytes():
+            elif not filecmp.cmp(full_original_file_path, untracked_path, shallow=False):
                 # If the file exists post merge, but its content is the exact same, we woudn't need to take any actions.
                 # The file exists but its content has changed, so backup the old version.
                 print(f"Couldn't restore untracked file '{ original_file }' as it already exists on HEAD, backing up instead...")
-                backup_file(original_file)
-
-    # Grab every overwritable path inside the repository.
-    # Note: we need to this multiple times, since we can only pick up paths that exist on disk.
-    # If the local head deleted a file, it won't be picked up in the first pass.
-    # Vice-versa, if the merge head deleted a file, it won't be picked up in the second pass.
-    def gather_overwritable_paths():
-        for assignment in assignments:
-            for glob_pattern in assignment["overwritable_files"]:
-                overwritable_paths.update((repo_root / assignment["directory_path"]).glob(glob_pattern))
+                backup_file(original_file, source_path=untracked_path)
 
     def rename_merge_conflicts(merge_conflicts, source):
         conflict_types = {
@@ -570,7 +1400,7 @@ async def sync_upstream_repository(context: AppContext, course) -> None:
             if conflict["path"] in merge_conflicts
         }
         for conflict in merge_conflicts:
-            if repo_root / conflict not in overwritable_paths:
+            if not file_matcher.is_overwritable(conflict):
                 # If the file isn't overwritable, make a backup of it (as long as it's not deleted locally).
                 print("Encountered non-overwriteable merge conflict", conflict, ". Creating backup...")
                 backup_file(conflict)
@@ -586,24 +1416,6 @@ async def sync_upstream_repository(context: AppContext, course) -> None:
                 git_rm(conflict, cached=False, path=repo_root)
 
 
-    try:
-        fetch_repository(StudentClassRepo.UPSTREAM_REMOTE_NAME, path=repo_root)
-        # In case we've pushed directly to the student's repository on the remote for some reason (through Gitea-Assist)
-        fetch_repository(StudentClassRepo.ORIGIN_REMOTE_NAME, path=repo_root)
-    except:
-        print("Fatal: Couldn't fetch remote tracking branches, aborting sync...")
-        return
-
-    checkout(StudentClassRepo.MAIN_BRANCH_NAME, path=repo_root)
-    local_head = get_head_commit_id(path=repo_root)
-    upstream_head = get_head_commit_id(StudentClassRepo.UPSTREAM_TRACKING_BRANCH, path=repo_root)
-    merge_branch_name = StudentClassRepo.MERGE_STAGING_BRANCH_NAME.format(local_head[:8], upstream_head[:8])
-    if is_ancestor_commit(descendant=local_head, ancestor=upstream_head, path=repo_root):
-        # If the local head is a descendant of the local head,
-        # then any upstream changes have already been merged in.
-        print(f"Upstream and local heads are merged, nothing to sync...")
-        return
-    
     # Make certain the merge branch is empty before we start.
     try: delete_local_branch(merge_branch_name, force=True, path=repo_root)
     except: pass
@@ -612,45 +1424,51 @@ async def sync_upstream_repository(context: AppContext, course) -> None:
 
 
     isonow = datetime.now().isoformat()
-    # These are relative to the repo root.
-    file_contents = { path: path.read_bytes() for path in repo_root.rglob("*") if path.is_file() and ".git" not in path.parts }
-    untracked_files = {
-        f["path"] for f in get_modified_paths(untracked=True, path=repo_root)
-        if f["modification_type"] == "??"
-    }
+    # Snapshot the student's tracked changes (or just their head if there aren't any) without touching the worktree.
+    # Conflicting files are backed up from this snapshot on demand, rather than reading the entire repo into memory up front.
+    with run.phase(SyncRun.STASH):
+        pre_merge_rev = stash_create(path=repo_root) or local_head
+        untracked_files = {
+            f["path"] for f in get_modified_paths(untracked=True, path=repo_root)
+            if f["modification_type"] == "??"
+        }
     untracked_files_dir = repo_root / f".untracked-{ isonow }"
-    overwritable_paths = set()
-
-    gather_overwritable_paths()
 
     # Merge the upstream tracking branch into the temp merge branch
     try:
         print(f"Merging { StudentClassRepo.UPSTREAM_TRACKING_BRANCH } ({ upstream_head[:8] }) --> { StudentClassRepo.MAIN_BRANCH_NAME } ({ local_head[:8] }) on branch { merge_branch_name }")
         
-        # We move untracked files because git can't merge them, so it will refuse if a conflict
-        # would be caused, which we don't want. 
-        move_untracked_files()
+        with run.phase(SyncRun.STASH):
+            # We move untracked files because git can't merge them, so it will refuse if a conflict
+            # would be caused, which we don't want. 
+            move_untracked_files()
 
-        # We have to stash because git refuses to merge if the merge would overwrite local changes.
-        # NOTE: we don't use git stash --include-untracked because it does not work properly with merge.
-        stash_changes(path=repo_root)
+            # We have to stash because git refuses to merge if the merge would overwrite local changes.
+            # NOTE: we don't use git stash --include-untracked because it does not work properly with merge.
+            stash_changes(path=repo_root)
 
         # Merge the upstream tracking branch into the merge branch
-        merge_conflicts = git_merge(StudentClassRepo.UPSTREAM_TRACKING_BRANCH, commit=False, path=repo_root)
-        gather_overwritable_paths() # pick up paths introduced by the merge head
-        rename_merge_conflicts(merge_conflicts, source="MERGE_HEAD") # restore conflicts using their incoming version from the MERGE_HEAD
+        with run.phase(SyncRun.MERGE):
+            merge_conflicts = git_merge(StudentClassRepo.UPSTREAM_TRACKING_BRANCH, commit=False, path=repo_root)
+        run.merge_conflicts = len(merge_conflicts)
+        with run.phase(SyncRun.CONFLICT_RESOLUTION):
+            rename_merge_conflicts(merge_conflicts, source="MERGE_HEAD") # restore conflicts using their incoming version from the MERGE_HEAD
 
-        commit(None, no_edit=True, path=repo_root)
+        with run.phase(SyncRun.MERGE):
+            commit(None, no_edit=True, path=repo_root)
 
         # After popping, we could have further conflicts between the student's stashed changes and the new local head.
-        pop_stash(path=repo_root)
-        stash_conflicts = git_diff_status(diff_filter="U", path=repo_root)
-        gather_overwritable_paths() # technically, not really necessary since we gather before stashing.
-        rename_merge_conflicts(stash_conflicts, source="HEAD")
+        with run.phase(SyncRun.POP):
+            pop_stash(path=repo_root)
+            stash_conflicts = git_diff_status(diff_filter="U", path=repo_root)
+        run.stash_conflicts = len(stash_conflicts)
+        with run.phase(SyncRun.CONFLICT_RESOLUTION):
+            rename_merge_conflicts(stash_conflicts, source="HEAD")
 
     except Exception as e:
         # Cleanup the merge branch and return to main
         print("Fatal: Can't merge upstream changes into student repository", e)
+        run.error = str(e)
         # Since we force checkout and then delete the temp merge branch, it doesn't particularly
         # matter to us if the merge fails to abort, since we delete the MERGE_HEAD regardless.
         try: abort_merge(path=repo_root)
@@ -662,6 +1480,7 @@ async def sync_upstream_repository(context: AppContext, course) -> None:
             print("(failed to pop stash, already popped)")
         checkout(StudentClassRepo.MAIN_BRANCH_NAME, force=True, path=repo_root)
         delete_local_branch(merge_branch_name, force=True, path=repo_root)
+        run.outcome = "merge_failed"
         return
     
     finally:
@@ -676,41 +1495,104 @@ async def sync_upstream_repository(context: AppContext, course) -> None:
         print(f"Merging { merge_branch_name } --> { StudentClassRepo.MAIN_BRANCH_NAME }")
         # Merge the merge staging branch into the actual branch, don't need to commit since fast forward
         # We don't need to check for conflicts here since the actual branch can now be fast forwarded.
-        git_merge(merge_branch_name, ff_only=True, commit=False, path=repo_root)
+        with run.phase(SyncRun.FAST_FORWARD):
+            git_merge(merge_branch_name, ff_only=True, commit=False, path=repo_root)
+        run.outcome = "merged"
 
     except Exception as e:
         # Merging from temp to actual branch failed.
         print(f"Fatal: Failed to merge the merge staging branch into actual branch", e)
+        run.outcome, run.error = "fast_forward_failed", str(e)
         # Try to abort the merge, if started and unconcluded.
         try: abort_merge(path=repo_root)
         except: print("(failed to abort)")
     
     finally:
         delete_local_branch(merge_branch_name, force=True, path=repo_root)
-        
-    # TODO: when websockets added, ping the client if anything was changed.
-    added_files = git_diff_status(f"{local_head}..{upstream_head}", diff_filter="A", path=repo_root)
+
+async def notify_downsync(context: AppContext, repo_root: Path, local_head: str, upstream_head: str) -> None:
+    """ Tell clients about the files that syncing upstream added. """
+    added_files = await asyncio.to_thread(git_diff_status, f"{local_head}..{upstream_head}", diff_filter="A", path=repo_root)
     WebsocketHandler.emit({
         "type": "downsync",
         "files": added_files
-    })
+    }, coalesce_key="downsync", merge=merge_downsync_messages)
+    context.computations.forget()
+    context.state_publisher.notify()
+
+def merge_downsync_messages(pending: dict, message: dict) -> dict:
+    """ Combine two downsyncs that a client hasn't been told about yet into one. """
+    files = list(pending["files"])
+    files += [file for file in message["files"] if file not in files]
+    return { **message, "files": files }
 
 async def setup_backend(context: AppContext):
+    # Independent stages run concurrently, e.g. the API reads with generating the SSH key.
+    bootstrap = context.bootstrap
+    bootstrap.add_stage("course", lambda: context.api.get_course())
+    bootstrap.add_stage("student", lambda: context.api.get_my_user())
+    bootstrap.add_stage("settings", lambda: context.api.get_settings())
+    bootstrap.add_stage(
+        "repo_root",
+        lambda course: create_repo_root_if_not_exists(context, course),
+        ["course"]
+    )
+    bootstrap.add_stage(
+        "ssh_key",
+        lambda course, **_: create_ssh_key_if_not_exists(context, course),
+        ["course", "repo_root"]
+    )
+    bootstrap.add_stage(
+        "ssh_config",
+        lambda course, student, settings, **_: create_ssh_config(context, course, student, settings),
+        ["course", "student", "settings", "ssh_key"]
+    )
+    bootstrap.add_stage(
+        "register_ssh_key",
+        lambda ssh_key: register_ssh_key(context, ssh_key),
+        ["ssh_key"]
+    )
+    bootstrap.add_stage(
+        "git_authentication",
+        lambda course, student, **_: set_git_authentication(context, course, student),
+        ["course", "student", "repo_root"]
+    )
+    bootstrap.add_stage(
+        "clone",
+        lambda course, student, **_: clone_repo_if_not_exists(context, course, student),
+        ["course", "student", "git_authentication", "ssh_config", "register_ssh_key"]
+    )
+    bootstrap.add_stage(
+        "root_folder_permissions",
+        lambda **_: set_root_folder_permissions(context),
+        ["clone"]
+    )
     try:
-        course = await context.api.get_course()
-        student = await context.api.get_my_user()
-        await create_repo_root_if_not_exists(context, course)
-        await create_ssh_config_if_not_exists(context, course, student)
-        await set_git_authentication(context, course, student)
-        await clone_repo_if_not_exists(context, course, student)
-        await set_root_folder_permissions(context)
-        while True:
-            print("Pulling in upstream changes...")
-            await sync_upstream_repository(context, course)
-            print(f"Sleeping for { context.config.UPSTREAM_SYNC_INTERVAL }...")
-            await asyncio.sleep(context.config.UPSTREAM_SYNC_INTERVAL)
+        results = await bootstrap.run()
     except:
         print(traceback.format_exc())
+        return
+    print(f"Backend ready after { bootstrap.duration:.2f}s")
+    course = results["course"]
+    sync_interval = context.config.UPSTREAM_SYNC_INTERVAL
+    while True:
+        print("Pulling in upstream changes...")
+        try:
+            synced = await sync_upstream_repository(context, course)
+        except Exception:
+            # A failed sync (e.g. a network error) shouldn't stop later syncs, so retry at the regular interval.
+            print(traceback.format_exc())
+            synced = True
+        if synced:
+            sync_interval = context.config.UPSTREAM_SYNC_INTERVAL
+        else:
+            # Back off while the remotes stay idle.
+            sync_interval = min(
+                sync_interval * context.config.UPSTREAM_SYNC_BACKOFF_FACTOR,
+                max(context.config.UPSTREAM_SYNC_MAX_INTERVAL, context.config.UPSTREAM_SYNC_INTERVAL)
+            )
+        print(f"Sleeping for { sync_interval }...")
+        await asyncio.sleep(sync_interval)
 
 def setup_handlers(server_app):
     web_app = server_app.web_app
@@ -718,6 +1600,7 @@ def setup_handlers(server_app):
     
     loop = asyncio.get_event_loop()
     asyncio.run_coroutine_threadsafe(setup_backend(BaseHandler.context), loop)
+    asyncio.run_coroutine_threadsafe(BaseHandler.context.state_publisher.run(), loop)
 
     host_pattern = ".*$"
 
@@ -725,10 +1608,17 @@ def setup_handlers(server_app):
     handlers = [
         ("ws", WebsocketHandler),
         ("assignments", AssignmentsHandler),
+        (("assignments", "poll"), AssignmentsPollHandler),
         ("course_student", CourseAndStudentHandler),
+        (("course_student", "poll"), CourseAndStudentPollHandler),
         ("submit_assignment", SubmissionHandler),
+        (("submission_jobs", "([^/]+)"), SubmissionJobHandler),
         ("notebook_files", NotebookFilesHandler),
-        ("settings", SettingsHandler)
+        (("notebook_files", "poll"), NotebookFilesPollHandler),
+        ("settings", SettingsHandler),
+        ("sync_history", SyncHistoryHandler),
+        ("readiness", ReadinessHandler),
+        ("metrics", MetricsHandler)
     ]
 
     handlers_with_path = [
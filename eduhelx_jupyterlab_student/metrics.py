@@ -0,0 +1,181 @@
+import math
+import time
+import threading
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Callable
+
+""" Minimal in-process metrics, exposed in the Prometheus text exposition format. """
+
+class Metric(ABC):
+    type: str = None
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = (), registry: "Registry" = None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        (registry or REGISTRY).register(self)
+
+    def _label_values(self, labels: dict) -> tuple[str, ...]:
+        if set(labels.keys()) != set(self.labelnames):
+            raise ValueError(f"Metric { self.name } expects labels { self.labelnames }, got { tuple(labels.keys()) }")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    @staticmethod
+    def _format_labels(labels: list[tuple[str, str]]) -> str:
+        if len(labels) == 0: return ""
+        escaped = [
+            (name, value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"'))
+            for name, value in labels
+        ]
+        return "{" + ",".join(f'{ name }="{ value }"' for name, value in escaped) + "}"
+
+    @staticmethod
+    def _format_value(value: float) -> str:
+        if value == math.inf: return "+Inf"
+        return repr(float(value))
+
+    @abstractmethod
+    def samples(self) -> list[tuple[str, list[tuple[str, str]], float]]:
+        raise NotImplementedError()
+
+    def render(self) -> str:
+        lines = [f"# HELP { self.name } { self.documentation }", f"# TYPE { self.name } { self.type }"]
+        for (name, labels, value) in self.samples():
+            lines.append(f"{ name }{ self._format_labels(labels) } { self._format_value(value) }")
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._label_values(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [
+                (self.name, list(zip(self.labelnames, key)), value)
+                for key, value in sorted(self._values.items())
+            ]
+
+
+class Gauge(Metric):
+    """ A gauge whose (unlabeled) value is read from `callback` whenever the metrics are rendered. """
+    type = "gauge"
+
+    def __init__(self, name: str, documentation: str, callback: Callable[[], float], registry: "Registry" = None):
+        super().__init__(name, documentation, registry=registry)
+        self.callback = callback
+
+    def samples(self):
+        return [(self.name, [], self.callback())]
+
+
+class Histogram(Metric):
+    type = "histogram"
+    DEFAULT_BUCKETS = (.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+    def __init__(self, *args, buckets: tuple[float, ...] = DEFAULT_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # label values -> (per-bucket counts, sum, count)
+        self._values: dict[tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._label_values(labels)
+        with self._lock:
+            if key not in self._values:
+                self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            entry = self._values[key]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound: entry[0][i] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """ Observe how long the block takes, whether or not it raises. """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        samples = []
+        with self._lock:
+            for key, (bucket_counts, total, count) in sorted(self._values.items()):
+                labels = list(zip(self.labelnames, key))
+                for bound, bucket_count in zip(self.buckets, bucket_counts):
+                    samples.append((f"{ self.name }_bucket", labels + [("le", self._format_value(bound))], bucket_count))
+                samples.append((f"{ self.name }_sum", labels, total))
+                samples.append((f"{ self.name }_count", labels, count))
+        return samples
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> None:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric { metric.name } is already registered")
+        self._metrics[metric.name] = metric
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self._metrics.values()) + "\n"
+
+REGISTRY = Registry()
+
+
+HANDLER_DURATION = Histogram(
+    "eduhelx_handler_duration_seconds",
+    "Time spent handling HTTP requests",
+    ("handler", "method", "status")
+)
+GIT_COMMAND_DURATION = Histogram(
+    "eduhelx_git_command_duration_seconds",
+    "Time spent running git subprocesses, by subcommand",
+    ("subcommand", "outcome")
+)
+API_CALL_DURATION = Histogram(
+    "eduhelx_api_call_duration_seconds",
+    "Time spent in grader API calls that weren't served from the cache",
+    ("method", "outcome")
+)
+SYNC_PHASE_DURATION = Histogram(
+    "eduhelx_sync_phase_duration_seconds",
+    "Time spent in each phase of syncing upstream changes",
+    ("phase",)
+)
+SYNC_RUNS = Counter(
+    "eduhelx_sync_runs_total",
+    "Upstream sync runs, by outcome",
+    ("outcome",)
+)
+WEBSOCKET_MESSAGES = Counter(
+    "eduhelx_websocket_messages_total",
+    "Websocket messages, by whether they were sent, queued because no client was connected, coalesced into a newer message, or dropped along with an overflowing client",
+    ("delivery",)
+)
+
+def get_git_subcommand(cmd) -> str | None:
+    """ Get the subcommand of a git command line, e.g. "status" for `git -c a=b status --porcelain`. """
+    if len(cmd) == 0 or str(cmd[0]) != "git": return None
+    args = iter(cmd[1:])
+    for arg in args:
+        arg = str(arg)
+        # These global options take their value as a separate argument.
+        if arg in ("-c", "-C", "--git-dir", "--work-tree", "--namespace"):
+            next(args, None)
+        elif not arg.startswith("-"):
+            return arg
+    return None
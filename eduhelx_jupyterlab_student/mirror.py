@@ -0,0 +1,80 @@
+import sys
+import time
+import shutil
+import hashlib
+import argparse
+import tempfile
+import traceback
+from pathlib import Path
+from .git import GitException, get_repo_name_from_url
+from .process import execute
+
+""" Keeps bare mirrors of upstream repositories in a shared object store, e.g. a volume mounted into every
+student server on a node. Student repositories borrow objects from the mirror of their course's upstream
+(see SHARED_OBJECT_STORE_PATH), so they only have to download and store the student's own changes.
+
+Run a single mirror process per store:
+    python -m eduhelx_jupyterlab_student.mirror --store /mnt/eduhelx-objects --interval 60 <upstream url>...
+
+Student repositories reference the mirror's objects directly, so objects must never be deleted from a mirror.
+Mirrors are created with garbage collection disabled, and must not be gc'd or pruned by hand either. """
+
+def get_mirror_path(store_path, remote_url: str) -> Path:
+    """ Where the mirror of `remote_url` lives in the store. Mirrors are keyed by the entire URL,
+    so different courses with identically named repositories don't collide. """
+    url_hash = hashlib.sha256(remote_url.encode("utf-8")).hexdigest()[:12]
+    return Path(store_path) / f"{ get_repo_name_from_url(remote_url) }-{ url_hash }.git"
+
+def get_mirror_object_dir(store_path, remote_url: str) -> Path | None:
+    """ The objects directory of the mirror of `remote_url`, or None if it hasn't been created. """
+    object_dir = get_mirror_path(store_path, remote_url) / "objects"
+    if not object_dir.is_dir(): return None
+    return object_dir
+
+def _create_mirror(mirror_path: Path, remote_url: str) -> None:
+    # Clone next to the final path and move it into place, so readers never see a partial mirror.
+    tmp_path = Path(tempfile.mkdtemp(prefix=f".{ mirror_path.name }-", dir=mirror_path.parent))
+    try:
+        (out, err, exit_code) = execute(["git", "clone", "--mirror", remote_url, str(tmp_path)])
+        if exit_code != 0:
+            raise GitException(err)
+        for key, value in [("gc.auto", "0"), ("gc.pruneExpire", "never"), ("core.sharedRepository", "0644")]:
+            execute(["git", "config", key, value], cwd=tmp_path)
+        tmp_path.rename(mirror_path)
+    finally:
+        if tmp_path.exists(): shutil.rmtree(tmp_path)
+
+def update_mirror(store_path, remote_url: str) -> Path:
+    """ Create or fetch the mirror of `remote_url`. Returns its path. """
+    mirror_path = get_mirror_path(store_path, remote_url)
+    if not mirror_path.exists():
+        mirror_path.parent.mkdir(parents=True, exist_ok=True)
+        _create_mirror(mirror_path, remote_url)
+        return mirror_path
+    # Refs are pruned, since refs are all that students' fetches negotiate with, but objects never are.
+    (out, err, exit_code) = execute(["git", "fetch", "--prune", "origin"], cwd=mirror_path)
+    if exit_code != 0:
+        raise GitException(err)
+    return mirror_path
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Maintain mirrors of upstream repositories in a shared object store.")
+    parser.add_argument("remote_urls", nargs="+", metavar="URL", help="Upstream repositories to mirror")
+    parser.add_argument("--store", required=True, help="Directory holding the mirrors (SHARED_OBJECT_STORE_PATH)")
+    parser.add_argument("--interval", type=float, default=None, help="Keep running, updating every INTERVAL seconds")
+    args = parser.parse_args(argv)
+
+    while True:
+        failed = False
+        for remote_url in args.remote_urls:
+            try:
+                mirror_path = update_mirror(args.store, remote_url)
+                print(f"Updated mirror of { remote_url } at { mirror_path }")
+            except Exception:
+                failed = True
+                print(f"Failed to update mirror of { remote_url }", traceback.format_exc(), file=sys.stderr)
+        if args.interval is None: return 1 if failed else 0
+        time.sleep(args.interval)
+
+if __name__ == "__main__":
+    sys.exit(main())
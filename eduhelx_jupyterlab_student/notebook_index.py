@@ -0,0 +1,54 @@
+import os
+from pathlib import Path
+from .watcher import TreeWatcher
+
+class NotebookIndex:
+    """ In-memory index of the notebooks inside each assignment directory of the class repository.
+    The index is kept up to date by the repository's TreeWatcher, and an assignment's notebook list is only
+    recomputed when something inside of its directory changes.
+
+    `version` is incremented every time the notebooks in any indexed assignment change. """
+    NOTEBOOK_SUFFIX = ".ipynb"
+    CHECKPOINTS_DIRECTORY = ".ipynb_checkpoints"
+
+    def __init__(self, repo_root: Path, watcher: TreeWatcher):
+        self.repo_root = Path(repo_root)
+        self.version = 0
+        self._watcher = watcher.subscribe()
+        # assignment path -> sorted notebook paths, relative to the assignment path
+        self._notebooks: dict[str, list[str]] = {}
+
+    def refresh(self) -> None:
+        changed_dirs = self._watcher.poll()
+        if len(changed_dirs) == 0: return
+
+        for assignment_path in list(self._notebooks.keys()):
+            prefix = assignment_path + os.sep
+            if any(d == assignment_path or d.startswith(prefix) for d in changed_dirs):
+                notebooks = self._compute_notebooks(assignment_path)
+                if notebooks != self._notebooks[assignment_path]:
+                    self._notebooks[assignment_path] = notebooks
+                    self.version += 1
+
+    def get_notebooks(self, assignment_path: Path) -> list[str]:
+        assignment_path = str(assignment_path)
+        if assignment_path not in self._notebooks:
+            self._notebooks[assignment_path] = self._compute_notebooks(assignment_path)
+            self.version += 1
+        return list(self._notebooks[assignment_path])
+
+    def _compute_notebooks(self, assignment_path: str) -> list[str]:
+        prefix = assignment_path + os.sep
+        notebooks = []
+        for directory, files in self._watcher.files.items():
+            if directory != assignment_path and not directory.startswith(prefix): continue
+            relative_dir = Path(os.path.relpath(directory, assignment_path))
+            if self.CHECKPOINTS_DIRECTORY in relative_dir.parts: continue
+            notebooks += [relative_dir / file for file in files if file.endswith(self.NOTEBOOK_SUFFIX)]
+
+        # Sort by nestedness, then alphabetically
+        notebooks.sort(key=lambda path: (len(path.parents), str(path)))
+        return [str(path) for path in notebooks]
+
+    def stop(self) -> None:
+        self._watcher.unsubscribe()
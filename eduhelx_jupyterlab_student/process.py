@@ -1,4 +1,37 @@
+import time
+import asyncio
 import subprocess
+from .metrics import GIT_COMMAND_DURATION, get_git_subcommand
+
+class ProcessTimeoutException(Exception):
+    pass
+
+# Limits how many processes `execute_async` runs at once, and how long each may take by default.
+# Both are overridden by `configure` once the extension config is loaded.
+_max_concurrent_processes = 4
+_default_timeout = None
+_semaphore = None
+
+def configure(max_concurrent_processes: int | None = None, default_timeout: float | None = None):
+    global _max_concurrent_processes, _default_timeout, _semaphore
+    if max_concurrent_processes is not None:
+        _max_concurrent_processes = max_concurrent_processes
+        _semaphore = None
+    _default_timeout = default_timeout
+
+def _get_semaphore() -> asyncio.Semaphore:
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(_max_concurrent_processes)
+    return _semaphore
+
+def _observe(cmd, start: float, outcome: str) -> None:
+    subcommand = get_git_subcommand(cmd)
+    if subcommand is not None:
+        GIT_COMMAND_DURATION.observe(time.perf_counter() - start, subcommand=subcommand, outcome=outcome)
+
+def _get_outcome(exit_code: int) -> str:
+    return "success" if exit_code == 0 else "error"
 
 def remove_trailing_newline(string: str) -> str:
     if string.endswith("\n"):
@@ -6,23 +39,86 @@ def remove_trailing_newline(string: str) -> str:
     return string
 
 def execute(cmd, stdin_input=None, **kwargs):
+    start = time.perf_counter()
     process = subprocess.Popen(
         cmd,
-        stdin=subprocess.PIPE if stdin_input is not None else None
+        stdin=subprocess.PIPE if stdin_input is not None else None,
         stdout=subprocess.PIPE,
         stderr=subprocess.PIPE,
         **kwargs
     )
-    if stdin_input is not None:
-        process.stdin.write(stdin_input.encode("utf-8"))
-        process.stdin.close()
-        
-    output, error = process.communicate()
+    # Let communicate feed stdin, otherwise a large output can deadlock against a large input.
+    output, error = process.communicate(
+        stdin_input.encode("utf-8") if stdin_input is not None else None
+    )
     output = output.decode("utf-8")
     error = error.decode("utf-8")
     exit_code = process.returncode
+    _observe(cmd, start, _get_outcome(exit_code))
 
     output = remove_trailing_newline(output)
     error = remove_trailing_newline(error)
 
-    return (output, error, exit_code)
\ No newline at end of file
+    return (output, error, exit_code)
+
+def execute_to_file(cmd, file, **kwargs):
+    """ Like `execute`, but streams stdout into `file` (opened in binary mode) instead of buffering it in memory. """
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        cmd,
+        stdout=file,
+        stderr=subprocess.PIPE,
+        **kwargs
+    )
+    _, error = process.communicate()
+    error = remove_trailing_newline(error.decode("utf-8"))
+    exit_code = process.returncode
+    _observe(cmd, start, _get_outcome(exit_code))
+
+    return (error, exit_code)
+
+async def execute_async(cmd, stdin_input=None, timeout=None, **kwargs):
+    """ Non-blocking version of `execute`. Waits for a free slot if too many processes are already running.
+    The process is killed if it runs longer than `timeout` seconds (raising ProcessTimeoutException),
+    or if the awaiting task is cancelled. """
+    if timeout is None: timeout = _default_timeout
+
+    async with _get_semaphore():
+        # Started once we have a slot, so that time spent waiting for one isn't attributed to the command.
+        start = time.perf_counter()
+        process = await asyncio.create_subprocess_exec(
+            *cmd,
+            stdin=subprocess.PIPE if stdin_input is not None else None,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            **kwargs
+        )
+        try:
+            output, error = await asyncio.wait_for(
+                process.communicate(stdin_input.encode("utf-8") if stdin_input is not None else None),
+                timeout
+            )
+        except asyncio.TimeoutError:
+            await _kill(process)
+            _observe(cmd, start, "timeout")
+            raise ProcessTimeoutException(f"Command timed out after { timeout } seconds: { cmd }")
+        except asyncio.CancelledError:
+            await _kill(process)
+            _observe(cmd, start, "cancelled")
+            raise
+
+    output = remove_trailing_newline(output.decode("utf-8"))
+    error = remove_trailing_newline(error.decode("utf-8"))
+    exit_code = process.returncode
+    _observe(cmd, start, _get_outcome(exit_code))
+
+    return (output, error, exit_code)
+
+async def _kill(process: asyncio.subprocess.Process) -> None:
+    if process.returncode is not None: return
+    try:
+        process.kill()
+    except ProcessLookupError:
+        return
+    # Reap the process so it doesn't linger as a zombie.
+    await process.wait()
@@ -0,0 +1,95 @@
+import os
+import time
+from pathlib import Path
+from .git_backend import get_backend as get_git_backend
+from .watcher import TreeWatcher
+
+class RepoStatusCache:
+    """ Caches `git status` for a repository, partitioned by directory.
+
+    The cached status stays valid for as long as the index, HEAD and the worktree are unchanged.
+    The index and HEAD are checked by stat'ing/reading their files under .git, and the worktree by
+    the repository's TreeWatcher, so a lookup on an unchanged repository doesn't need to start a git process.
+    Without filesystem notifications, modifications to existing files can't be detected short of
+    stat'ing every file (which is what `git status` does), so the status is instead served for up to
+    `ttl_seconds` while the index and HEAD are unchanged. """
+
+    def __init__(self, repo_root: Path, watcher: TreeWatcher, ttl_seconds: float = 5):
+        self.repo_root = Path(repo_root)
+        self.git_dir = self.repo_root / ".git"
+        self.ttl_seconds = ttl_seconds
+        self._subscription = watcher.subscribe() if watcher.uses_notifications else None
+        self._generation = 0
+        self._generation_started = time.monotonic()
+        self._signature = None
+        self._modified_paths: list[dict] | None = None
+        # directory (relative to the repo root) -> the modified paths inside of it
+        self._partitions: dict[str, list[dict]] = {}
+
+    def _stat_signature(self, path: Path):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def _read(self, path: Path) -> str | None:
+        try:
+            return path.read_text().strip()
+        except FileNotFoundError:
+            return None
+
+    def _head_signature(self):
+        head = self._read(self.git_dir / "HEAD")
+        if head is None or not head.startswith("ref: "): return (head,)
+        # HEAD is a symbolic ref, so it moves whenever the branch it points to does.
+        ref = head[len("ref: "):]
+        return (head, self._read(self.git_dir / ref), self._stat_signature(self.git_dir / "packed-refs"))
+
+    def _worktree_generation(self) -> int:
+        """ Bumped every time something in the worktree changes, or without notifications, every `ttl_seconds`. """
+        if self._subscription is not None:
+            if len(self._subscription.poll()) > 0: self._generation += 1
+        elif time.monotonic() - self._generation_started >= self.ttl_seconds:
+            self._generation += 1
+            self._generation_started = time.monotonic()
+        return self._generation
+
+    def _compute_signature(self):
+        if not self.git_dir.is_dir():
+            # Worktrees and submodules keep their git dir elsewhere, so don't try to cache them.
+            return None
+        return (
+            self._stat_signature(self.git_dir / "index"),
+            self._head_signature(),
+            self._worktree_generation()
+        )
+
+    def invalidate(self) -> None:
+        self._signature = None
+        self._modified_paths = None
+        self._partitions = {}
+
+    async def get_modified_paths(self, directory_path: str | None = None) -> list[dict]:
+        """ Get the modified paths in the repository, or only those inside of `directory_path`
+        (relative to the repository root). Paths are always relative to the repository root. """
+        signature = self._compute_signature()
+        if signature is None or signature != self._signature or self._modified_paths is None:
+            self._modified_paths = await get_git_backend().get_modified_paths(path=self.repo_root)
+            self._partitions = {}
+            self._signature = signature
+
+        if directory_path is None: return [dict(p) for p in self._modified_paths]
+
+        directory_path = os.path.normpath(directory_path)
+        if directory_path not in self._partitions:
+            prefix = directory_path + "/"
+            self._partitions[directory_path] = [
+                p for p in self._modified_paths
+                # An assignment at the repo root (directory path "." or "") contains every path.
+                if directory_path == "." or p["path"] == directory_path or p["path"].startswith(prefix)
+            ]
+        return [dict(p) for p in self._partitions[directory_path]]
+
+    def stop(self) -> None:
+        if self._subscription is not None: self._subscription.unsubscribe()
@@ -2,6 +2,7 @@ import os
 from pathlib import Path
 from eduhelx_utils.git import InvalidGitRepositoryException
 from eduhelx_utils import git
+from .file_matcher import get_assignment_file_matcher
 
 class NotStudentClassRepositoryException(Exception):
     pass
@@ -10,6 +11,36 @@ class NotInAnAssignmentException(Exception):
     pass
 
 
+class AssignmentPathIndex:
+    """ Maps the resolved directory of each assignment to the assignment's position in the assignment list,
+    so that finding the assignment containing a (resolved) path only needs to walk up the path's parents,
+    without touching the filesystem. """
+    def __init__(self, repo_root: str, assignments):
+        self._assignment_indices: dict[str, int] = {}
+        for i, assignment in enumerate(assignments):
+            assignment_path = os.path.realpath(os.path.join(repo_root, assignment["directory_path"]))
+            # If several assignments share a directory, the first one in the list wins.
+            self._assignment_indices.setdefault(assignment_path, i)
+
+    @staticmethod
+    def get_key(repo_root: str, assignments) -> tuple:
+        """ Identifies the assignment list the index was built for. """
+        return (repo_root, tuple((assignment["id"], assignment["directory_path"]) for assignment in assignments))
+
+    def lookup(self, path: str) -> int | None:
+        """ Returns the position of the assignment that `path` (which must already be resolved) is in. """
+        assignment_index = None
+        while True:
+            i = self._assignment_indices.get(path)
+            # Assignment directories may be nested, in which case the one earliest in the list wins.
+            if i is not None and (assignment_index is None or i < assignment_index):
+                assignment_index = i
+            parent = os.path.dirname(path)
+            if parent == path: break
+            path = parent
+        return assignment_index
+
+
 """ Note: this class is naive to the fixed repo path. It is designed for
 relative interaction with class repository filepaths WHILE inside the repository. """
 class StudentClassRepo:
@@ -24,13 +55,23 @@ class StudentClassRepo:
     UPSTREAM_TRACKING_BRANCH = f"{ UPSTREAM_REMOTE_NAME }/{ MAIN_BRANCH_NAME }"
     ORIGIN_TRACKING_BRANCH = f"{ ORIGIN_REMOTE_NAME }/{ MAIN_BRANCH_NAME }"
 
+    # (cwd, course name) -> resolved repo root
+    _resolved_repo_roots: dict[tuple[str, str], str] = {}
+    # The index is only rebuilt when the assignment list (or repo root) changes.
+    _path_index_key: tuple | None = None
+    _path_index: AssignmentPathIndex | None = None
+
     def __init__(self, course, assignments, current_path):
         self.course = course
         self.assignments = assignments
         self.current_path = os.path.realpath(current_path)
         
         self.repo_root = self._compute_repo_root(self.course["name"], self.current_path)
-        self.current_assignment = self._compute_current_assignment(self.assignments, self.repo_root, self.current_path)
+        self.current_assignment = self._compute_current_assignment(
+            self.assignments,
+            self._resolve_repo_root(self.course["name"]),
+            self.current_path
+        )
 
     @property
     def current_assignment_path(self) -> Path | None:
@@ -41,36 +82,50 @@ class StudentClassRepo:
         return self.repo_root / assignment["directory_path"]
 
     def get_protected_file_paths(self, assignment) -> list[Path]:
+        """ Walks the assignment directory once, checking every path against the compiled protected file globs
+        (the same ones the sync classifies conflicts with), rather than walking it again for each glob. """
+        file_matcher = get_assignment_file_matcher(self.assignments)
+        assignment_path = self.get_assignment_path(assignment)
         files = []
-        for glob_pattern in assignment["protected_files"]:
-            files += self.get_assignment_path(assignment).glob(glob_pattern)
+        for directory, dirnames, filenames in os.walk(assignment_path):
+            dirnames[:] = [dirname for dirname in dirnames if dirname != ".git"]
+            for name in dirnames + filenames:
+                path = Path(directory) / name
+                if file_matcher.is_protected(path.relative_to(self.repo_root)):
+                    files.append(path)
         return files
     
+    @classmethod
+    def _resolve_repo_root(cls, course_name) -> str:
+        key = (os.getcwd(), course_name)
+        if key not in cls._resolved_repo_roots:
+            cls._resolved_repo_roots[key] = os.path.realpath(cls.FIXED_REPO_ROOT.format(course_name.replace(" ", "_")))
+        return cls._resolved_repo_roots[key]
+
     @classmethod
     def _compute_repo_root(cls, course_name, current_path: str | None = None):
-        """ Validates that user is in the repository root if current_path is provided """
+        """ Validates that user is in the repository root if current_path (resolved) is provided """
         repo_root = Path(cls.FIXED_REPO_ROOT.format(course_name.replace(" ", "_")))
         if current_path is not None:
-            try:
-                Path(os.path.realpath(current_path)).relative_to(os.path.realpath(repo_root))
-            except ValueError:
+            resolved_repo_root = cls._resolve_repo_root(course_name)
+            if current_path != resolved_repo_root and not current_path.startswith(resolved_repo_root + os.sep):
                 raise NotStudentClassRepositoryException()
         return repo_root
 
-    @staticmethod
-    def _compute_current_assignment(assignments, repo_root, current_path):
-        current_assignment = None
-        current_path_abs = Path(current_path).resolve()
-        for assignment in assignments:
-            assignment_path = Path(os.path.join(
-                repo_root,
-                assignment["directory_path"]
-            )).resolve()
-            if assignment_path == current_path_abs or assignment_path in current_path_abs.parents:
-                current_assignment = assignment
-                break
-
-        return current_assignment
+    @classmethod
+    def _get_path_index(cls, resolved_repo_root: str, assignments) -> AssignmentPathIndex:
+        key = AssignmentPathIndex.get_key(resolved_repo_root, assignments)
+        if key != cls._path_index_key:
+            cls._path_index = AssignmentPathIndex(resolved_repo_root, assignments)
+            cls._path_index_key = key
+        return cls._path_index
+
+    @classmethod
+    def _compute_current_assignment(cls, assignments, resolved_repo_root: str, current_path: str):
+        """ Both `resolved_repo_root` and `current_path` must be resolved """
+        assignment_index = cls._get_path_index(resolved_repo_root, assignments).lookup(current_path)
+        if assignment_index is None: return None
+        return assignments[assignment_index]
 
     @classmethod
     def from_assignment_no_path(cls, course, assignments, assignment_id: int):
@@ -79,7 +134,7 @@ class StudentClassRepo:
         except IndexError:
             raise NotInAnAssignmentException
         
-        repo_root = cls._compute_repo_root(course["name"]).resolve()
+        repo_root = Path(cls._resolve_repo_root(course["name"]))
         assignment_path = repo_root / assignment["directory_path"]
 
         return cls(
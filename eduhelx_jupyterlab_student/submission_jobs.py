@@ -0,0 +1,110 @@
+import asyncio
+import time
+import uuid
+import traceback
+from collections import OrderedDict
+from typing import Awaitable, Callable
+
+class SubmissionInProgressException(Exception):
+    pass
+
+def get_error_message(e: Exception) -> str:
+    """ Some exceptions (e.g. InvalidGitRepositoryException()) have no message, so fall back to their type. """
+    return str(e) or type(e).__name__
+
+class SubmissionJob:
+    """ A submission that runs in the background. Its progress is reported through `stages`, in order:
+    queued -> staged -> committed -> registered -> pushed. A job that fails ends in the "failed" stage,
+    and if it had already committed, it passes through "rolled_back" first. """
+    QUEUED = "queued"
+    STAGED = "staged"
+    COMMITTED = "committed"
+    REGISTERED = "registered"
+    PUSHED = "pushed"
+    ROLLED_BACK = "rolled_back"
+    FAILED = "failed"
+
+    def __init__(self, repo_root: str, assignment_id: int):
+        self.id = uuid.uuid4().hex
+        self.repo_root = repo_root
+        self.assignment_id = assignment_id
+        self.stages: list[dict] = []
+        self.commit_id: str | None = None
+        # Whether the student notebook is identical to the one in the assignment's previous submission.
+        self.notebook_unchanged: bool | None = None
+        self.error: str | None = None
+        self.on_progress: Callable[["SubmissionJob"], None] | None = None
+        self.advance(self.QUEUED)
+
+    @property
+    def status(self) -> str:
+        return self.stages[-1]["stage"]
+
+    @property
+    def done(self) -> bool:
+        return self.status in (self.PUSHED, self.FAILED)
+
+    def advance(self, stage: str) -> None:
+        self.stages.append({ "stage": stage, "time": time.time() })
+        if self.on_progress is not None: self.on_progress(self)
+
+    def fail(self, error: str, rolled_back: bool = False) -> None:
+        self.error = error
+        if rolled_back: self.advance(self.ROLLED_BACK)
+        self.advance(self.FAILED)
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "assignment_id": self.assignment_id,
+            "status": self.status,
+            "done": self.done,
+            "stages": self.stages,
+            "commit_id": self.commit_id,
+            "notebook_unchanged": self.notebook_unchanged,
+            "error": self.error
+        }
+
+
+class SubmissionJobQueue:
+    """ Runs submission jobs in the background, allowing only one active job per repository
+    so that two submissions can never commit to the same repository concurrently. """
+    # How many finished jobs to remember for status lookups.
+    MAX_FINISHED_JOBS = 50
+
+    def __init__(self, on_progress: Callable[[SubmissionJob], None]):
+        self.on_progress = on_progress
+        self.jobs: OrderedDict[str, SubmissionJob] = OrderedDict()
+        self._active_jobs: dict[str, SubmissionJob] = {}
+
+    def get(self, job_id: str) -> SubmissionJob | None:
+        return self.jobs.get(job_id)
+
+    def get_active_job(self, repo_root: str) -> SubmissionJob | None:
+        return self._active_jobs.get(repo_root)
+
+    def submit(self, job: SubmissionJob, run: Callable[[SubmissionJob], Awaitable[None]]) -> SubmissionJob:
+        if job.repo_root in self._active_jobs:
+            raise SubmissionInProgressException()
+
+        self._active_jobs[job.repo_root] = job
+        self.jobs[job.id] = job
+        job.on_progress = self.on_progress
+        self.on_progress(job)
+        asyncio.ensure_future(self._run(job, run))
+        return job
+
+    async def _run(self, job: SubmissionJob, run: Callable[[SubmissionJob], Awaitable[None]]) -> None:
+        try:
+            await run(job)
+        except Exception as e:
+            print(traceback.format_exc())
+            if not job.done: job.fail(get_error_message(e))
+        finally:
+            del self._active_jobs[job.repo_root]
+            self._prune()
+
+    def _prune(self) -> None:
+        finished_job_ids = [job_id for job_id, job in self.jobs.items() if job.done]
+        for job_id in finished_job_ids[:max(0, len(finished_job_ids) - self.MAX_FINISHED_JOBS)]:
+            del self.jobs[job_id]
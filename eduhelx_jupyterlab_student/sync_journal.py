@@ -0,0 +1,129 @@
+import json
+import time
+import threading
+from pathlib import Path
+from contextlib import contextmanager
+from .metrics import SYNC_PHASE_DURATION, SYNC_RUNS
+
+class SyncRun:
+    """ Record of a single run of the upstream sync: how long each phase took, how many conflicts
+    it ran into, how much it had to back up, and how it ended. """
+    # Phases, in the order they run.
+    REMOTE_CHECK = "remote_check"
+    FETCH = "fetch"
+    ANCESTRY_CHECK = "ancestry_check"
+    STASH = "stash"
+    MERGE = "merge"
+    CONFLICT_RESOLUTION = "conflict_resolution"
+    POP = "pop"
+    FAST_FORWARD = "fast_forward"
+    # How the upstream changes were merged.
+    IN_MEMORY_MERGE = "in_memory"
+    STASH_MERGE = "stash"
+
+    def __init__(self):
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        # phase -> total seconds spent in it
+        self.phases: dict[str, float] = {}
+        self.merge_conflicts = 0
+        self.stash_conflicts = 0
+        self.backed_up_files = 0
+        self.backed_up_bytes = 0
+        self.local_head: str | None = None
+        self.upstream_head: str | None = None
+        self.merge_strategy: str | None = None
+        self.outcome: str | None = None
+        self.error: str | None = None
+        self.duration: float | None = None
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.phases[name] = self.phases.get(name, 0) + elapsed
+            SYNC_PHASE_DURATION.observe(elapsed, phase=name)
+
+    def record_backup(self, size: int | None) -> None:
+        if size is None: return
+        self.backed_up_files += 1
+        self.backed_up_bytes += size
+
+    def finish(self, outcome: str, error: str | None = None) -> None:
+        self.outcome = outcome
+        self.error = error
+        self.duration = time.perf_counter() - self._start
+        SYNC_RUNS.inc(outcome=outcome)
+
+    def to_dict(self) -> dict:
+        return {
+            "started_at": self.started_at,
+            "duration": self.duration,
+            "outcome": self.outcome,
+            "error": self.error,
+            "phases": self.phases,
+            "merge_conflicts": self.merge_conflicts,
+            "stash_conflicts": self.stash_conflicts,
+            "backed_up_files": self.backed_up_files,
+            "backed_up_bytes": self.backed_up_bytes,
+            "local_head": self.local_head,
+            "upstream_head": self.upstream_head,
+            "merge_strategy": self.merge_strategy
+        }
+
+
+class SyncJournal:
+    """ Bounded, append-only JSON lines log of sync runs.
+    Runs are appended as they finish. Once the file holds twice `max_entries` runs, it's compacted
+    down to the most recent `max_entries`, so appending stays cheap and the file can't grow unbounded. """
+    def __init__(self, journal_path: Path, max_entries: int):
+        self.journal_path = Path(journal_path)
+        self.max_entries = max_entries
+        self._entry_count: int | None = None
+        self._lock = threading.Lock()
+
+    def _read_entries(self) -> list[dict]:
+        try:
+            lines = self.journal_path.read_text().splitlines()
+        except FileNotFoundError:
+            return []
+        entries = []
+        for line in lines:
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                # A crash mid-append can leave a truncated final line behind.
+                continue
+        return entries
+
+    def _compact(self, entries: list[dict]) -> None:
+        entries = entries[-self.max_entries:]
+        tmp_path = self.journal_path.with_name(self.journal_path.name + ".tmp")
+        tmp_path.write_text("".join(json.dumps(entry) + "\n" for entry in entries))
+        tmp_path.replace(self.journal_path)
+        self._entry_count = len(entries)
+
+    def append(self, run: SyncRun) -> None:
+        with self._lock:
+            self.journal_path.parent.mkdir(parents=True, exist_ok=True)
+            if self._entry_count is None:
+                self._entry_count = len(self._read_entries())
+            with open(self.journal_path, "a") as f:
+                f.write(json.dumps(run.to_dict()) + "\n")
+            self._entry_count += 1
+            if self._entry_count >= 2 * self.max_entries:
+                self._compact(self._read_entries())
+
+    def get_runs(self, limit: int | None = None, outcome: str | None = None) -> list[dict]:
+        """ Get recorded runs, most recent first. """
+        with self._lock:
+            entries = self._read_entries()[-self.max_entries:]
+        entries.reverse()
+        if outcome is not None:
+            entries = [entry for entry in entries if entry["outcome"] == outcome]
+        if limit is not None:
+            entries = entries[:limit]
+        return entries
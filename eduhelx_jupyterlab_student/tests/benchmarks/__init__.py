@@ -0,0 +1,14 @@
+"""Handler-level benchmarks for eduhelx_jupyterlab_student.
+
+These run against synthetic class repositories generated on local disk, with bare git repositories
+standing in for the `upstream` and `origin` remotes and an in-process stub for the grader API.
+
+They're skipped unless BENCH=1 is set, so they stay out of the regular test run:
+    BENCH=1 pytest eduhelx_jupyterlab_student/tests/benchmarks
+
+Scale is configured through environment variables (see `BenchmarkScale`), e.g.
+    BENCH=1 BENCH_ASSIGNMENTS=20 BENCH_SUBMISSIONS=100 pytest eduhelx_jupyterlab_student/tests/benchmarks
+
+Set BENCH_OUTPUT to write the results as JSON, and BENCH_BASELINE to a previous results file to fail
+any benchmark whose median latency regressed by more than BENCH_TOLERANCE (a ratio, 1.5 by default).
+"""
@@ -0,0 +1,282 @@
+import os
+import json
+import time
+import random
+import subprocess
+import statistics
+import tracemalloc
+import pytest
+from pathlib import Path
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
+def pytest_collection_modifyitems(config, items):
+    """ Benchmarks generate whole course repositories and take a while, so they only run when BENCH=1. """
+    if os.environ.get("BENCH") == "1": return
+    skip_benchmark = pytest.mark.skip(reason="benchmarks only run with BENCH=1")
+    benchmarks_dir = Path(__file__).parent
+    for item in items:
+        if benchmarks_dir in Path(item.fspath).parents:
+            item.add_marker(skip_benchmark)
+
+def _env_int(name: str, default: int) -> int:
+    return int(os.environ.get(name, default))
+
+@dataclass
+class BenchmarkScale:
+    assignments: int = _env_int("BENCH_ASSIGNMENTS", 5)
+    notebooks_per_assignment: int = _env_int("BENCH_NOTEBOOKS", 5)
+    submissions: int = _env_int("BENCH_SUBMISSIONS", 20)
+    large_files: int = _env_int("BENCH_LARGE_FILES", 2)
+    large_file_size_mb: int = _env_int("BENCH_LARGE_FILE_MB", 5)
+    upstream_commits: int = _env_int("BENCH_UPSTREAM_COMMITS", 20)
+    rounds: int = _env_int("BENCH_ROUNDS", 10)
+
+
+COURSE_NAME = "Benchmark Course"
+USER_NAME = "benchstudent"
+USER_EMAIL = "benchstudent@example.com"
+
+def git(*args, cwd):
+    return subprocess.run(
+        ["git", "-c", f"user.name={ USER_NAME }", "-c", f"user.email={ USER_EMAIL }", *args],
+        cwd=cwd, check=True, capture_output=True, text=True
+    ).stdout.strip()
+
+def write_notebook(path: Path, marker: str = "") -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps({
+        "cells": [{ "cell_type": "code", "metadata": {}, "outputs": [], "source": [f"print({ marker !r})"] }],
+        "metadata": {},
+        "nbformat": 4,
+        "nbformat_minor": 5
+    }))
+
+
+class StubApi:
+    """ In-process stand-in for `eduhelx_utils.api.Api`, serving the synthetic course. """
+    def __init__(self, course, student, assignments):
+        self.course = course
+        self.student = student
+        self.assignments = assignments
+        self.submissions: dict[int, list] = { assignment["id"]: [] for assignment in assignments }
+        self.calls: dict[str, int] = {}
+
+    def _record(self, name):
+        self.calls[name] = self.calls.get(name, 0) + 1
+
+    async def get_course(self):
+        self._record("get_course")
+        return json.loads(json.dumps(self.course))
+
+    async def get_my_user(self):
+        self._record("get_my_user")
+        return json.loads(json.dumps(self.student))
+
+    async def get_my_assignments(self):
+        self._record("get_my_assignments")
+        return json.loads(json.dumps(self.assignments))
+
+    async def get_my_submissions(self, assignment_id):
+        self._record("get_my_submissions")
+        return json.loads(json.dumps(self.submissions[assignment_id]))
+
+    async def get_settings(self):
+        self._record("get_settings")
+        return { "gitea_ssh_url": "ssh://git@localhost:2222" }
+
+    async def create_submission(self, assignment_id, commit_id, student_notebook_content):
+        self._record("create_submission")
+        submissions = self.submissions[assignment_id]
+        submissions.append({
+            "id": sum(len(s) for s in self.submissions.values()) + 1,
+            "active": True,
+            "commit_id": commit_id,
+            "submission_time": datetime.now(timezone.utc).isoformat()
+        })
+
+    async def mark_my_fork_as_cloned(self):
+        self._record("mark_my_fork_as_cloned")
+        self.student["fork_cloned"] = True
+
+    async def set_ssh_key(self, name, public_key):
+        self._record("set_ssh_key")
+
+
+@dataclass
+class BenchmarkEnvironment:
+    scale: BenchmarkScale
+    api: StubApi
+    repo_root: Path
+    upstream_work: Path
+
+    def push_upstream_commit(self, n: int) -> None:
+        """ Commit a change to the first assignment on the upstream remote. """
+        assignment = self.api.assignments[0]
+        write_notebook(self.upstream_work / assignment["directory_path"] / "updates" / f"update_{ n }.ipynb", str(n))
+        git("add", "-A", cwd=self.upstream_work)
+        git("commit", "-m", f"Upstream update { n }", cwd=self.upstream_work)
+        git("push", "-q", "origin", "main", cwd=self.upstream_work)
+
+
+@pytest.fixture
+def bench_scale() -> BenchmarkScale:
+    return BenchmarkScale()
+
+@pytest.fixture
+def bench_env(tmp_path, monkeypatch, bench_scale) -> BenchmarkEnvironment:
+    """ Generate a synthetic course: bare upstream/origin remotes and a student repository cloned from them.
+    The student repository lives at the fixed repo root, relative to the (temporary) working directory. """
+    monkeypatch.chdir(tmp_path)
+    upstream_bare = tmp_path / "remotes" / "upstream.git"
+    origin_bare = tmp_path / "remotes" / "origin.git"
+    upstream_work = tmp_path / "upstream-work"
+
+    assignments = []
+    upstream_work.mkdir()
+    git("init", "-q", "-b", "main", cwd=upstream_work)
+    for i in range(bench_scale.assignments):
+        directory_path = f"assignment_{ i }"
+        for j in range(bench_scale.notebooks_per_assignment):
+            # Spread notebooks across a few levels of nesting, like real course material.
+            write_notebook(upstream_work / directory_path / ("nested/" * (j % 3)) / f"notebook_{ j }.ipynb", f"{ i }-{ j }")
+        write_notebook(upstream_work / directory_path / "student.ipynb", f"student { i }")
+        assignments.append({
+            "id": i + 1,
+            "name": f"Assignment { i }",
+            "directory_path": directory_path,
+            "student_notebook_path": "student.ipynb",
+            "protected_files": ["nested/**/*.ipynb"],
+            "overwritable_files": ["data/*"],
+            "max_attempts": None,
+            "current_attempts": 0
+        })
+
+    rng = random.Random(0)
+    for k in range(bench_scale.large_files):
+        data_path = upstream_work / "assignment_0" / "data" / f"dataset_{ k }.bin"
+        data_path.parent.mkdir(parents=True, exist_ok=True)
+        data_path.write_bytes(rng.randbytes(bench_scale.large_file_size_mb * 1024 * 1024))
+
+    git("add", "-A", cwd=upstream_work)
+    git("commit", "-q", "-m", "Initial course material", cwd=upstream_work)
+    for n in range(bench_scale.upstream_commits):
+        (upstream_work / "CHANGELOG.md").write_text(f"Revision { n }\n")
+        git("add", "-A", cwd=upstream_work)
+        git("commit", "-q", "-m", f"Revision { n }", cwd=upstream_work)
+
+    upstream_bare.parent.mkdir(parents=True)
+    git("clone", "-q", "--bare", str(upstream_work), str(upstream_bare), cwd=tmp_path)
+    git("clone", "-q", "--bare", str(upstream_bare), str(origin_bare), cwd=tmp_path)
+    git("remote", "add", "origin", str(upstream_bare), cwd=upstream_work)
+
+    repo_root = tmp_path / "eduhelx" / f"{ COURSE_NAME.replace(' ', '_') }-student"
+    repo_root.parent.mkdir(parents=True)
+    git("clone", "-q", str(origin_bare), str(repo_root), cwd=tmp_path)
+    git("remote", "add", "upstream", str(upstream_bare), cwd=repo_root)
+    git("fetch", "-q", "upstream", cwd=repo_root)
+    git("config", "user.name", USER_NAME, cwd=repo_root)
+    git("config", "user.email", USER_EMAIL, cwd=repo_root)
+
+    course = {
+        "id": 1,
+        "name": COURSE_NAME,
+        "master_remote_url": str(upstream_bare),
+        "instructors": []
+    }
+    student = {
+        "id": 1,
+        "onyen": USER_NAME,
+        "email": USER_EMAIL,
+        "fork_remote_url": str(origin_bare),
+        "fork_cloned": True
+    }
+    api = StubApi(course, student, assignments)
+
+    # Submission history for the first assignment.
+    student_notebook = repo_root / "assignment_0" / "student.ipynb"
+    for k in range(bench_scale.submissions):
+        write_notebook(student_notebook, f"attempt { k }")
+        git("commit", "-q", "-am", f"Submission { k }", cwd=repo_root)
+        api.submissions[1].append({
+            "id": k + 1,
+            "active": True,
+            "commit_id": git("rev-parse", "HEAD", cwd=repo_root),
+            "submission_time": datetime.now(timezone.utc).isoformat()
+        })
+    git("push", "-q", "origin", "main", cwd=repo_root)
+
+    return BenchmarkEnvironment(scale=bench_scale, api=api, repo_root=repo_root, upstream_work=upstream_work)
+
+@pytest.fixture
+def bench_context(bench_env, monkeypatch):
+    """ An AppContext wired to the stub API, installed as the handlers' shared context. """
+    from eduhelx_jupyterlab_student.handlers import AppContext, BaseHandler
+    from eduhelx_jupyterlab_student.cache import CachedApi
+
+    monkeypatch.setenv("GRADER_API_URL", "http://localhost/")
+    monkeypatch.setenv("USER_NAME", USER_NAME)
+    monkeypatch.setenv("USER_AUTOGEN_PASSWORD", "password")
+    context = AppContext(None)
+    context.api = CachedApi(bench_env.api, ttls=context.api._ttls)
+    monkeypatch.setattr(BaseHandler, "context", context)
+    return context
+
+
+class BenchmarkRecorder:
+    def __init__(self):
+        self.results: dict[str, dict] = {}
+
+    async def measure(self, name: str, fn, rounds: int, setup=None) -> dict:
+        """ Time `rounds` awaits of `fn()`, then run it once more under tracemalloc to record peak allocations.
+        `setup`, if given, runs untimed before every round. """
+        latencies = []
+        for i in range(rounds):
+            if setup is not None: await setup(i)
+            start = time.perf_counter()
+            await fn()
+            latencies.append(time.perf_counter() - start)
+
+        if setup is not None: await setup(rounds)
+        tracemalloc.start()
+        try:
+            await fn()
+            _, peak_bytes = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        latencies.sort()
+        result = {
+            "rounds": rounds,
+            "mean_ms": statistics.mean(latencies) * 1000,
+            "p50_ms": statistics.median(latencies) * 1000,
+            "p95_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000,
+            "max_ms": latencies[-1] * 1000,
+            "peak_alloc_kb": peak_bytes / 1024
+        }
+        self.results[name] = result
+        print(f"\n{ name }: " + ", ".join(f"{ key }={ value:.2f}" for key, value in result.items()))
+        return result
+
+    def check_baseline(self, name: str) -> str | None:
+        """ Returns a description of the regression if `name` got slower than the baseline allows. """
+        baseline_path = os.environ.get("BENCH_BASELINE")
+        if baseline_path is None: return None
+        tolerance = float(os.environ.get("BENCH_TOLERANCE", 1.5))
+        baseline = json.loads(Path(baseline_path).read_text())
+        if name not in baseline: return None
+        result, expected = self.results[name], baseline[name]
+        if result["p50_ms"] <= expected["p50_ms"] * tolerance: return None
+        return f"{ name }: p50 { result['p50_ms']:.2f}ms vs baseline { expected['p50_ms']:.2f}ms"
+
+
+_recorder = BenchmarkRecorder()
+
+@pytest.fixture
+def benchmark_recorder() -> BenchmarkRecorder:
+    return _recorder
+
+def pytest_sessionfinish(session, exitstatus):
+    output_path = os.environ.get("BENCH_OUTPUT")
+    if output_path is not None and len(_recorder.results) > 0:
+        Path(output_path).write_text(json.dumps(_recorder.results, indent=2))
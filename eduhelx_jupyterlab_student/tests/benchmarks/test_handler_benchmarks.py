@@ -0,0 +1,106 @@
+import os
+import asyncio
+import pytest
+from eduhelx_jupyterlab_student.handlers import (
+    AssignmentsHandler, NotebookFilesHandler, SubmissionHandler, sync_upstream_repository
+)
+from eduhelx_jupyterlab_student.student_repo import StudentClassRepo
+from eduhelx_jupyterlab_student.submission_jobs import SubmissionJob
+from .conftest import write_notebook, git
+
+
+def assert_no_regression(benchmark_recorder, name):
+    regression = benchmark_recorder.check_baseline(name)
+    assert regression is None, regression
+
+
+@pytest.mark.asyncio
+async def test_assignments_handler(bench_env, bench_context, benchmark_recorder):
+    assignment_path = os.path.relpath(bench_env.repo_root / "assignment_0")
+
+    await benchmark_recorder.measure(
+        "assignments_handler",
+        lambda: AssignmentsHandler.get_value(assignment_path),
+        rounds=bench_env.scale.rounds
+    )
+    assert_no_regression(benchmark_recorder, "assignments_handler")
+
+
+
+@pytest.mark.asyncio
+async def test_assignments_handler_concurrent_tabs(bench_env, bench_context, benchmark_recorder):
+    assignment_path = os.path.relpath(bench_env.repo_root / "assignment_0")
+
+    async def poll_from_every_tab():
+        # Concurrent requests for the same path share a single computation.
+        values = await asyncio.gather(*[AssignmentsHandler.get_value(assignment_path) for _ in range(10)])
+        assert len(set(values)) == 1
+
+    await benchmark_recorder.measure(
+        "assignments_handler_concurrent_tabs",
+        poll_from_every_tab,
+        rounds=bench_env.scale.rounds
+    )
+    assert len(bench_context.computations) == 0
+    assert_no_regression(benchmark_recorder, "assignments_handler_concurrent_tabs")
+
+
+@pytest.mark.asyncio
+async def test_notebook_files_handler(bench_env, bench_context, benchmark_recorder):
+    await benchmark_recorder.measure(
+        "notebook_files_handler",
+        NotebookFilesHandler.get_value,
+        rounds=bench_env.scale.rounds
+    )
+    assert_no_regression(benchmark_recorder, "notebook_files_handler")
+
+
+@pytest.mark.asyncio
+async def test_submission_handler(bench_env, bench_context, benchmark_recorder):
+    course = await bench_env.api.get_course()
+    assignments = await bench_env.api.get_my_assignments()
+    student_repo = StudentClassRepo.from_assignment_no_path(course, assignments, 1)
+    student_notebook_path = student_repo.current_assignment_path / "student.ipynb"
+
+    async def setup(i):
+        write_notebook(student_notebook_path, f"benchmark attempt { i }")
+
+    async def submit():
+        job = SubmissionJob(str(student_repo.repo_root), 1)
+        await SubmissionHandler.run_job(job, student_repo, student_notebook_path, "Benchmark submission", None)
+        assert job.status == SubmissionJob.PUSHED, job.error
+
+    await benchmark_recorder.measure("submission_handler", submit, rounds=bench_env.scale.rounds, setup=setup)
+    assert_no_regression(benchmark_recorder, "submission_handler")
+
+
+@pytest.mark.asyncio
+async def test_sync_upstream_repository(bench_env, bench_context, benchmark_recorder):
+    course = await bench_env.api.get_course()
+
+    async def setup(i):
+        bench_env.push_upstream_commit(i)
+
+    await benchmark_recorder.measure(
+        "sync_upstream_repository",
+        lambda: sync_upstream_repository(bench_context, course),
+        rounds=bench_env.scale.rounds,
+        setup=setup
+    )
+    upstream_head = git("rev-parse", "upstream/main", cwd=bench_env.repo_root)
+    assert git("merge-base", "--is-ancestor", upstream_head, "main", cwd=bench_env.repo_root) == ""
+    assert_no_regression(benchmark_recorder, "sync_upstream_repository")
+
+
+@pytest.mark.asyncio
+async def test_sync_upstream_repository_idle(bench_env, bench_context, benchmark_recorder):
+    course = await bench_env.api.get_course()
+    # Bring the repo up to date so that every measured sync has nothing to do.
+    await sync_upstream_repository(bench_context, course)
+
+    await benchmark_recorder.measure(
+        "sync_upstream_repository_idle",
+        lambda: sync_upstream_repository(bench_context, course),
+        rounds=bench_env.scale.rounds
+    )
+    assert_no_regression(benchmark_recorder, "sync_upstream_repository_idle")
@@ -0,0 +1,70 @@
+import asyncio
+import pytest
+from eduhelx_jupyterlab_student.cache import CachedApi, TTLCache
+
+
+class StubApi:
+    def __init__(self):
+        self.submissions: list[dict] = []
+        self.calls = 0
+        # While set, reads wait on `release` after taking their snapshot, like a slow request.
+        self.hold_reads = False
+        self.read_started = asyncio.Event()
+        self.release = asyncio.Event()
+
+    async def get_my_submissions(self, assignment_id):
+        self.calls += 1
+        snapshot = list(self.submissions)
+        if self.hold_reads:
+            self.read_started.set()
+            await self.release.wait()
+        return snapshot
+
+    async def create_submission(self, assignment_id, commit_id, student_notebook_content):
+        self.submissions.append({ "id": len(self.submissions) + 1, "commit_id": commit_id })
+
+
+@pytest.mark.asyncio
+async def test_cached_reads():
+    api = StubApi()
+    cached_api = CachedApi(api, ttls={ "get_my_submissions": 60 })
+    assert await cached_api.get_my_submissions(1) == []
+    assert await cached_api.get_my_submissions(1) == []
+    assert api.calls == 1
+
+    await cached_api.create_submission(1, "abc", "{}")
+    assert [s["commit_id"] for s in await cached_api.get_my_submissions(1)] == ["abc"]
+    assert api.calls == 2
+
+@pytest.mark.asyncio
+async def test_invalidation_during_fetch():
+    """ A read that started before a submission was created mustn't cache the pre-submission submissions. """
+    api = StubApi()
+    cached_api = CachedApi(api, ttls={ "get_my_submissions": 60 })
+    api.hold_reads = True
+    stale_read = asyncio.ensure_future(cached_api.get_my_submissions(1))
+    await api.read_started.wait()
+
+    await cached_api.create_submission(1, "abc", "{}")
+    api.hold_reads = False
+    # Reads started after the invalidation don't join the stale fetch.
+    fresh_read = await cached_api.get_my_submissions(1)
+    api.release.set()
+    assert await stale_read == []
+
+    assert [s["commit_id"] for s in fresh_read] == ["abc"]
+    assert [s["commit_id"] for s in await cached_api.get_my_submissions(1)] == ["abc"]
+
+@pytest.mark.asyncio
+async def test_clear_during_fetch():
+    cache = TTLCache()
+    release = asyncio.Event()
+    async def fetch():
+        await release.wait()
+        return "stale"
+    fetching = asyncio.ensure_future(cache.get_or_fetch("key", 60, fetch))
+    await asyncio.sleep(0)
+    cache.clear()
+    release.set()
+    assert await fetching == "stale"
+    assert "key" not in cache
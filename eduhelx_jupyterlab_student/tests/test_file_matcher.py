@@ -0,0 +1,84 @@
+import re
+import pytest
+from pathlib import Path
+from eduhelx_jupyterlab_student.file_matcher import AssignmentFileMatcher, translate_glob
+from eduhelx_jupyterlab_student.student_repo import StudentClassRepo
+
+
+def matches(pattern: str, path: str) -> bool:
+    return re.fullmatch(translate_glob(pattern), path) is not None
+
+@pytest.mark.parametrize("pattern, path, expected", [
+    ("*.ipynb", "notebook.ipynb", True),
+    ("*.ipynb", "nested/notebook.ipynb", False),
+    ("*", ".hidden", True),
+    ("data/*.csv", "data/train.csv", True),
+    ("data/*.csv", "data/raw/train.csv", False),
+    ("file?.txt", "file1.txt", True),
+    ("file?.txt", "file10.txt", False),
+    ("file?.txt", "file/.txt", False),
+    ("**/*.ipynb", "notebook.ipynb", True),
+    ("**/*.ipynb", "a/b/notebook.ipynb", True),
+    ("nested/**/*.ipynb", "nested/notebook.ipynb", True),
+    ("nested/**/*.ipynb", "nested/a/b/notebook.ipynb", True),
+    ("nested/**/*.ipynb", "other/notebook.ipynb", False),
+    # A trailing ** matches everything beneath its directory.
+    ("data/**", "data/raw/train.csv", True),
+    ("data/**", "database.csv", False),
+    ("data", "data", True),
+    ("data/", "data", True),
+    ("data", "data/train.csv", False),
+    ("./data/*.csv", "data/train.csv", True),
+    ("[abc].txt", "b.txt", True),
+    ("[abc].txt", "d.txt", False),
+    ("[!abc].txt", "d.txt", True),
+    ("[!abc].txt", "a.txt", False),
+    ("[a-c].txt", "b.txt", True),
+    ("[]].txt", "].txt", True),
+    ("[^].txt", "^.txt", True),
+    ("[abc.txt", "[abc.txt", True),
+    ("a+b (1).txt", "a+b (1).txt", True),
+])
+def test_translate_glob(pattern, path, expected):
+    assert matches(pattern, path) == expected
+
+def test_assignment_file_matcher():
+    matcher = AssignmentFileMatcher([
+        { "directory_path": "assignment_1", "protected_files": ["*.ipynb"], "overwritable_files": ["data/**"] },
+        { "directory_path": "./assignment_2/", "protected_files": ["nested/**/*.py"], "overwritable_files": [] },
+        { "directory_path": ".", "protected_files": ["README.md"], "overwritable_files": [] }
+    ])
+    assert matcher.is_protected("assignment_1/notebook.ipynb")
+    assert not matcher.is_protected("assignment_1/nested/notebook.ipynb")
+    assert not matcher.is_protected("assignment_10/notebook.ipynb")
+    assert matcher.is_protected("assignment_2/nested/a/helpers.py")
+    assert matcher.is_protected("./assignment_2/nested/helpers.py")
+    assert matcher.is_protected(Path("README.md"))
+    assert matcher.is_overwritable("assignment_1/data/raw/train.csv")
+    assert not matcher.is_overwritable("assignment_2/data/train.csv")
+
+def test_get_protected_file_paths(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    course = { "name": "Test Course" }
+    assignment = {
+        "id": 1,
+        "directory_path": "assignment_1",
+        "protected_files": ["*.ipynb", "nested/**/*.py", "data"],
+        "overwritable_files": []
+    }
+    repo_root = Path(StudentClassRepo.FIXED_REPO_ROOT.format("Test_Course"))
+    for file_path in ["student.ipynb", "notes.txt", "nested/a.py", "nested/b/c.py", "nested/d.txt", "data/train.csv"]:
+        (repo_root / "assignment_1" / file_path).parent.mkdir(parents=True, exist_ok=True)
+        (repo_root / "assignment_1" / file_path).write_text("")
+
+    student_repo = StudentClassRepo(course, [assignment], repo_root / "assignment_1")
+    protected_file_paths = student_repo.get_protected_file_paths(assignment)
+    # The same paths as globbing for each pattern.
+    globbed_paths = [
+        path for glob_pattern in assignment["protected_files"]
+        for path in student_repo.get_assignment_path(assignment).glob(glob_pattern)
+    ]
+    assert sorted(protected_file_paths) == sorted(globbed_paths)
+    assert sorted(str(path.relative_to(repo_root / "assignment_1")) for path in protected_file_paths) == [
+        "data", "nested/a.py", "nested/b/c.py", "student.ipynb"
+    ]
@@ -0,0 +1,81 @@
+import subprocess
+import pytest
+from pathlib import Path
+from eduhelx_jupyterlab_student.git import fetch_remotes_async
+
+
+def git(*args, cwd) -> str:
+    return subprocess.run(
+        ["git", "-c", "user.name=test", "-c", "user.email=test@example.com", *args],
+        cwd=cwd, check=True, capture_output=True, text=True
+    ).stdout.strip()
+
+@pytest.fixture
+def student_repo(tmp_path) -> Path:
+    """ An empty repository with `origin` and `upstream` remotes, both bare repositories serving the same history. """
+    work = tmp_path / "work"
+    work.mkdir()
+    git("init", "-q", "-b", "main", cwd=work)
+    for n in range(5):
+        (work / f"file_{ n }.txt").write_text(f"Revision { n }\n")
+        git("add", "-A", cwd=work)
+        git("commit", "-q", "-m", f"Revision { n }", cwd=work)
+    for remote_name in ["origin", "upstream"]:
+        bare = tmp_path / f"{ remote_name }.git"
+        git("clone", "-q", "--bare", str(work), str(bare), cwd=tmp_path)
+        git("config", "uploadpack.allowFilter", "true", cwd=bare)
+
+    repo = tmp_path / "student"
+    repo.mkdir()
+    git("init", "-q", "-b", "main", cwd=repo)
+    for remote_name in ["origin", "upstream"]:
+        # A file:// URL, since local paths are cloned without the pack protocol and ignore filters and depths.
+        git("remote", "add", remote_name, (tmp_path / f"{ remote_name }.git").as_uri(), cwd=repo)
+    return repo
+
+def get_missing_objects(repo: Path) -> list[str]:
+    objects = git("rev-list", "--objects", "--missing=print", "--all", cwd=repo).splitlines()
+    return [line for line in objects if line.startswith("?")]
+
+
+@pytest.mark.asyncio
+async def test_fetch_remotes(student_repo):
+    await fetch_remotes_async(["origin", "upstream"], path=student_repo)
+
+    assert git("rev-parse", "--is-shallow-repository", cwd=student_repo) == "false"
+    assert get_missing_objects(student_repo) == []
+    assert git("rev-parse", "origin/main", cwd=student_repo) == git("rev-parse", "upstream/main", cwd=student_repo)
+
+@pytest.mark.asyncio
+async def test_fetch_remotes_blobless(student_repo):
+    await fetch_remotes_async(["origin", "upstream"], path=student_repo, filter_spec="blob:none")
+
+    assert git("rev-parse", "--is-shallow-repository", cwd=student_repo) == "false"
+    assert git("rev-list", "--count", "origin/main", cwd=student_repo) == "5"
+    assert git("rev-list", "--count", "upstream/main", cwd=student_repo) == "5"
+    # Every file version is a blob that was left out.
+    assert len(get_missing_objects(student_repo)) == 5
+    for remote_name in ["origin", "upstream"]:
+        assert git("config", f"remote.{ remote_name }.promisor", cwd=student_repo) == "true"
+        assert git("config", f"remote.{ remote_name }.partialclonefilter", cwd=student_repo) == "blob:none"
+
+    # Later fetches (and lazily fetching the missing blobs) keep working.
+    await fetch_remotes_async(["origin", "upstream"], path=student_repo, filter_spec="blob:none")
+    git("checkout", "-q", "-b", "main", "origin/main", cwd=student_repo)
+    assert (student_repo / "file_4.txt").read_text() == "Revision 4\n"
+
+@pytest.mark.asyncio
+async def test_fetch_remotes_shallow(student_repo):
+    await fetch_remotes_async(["origin", "upstream"], path=student_repo, depth=2)
+
+    assert git("rev-parse", "--is-shallow-repository", cwd=student_repo) == "true"
+    assert git("rev-list", "--count", "origin/main", cwd=student_repo) == "2"
+    assert git("rev-list", "--count", "upstream/main", cwd=student_repo) == "2"
+
+    await fetch_remotes_async(["origin", "upstream"], path=student_repo, deepen=1)
+    assert git("rev-parse", "--is-shallow-repository", cwd=student_repo) == "true"
+    assert int(git("rev-list", "--count", "origin/main", cwd=student_repo)) > 2
+
+    await fetch_remotes_async(["origin"], path=student_repo, unshallow=True)
+    assert git("rev-parse", "--is-shallow-repository", cwd=student_repo) == "false"
+    assert git("rev-list", "--count", "upstream/main", cwd=student_repo) == "5"
@@ -0,0 +1,47 @@
+import subprocess
+import pytest
+from pathlib import Path
+from eduhelx_jupyterlab_student.git_backend import Pygit2GitBackend, SubprocessGitBackend
+
+
+def git(*args, cwd) -> str:
+    return subprocess.run(
+        ["git", "-c", "user.name=test", "-c", "user.email=test@example.com", *args],
+        cwd=cwd, check=True, capture_output=True, text=True
+    ).stdout.strip()
+
+@pytest.fixture
+def repo(tmp_path) -> Path:
+    git("init", "-q", "-b", "main", cwd=tmp_path)
+    for file_path in ["root.txt", "a/x.txt", "b/y.txt"]:
+        (tmp_path / file_path).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / file_path).write_text("original\n")
+    git("add", "-A", cwd=tmp_path)
+    git("commit", "-q", "-m", "Initial", cwd=tmp_path)
+    return tmp_path
+
+@pytest.fixture(params=["subprocess", "pygit2"])
+def git_backend(request):
+    if request.param == "pygit2":
+        pytest.importorskip("pygit2")
+        return Pygit2GitBackend()
+    return SubprocessGitBackend()
+
+
+@pytest.mark.asyncio
+async def test_modified_paths(repo, git_backend):
+    (repo / "a" / "x.txt").write_text("modified\n")
+    (repo / "b" / "y.txt").unlink()
+    modified_paths = await git_backend.get_modified_paths(path=repo)
+    assert sorted((p["path"], p["modification_type"]) for p in modified_paths) == [("a/x.txt", " M"), ("b/y.txt", " D")]
+
+@pytest.mark.asyncio
+async def test_modified_paths_in_sparse_checkout(repo, git_backend):
+    git("sparse-checkout", "set", "--cone", "a", cwd=repo)
+    assert not (repo / "b").exists()
+    # Files outside of the sparse checkout aren't deleted, just not checked out.
+    assert await git_backend.get_modified_paths(path=repo) == []
+
+    (repo / "a" / "x.txt").write_text("modified\n")
+    modified_paths = await git_backend.get_modified_paths(path=repo)
+    assert [(p["path"], p["modification_type"]) for p in modified_paths] == [("a/x.txt", " M")]
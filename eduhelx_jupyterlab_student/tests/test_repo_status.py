@@ -0,0 +1,69 @@
+import subprocess
+import pytest
+from pathlib import Path
+from eduhelx_jupyterlab_student import repo_status
+from eduhelx_jupyterlab_student.git_backend import SubprocessGitBackend
+from eduhelx_jupyterlab_student.repo_status import RepoStatusCache
+from eduhelx_jupyterlab_student.watcher import TreeWatcher
+
+
+class CountingGitBackend(SubprocessGitBackend):
+    def __init__(self):
+        self.status_calls = 0
+
+    async def get_modified_paths(self, untracked=False, path="./"):
+        self.status_calls += 1
+        return await super().get_modified_paths(untracked=untracked, path=path)
+
+@pytest.fixture
+def git_backend(monkeypatch) -> CountingGitBackend:
+    git_backend = CountingGitBackend()
+    monkeypatch.setattr(repo_status, "get_git_backend", lambda: git_backend)
+    return git_backend
+
+@pytest.fixture
+def repo(tmp_path) -> Path:
+    subprocess.run(["git", "init", "-q", "-b", "main"], cwd=tmp_path, check=True)
+    for file_path in ["root.txt", "assignment_1/notebook.ipynb", "assignment_10/notebook.ipynb"]:
+        (tmp_path / file_path).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / file_path).write_text("original\n")
+    subprocess.run(["git", "add", "-A"], cwd=tmp_path, check=True)
+    subprocess.run(
+        ["git", "-c", "user.name=test", "-c", "user.email=test@example.com", "commit", "-q", "-m", "Initial"],
+        cwd=tmp_path, check=True
+    )
+    for file_path in ["root.txt", "assignment_1/notebook.ipynb", "assignment_10/notebook.ipynb"]:
+        (tmp_path / file_path).write_text("modified\n")
+    return tmp_path
+
+
+@pytest.mark.asyncio
+async def test_partitions(repo, git_backend):
+    cache = RepoStatusCache(repo, TreeWatcher(repo, use_notifications=False))
+
+    assert [p["path"] for p in await cache.get_modified_paths("assignment_1")] == ["assignment_1/notebook.ipynb"]
+    assert [p["path"] for p in await cache.get_modified_paths("assignment_10/")] == ["assignment_10/notebook.ipynb"]
+    # An assignment at the root of the repository contains every modified path.
+    all_paths = ["assignment_1/notebook.ipynb", "assignment_10/notebook.ipynb", "root.txt"]
+    assert sorted(p["path"] for p in await cache.get_modified_paths(".")) == all_paths
+    assert sorted(p["path"] for p in await cache.get_modified_paths("")) == all_paths
+    assert git_backend.status_calls == 1
+
+@pytest.mark.asyncio
+async def test_cached_without_notifications(repo, git_backend):
+    cache = RepoStatusCache(repo, TreeWatcher(repo, use_notifications=False), ttl_seconds=60)
+    for _ in range(3):
+        await cache.get_modified_paths("assignment_1")
+    assert git_backend.status_calls == 1
+
+    # Staging changes the index, which invalidates the status regardless of the TTL.
+    subprocess.run(["git", "add", "root.txt"], cwd=repo, check=True)
+    assert [p["modification_type"] for p in await cache.get_modified_paths(".") if p["path"] == "root.txt"] == ["M "]
+    assert git_backend.status_calls == 2
+
+@pytest.mark.asyncio
+async def test_expires_without_notifications(repo, git_backend):
+    cache = RepoStatusCache(repo, TreeWatcher(repo, use_notifications=False), ttl_seconds=0)
+    for _ in range(3):
+        await cache.get_modified_paths()
+    assert git_backend.status_calls == 3
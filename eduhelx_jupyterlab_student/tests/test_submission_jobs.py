@@ -0,0 +1,40 @@
+import asyncio
+import pytest
+from eduhelx_jupyterlab_student.git import InvalidGitRepositoryException
+from eduhelx_jupyterlab_student.submission_jobs import (
+    SubmissionJob, SubmissionJobQueue, SubmissionInProgressException, get_error_message
+)
+
+
+@pytest.mark.asyncio
+async def test_active_job():
+    queue = SubmissionJobQueue(on_progress=lambda job: None)
+    release = asyncio.Event()
+    async def run(job):
+        await release.wait()
+        job.advance(SubmissionJob.PUSHED)
+
+    job = queue.submit(SubmissionJob("/repo", 1), run)
+    assert queue.get_active_job("/repo") is job
+    assert queue.get_active_job("/other-repo") is None
+    with pytest.raises(SubmissionInProgressException):
+        queue.submit(SubmissionJob("/repo", 1), run)
+
+    release.set()
+    await asyncio.sleep(0)
+    await asyncio.sleep(0)
+    assert job.status == SubmissionJob.PUSHED
+    assert queue.get_active_job("/repo") is None
+    assert queue.get(job.id) is job
+
+@pytest.mark.asyncio
+async def test_failed_job_error():
+    queue = SubmissionJobQueue(on_progress=lambda job: None)
+    async def run(job):
+        raise InvalidGitRepositoryException()
+
+    job = queue.submit(SubmissionJob("/repo", 1), run)
+    await asyncio.sleep(0)
+    assert job.status == SubmissionJob.FAILED
+    assert job.error == "InvalidGitRepositoryException"
+    assert get_error_message(ValueError("bad value")) == "bad value"
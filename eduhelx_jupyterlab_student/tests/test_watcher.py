@@ -0,0 +1,46 @@
+import time
+import pytest
+from eduhelx_jupyterlab_student.watcher import TreeWatcher
+
+def poll_until_changed(watcher: TreeWatcher, timeout=5) -> set[str]:
+    """ Filesystem events are delivered asynchronously, so give them a moment to arrive. """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        changed = watcher.poll()
+        if len(changed) > 0: return changed
+        time.sleep(0.05)
+    return set()
+
+
+def test_read_leaves_tree_clean(tmp_path):
+    pytest.importorskip("watchdog")
+    assignment_dir = tmp_path / "assignment_2"
+    assignment_dir.mkdir()
+    notebook = assignment_dir / "student.ipynb"
+    notebook.write_text("{}")
+    watcher = TreeWatcher(tmp_path)
+    try:
+        watcher.poll()
+        assert watcher.uses_notifications
+
+        notebook.read_text()
+        list(assignment_dir.iterdir())
+        time.sleep(0.5)
+        assert watcher.poll() == set()
+
+        # The watcher is still picking up actual changes.
+        notebook.write_text("{ }")
+        assert str(assignment_dir) in poll_until_changed(watcher)
+    finally:
+        watcher.stop()
+
+def test_subscriptions_see_every_change(tmp_path):
+    watcher = TreeWatcher(tmp_path, use_notifications=False)
+    status_subscription, index_subscription = watcher.subscribe(), watcher.subscribe()
+    status_subscription.poll()
+    index_subscription.poll()
+
+    (tmp_path / "assignment_1").mkdir()
+    assert str(tmp_path / "assignment_1") in status_subscription.poll()
+    assert str(tmp_path / "assignment_1") in index_subscription.poll()
+    assert status_subscription.poll() == set()
@@ -0,0 +1,103 @@
+import asyncio
+import pytest
+from eduhelx_jupyterlab_student.websocket_queue import ClientQueue, EventLog, OutboundMessage, QueueOverflowError
+
+
+def merge_files(pending: dict, message: dict) -> dict:
+    return { **message, "files": pending["files"] + message["files"] }
+
+def get_seqs(messages: list[OutboundMessage]) -> list[int]:
+    return [m.seq for m in messages]
+
+
+def test_replay():
+    events = EventLog(max_messages=10)
+    for n in range(5):
+        events.append({ "type": "event", "n": n })
+
+    messages, missed = events.get_messages_after(2)
+    assert get_seqs(messages) == [3, 4, 5]
+    assert [m.to_json()["n"] for m in messages] == [2, 3, 4]
+    assert not missed
+    assert events.get_messages_after(5) == ([], False)
+
+def test_replay_after_eviction():
+    events = EventLog(max_messages=3)
+    for n in range(5):
+        events.append({ "type": "event", "n": n })
+
+    messages, missed = events.get_messages_after(1)
+    assert get_seqs(messages) == [3, 4, 5]
+    assert missed
+    # Only the events after the evicted ones were missed, and those are all still logged.
+    assert events.get_messages_after(2) == (messages, False)
+
+def test_replay_after_coalescing():
+    events = EventLog(max_messages=10)
+    events.append({ "type": "state" }, coalesce_key="state")
+    events.append({ "type": "event" })
+    events.append({ "type": "state" }, coalesce_key="state")
+
+    # The first state message was superseded, so a client that never saw it hasn't missed anything.
+    messages, missed = events.get_messages_after(0)
+    assert get_seqs(messages) == [2, 3]
+    assert not missed
+    assert events.get_messages_after(1) == (messages, False)
+
+def test_merged_messages_are_kept():
+    events = EventLog(max_messages=10)
+    events.append({ "type": "downsync", "files": ["a"] }, coalesce_key="downsync", merge=merge_files)
+    events.append({ "type": "downsync", "files": ["b"] }, coalesce_key="downsync", merge=merge_files)
+
+    # A client that saw the first message still needs the second one.
+    assert get_seqs(events.get_messages_after(1)[0]) == [2]
+    assert get_seqs(events.get_messages_after(0)[0]) == [1, 2]
+
+def test_epochs():
+    events, restarted_events = EventLog(max_messages=10), EventLog(max_messages=10)
+    events.append({ "type": "event" })
+    restarted_events.append({ "type": "event" })
+    assert events.epoch != restarted_events.epoch
+    assert restarted_events.seq == 1
+
+
+@pytest.mark.asyncio
+async def test_client_queue_coalescing():
+    written = []
+    release = asyncio.Event()
+    async def write(message):
+        await release.wait()
+        written.append(message)
+
+    queue = ClientQueue(write, max_messages=10)
+    queue.put(OutboundMessage({ "type": "hello" }))
+    # The hello message is being written, so these wait behind it and are coalesced with each other.
+    await asyncio.sleep(0)
+    queue.put(OutboundMessage({ "type": "downsync", "files": ["a"] }, seq=1, coalesce_key="downsync", merge=merge_files))
+    queue.put(OutboundMessage({ "type": "state", "version": 1 }, coalesce_key="state"))
+    queue.put(OutboundMessage({ "type": "downsync", "files": ["b"] }, seq=2, coalesce_key="downsync", merge=merge_files))
+    queue.put(OutboundMessage({ "type": "state", "version": 2 }, coalesce_key="state"))
+    assert len(queue) == 2
+
+    release.set()
+    while len(written) < 3: await asyncio.sleep(0)
+    assert written == [
+        { "type": "hello" },
+        { "type": "downsync", "files": ["a", "b"], "seq": 2 },
+        { "type": "state", "version": 2 }
+    ]
+    queue.close()
+
+@pytest.mark.asyncio
+async def test_client_queue_overflow():
+    async def write(message):
+        await asyncio.Event().wait()
+
+    queue = ClientQueue(write, max_messages=2)
+    queue.put(OutboundMessage({ "n": 0 }))
+    await asyncio.sleep(0)
+    queue.put(OutboundMessage({ "n": 1 }))
+    queue.put(OutboundMessage({ "n": 2 }))
+    with pytest.raises(QueueOverflowError):
+        queue.put(OutboundMessage({ "n": 3 }))
+    queue.close()
@@ -0,0 +1,190 @@
+import os
+import threading
+from pathlib import Path
+
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:
+    Observer = None
+    FileSystemEventHandler = object
+
+class _DirtyDirectoryHandler(FileSystemEventHandler):
+    # Opening and reading files (e.g. `git status`, or the contents API serving a notebook) doesn't change the tree,
+    # so "opened" and "closed_no_write" events are ignored. A file closed after writing does change it.
+    CHANGE_EVENT_TYPES = { "created", "deleted", "moved", "modified", "closed" }
+
+    def __init__(self, watcher: "TreeWatcher"):
+        self.watcher = watcher
+
+    def on_any_event(self, event):
+        if event.event_type not in self.CHANGE_EVENT_TYPES: return
+        paths = [event.src_path, getattr(event, "dest_path", None)]
+        for path in paths:
+            if not path: continue
+            path = os.fsdecode(path)
+            # A directory event dirties the directory itself, a file event dirties the directory containing it.
+            self.watcher.mark_dirty(path if event.is_directory else os.path.dirname(path))
+            if event.is_directory:
+                self.watcher.mark_dirty(os.path.dirname(path))
+
+
+class TreeSubscription:
+    """ One consumer's view of a shared TreeWatcher. Each subscription sees every change exactly once,
+    regardless of which consumer's `poll` picked it up. """
+    def __init__(self, watcher: "TreeWatcher"):
+        self.watcher = watcher
+        self._changed: set[str] = set()
+
+    @property
+    def files(self) -> dict[str, frozenset[str]]:
+        return self.watcher.files
+
+    @property
+    def uses_notifications(self) -> bool:
+        return self.watcher.uses_notifications
+
+    def poll(self) -> set[str]:
+        """ Bring the listing up to date, returning the directories that changed since this subscription's last poll. """
+        self.watcher.poll()
+        changed, self._changed = self._changed, set()
+        return changed
+
+    def unsubscribe(self) -> None:
+        self.watcher._subscriptions.discard(self)
+
+
+class TreeWatcher:
+    """ Maintains an in-memory listing of every directory under `root`, and reports which directories
+    changed since the last `poll`, so consumers only have to recompute the subtrees that actually changed.
+    A repository should only have one watcher: consumers share it through `subscribe`.
+
+    If watchdog is installed, changes are picked up from filesystem notifications (inotify on Linux).
+    Otherwise, falls back to comparing directory mtimes, which costs a single stat per directory.
+    (A directory's mtime changes whenever an entry is added, removed, or renamed inside of it.) """
+    IGNORED_DIRECTORIES = { ".git" }
+
+    def __init__(self, root: Path, use_notifications: bool = True):
+        self.root = str(root)
+        # directory -> file names directly inside of it
+        self.files: dict[str, frozenset[str]] = {}
+        # directory -> subdirectory paths directly inside of it
+        self._subdirs: dict[str, set[str]] = {}
+        self._mtimes: dict[str, int] = {}
+
+        self._use_notifications = use_notifications and Observer is not None
+        self._observer = None
+        self._dirty: set[str] = set()
+        self._lock = threading.Lock()
+        self._subscriptions: set[TreeSubscription] = set()
+
+    @property
+    def uses_notifications(self) -> bool:
+        return self._use_notifications
+
+    def subscribe(self) -> TreeSubscription:
+        subscription = TreeSubscription(self)
+        self._subscriptions.add(subscription)
+        return subscription
+
+    def mark_dirty(self, directory: str) -> None:
+        if self._is_within_ignored(directory): return
+        with self._lock:
+            self._dirty.add(directory)
+
+    def _start_observer(self) -> None:
+        self._observer = Observer()
+        self._observer.schedule(_DirtyDirectoryHandler(self), self.root, recursive=True)
+        self._observer.daemon = True
+        self._observer.start()
+
+    def stop(self) -> None:
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer = None
+
+    def _is_ignored(self, directory: str) -> bool:
+        return os.path.basename(directory) in self.IGNORED_DIRECTORIES
+
+    def _is_within_ignored(self, directory: str) -> bool:
+        relative_path = os.path.relpath(directory, self.root)
+        return any(part in self.IGNORED_DIRECTORIES for part in relative_path.split(os.sep))
+
+    def _forget(self, directory: str, changed: set[str]) -> None:
+        for subdir in self._subdirs.pop(directory, set()):
+            self._forget(subdir, changed)
+        self.files.pop(directory, None)
+        self._mtimes.pop(directory, None)
+        changed.add(directory)
+
+    def _scan(self, directory: str, changed: set[str]) -> None:
+        """ Re-list `directory`. New subdirectories are scanned recursively, vanished ones are forgotten. """
+        try:
+            mtime = os.stat(directory).st_mtime_ns
+            entries = list(os.scandir(directory))
+        except (FileNotFoundError, NotADirectoryError):
+            self._forget(directory, changed)
+            return
+
+        files, subdirs = set(), set()
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if not self._is_ignored(entry.path): subdirs.add(entry.path)
+                else:
+                    files.add(entry.name)
+            except OSError:
+                continue
+
+        previous_subdirs = self._subdirs.get(directory, set())
+        for removed_subdir in previous_subdirs - subdirs:
+            self._forget(removed_subdir, changed)
+
+        self._mtimes[directory] = mtime
+        self._subdirs[directory] = subdirs
+        self.files[directory] = frozenset(files)
+        changed.add(directory)
+
+        for added_subdir in subdirs - previous_subdirs:
+            self._scan(added_subdir, changed)
+
+    def poll(self) -> set[str]:
+        """ Bring the listing up to date, returning the set of directories that were (re)scanned or removed. """
+        changed = self._poll()
+        for subscription in self._subscriptions:
+            subscription._changed |= changed
+        return changed
+
+    def _poll(self) -> set[str]:
+        changed = set()
+        if not os.path.isdir(self.root):
+            if self.root in self._mtimes: self._forget(self.root, changed)
+            return changed
+
+        if self.root not in self._mtimes:
+            # First poll (or the root was recreated), so walk the whole tree.
+            if self._use_notifications and self._observer is None: self._start_observer()
+            self._scan(self.root, changed)
+            return changed
+
+        if self._observer is not None:
+            with self._lock:
+                dirty, self._dirty = self._dirty, set()
+        else:
+            dirty = set()
+            for directory, mtime in list(self._mtimes.items()):
+                try:
+                    if os.stat(directory).st_mtime_ns != mtime: dirty.add(directory)
+                except FileNotFoundError:
+                    dirty.add(directory)
+
+        # Scan shallowest directories first, since scanning a parent may already account for its children.
+        for directory in sorted(dirty, key=lambda d: d.count(os.sep)):
+            if directory in changed: continue
+            if directory != self.root and not directory.startswith(self.root + os.sep): continue
+            if directory in self._mtimes:
+                self._scan(directory, changed)
+            elif os.path.isdir(directory):
+                # A directory we haven't seen yet, so rescan its parent to pick it up.
+                self._scan(os.path.dirname(directory), changed)
+        return changed
@@ -0,0 +1,124 @@
+import uuid
+import asyncio
+from collections import deque
+from typing import Any, Callable, Hashable
+from .metrics import WEBSOCKET_MESSAGES
+
+# Combines a pending message with the message that supersedes it, e.g. the files of two downsyncs.
+MergeFunction = Callable[[dict, dict], dict]
+
+class OutboundMessage:
+    def __init__(self, message: dict, seq: int | None = None, coalesce_key: Hashable | None = None, merge: MergeFunction | None = None):
+        self.message = message
+        # Only broadcast events are sequenced. Per-client messages (e.g. pushed state) aren't replayable.
+        self.seq = seq
+        # A message supersedes any earlier, still pending message with the same key.
+        self.coalesce_key = coalesce_key
+        # If None, the superseded message is simply dropped.
+        self.merge = merge
+
+    def to_json(self) -> dict:
+        if self.seq is None: return self.message
+        return { **self.message, "seq": self.seq }
+
+
+class EventLog:
+    """ Assigns broadcast events monotonically increasing sequence numbers and keeps the most recent
+    `max_messages` of them, so that a reconnecting client can be replayed the events it missed.
+    Sequence numbers are only meaningful within the same `epoch`, which changes whenever the server restarts. """
+    def __init__(self, max_messages: int):
+        self.epoch = uuid.uuid4().hex
+        self.seq = 0
+        # The highest sequence number that has been handed to at least one client.
+        self.delivered_seq = 0
+        # The highest sequence number that was dropped from the log for lack of room.
+        # (Messages dropped because a newer one superseded them don't count, since nothing was lost.)
+        self.evicted_seq = 0
+        self._messages: deque[OutboundMessage] = deque(maxlen=max_messages)
+
+    def __len__(self) -> int:
+        return len(self._messages)
+
+    def append(self, message: dict, coalesce_key: Hashable | None = None, merge: MergeFunction | None = None) -> OutboundMessage:
+        self.seq += 1
+        outbound = OutboundMessage(message, self.seq, coalesce_key, merge)
+        if coalesce_key is not None and merge is None:
+            # Nobody replaying the log needs a message that's been entirely superseded.
+            self._messages = deque(
+                (m for m in self._messages if m.coalesce_key != coalesce_key),
+                maxlen=self._messages.maxlen
+            )
+        if len(self._messages) == self._messages.maxlen:
+            self.evicted_seq = self._messages[0].seq
+        self._messages.append(outbound)
+        return outbound
+
+    def get_messages_after(self, seq: int) -> tuple[list[OutboundMessage], bool]:
+        """ Get the logged messages sequenced after `seq`, and whether any of them have already been evicted.
+        Sequence numbers can have gaps where messages were coalesced away, which doesn't count as missing anything. """
+        messages = [m for m in self._messages if m.seq > seq]
+        missed = seq < self.evicted_seq
+        return messages, missed
+
+
+class QueueOverflowError(Exception):
+    pass
+
+
+class ClientQueue:
+    """ Bounded outbound queue for a single websocket client. Messages are written one at a time, each
+    waiting for the previous one to be flushed, so a slow client backs up its own queue instead of the
+    server's write buffers. Pending messages are coalesced with any newer message that supersedes them.
+    If the queue still overflows, `put` raises `QueueOverflowError` and the caller should drop the
+    client, which can then reconnect and resume from the last sequence number it saw. """
+    def __init__(self, write: Callable[[dict], Any], max_messages: int):
+        self._write = write
+        self.max_messages = max_messages
+        self._pending: deque[OutboundMessage] = deque()
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def put(self, outbound: OutboundMessage) -> None:
+        if outbound.coalesce_key is not None:
+            for pending in self._pending:
+                if pending.coalesce_key != outbound.coalesce_key: continue
+                self._pending.remove(pending)
+                WEBSOCKET_MESSAGES.inc(delivery="coalesced")
+                if outbound.merge is not None:
+                    # The merged message takes the newer message's place (and sequence number) in the queue.
+                    outbound = OutboundMessage(
+                        outbound.merge(pending.message, outbound.message),
+                        outbound.seq, outbound.coalesce_key, outbound.merge
+                    )
+                # There's never more than one pending message with the same key.
+                break
+        if len(self._pending) >= self.max_messages:
+            raise QueueOverflowError(f"More than { self.max_messages } messages pending")
+        self._pending.append(outbound)
+        self._wakeup.set()
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._drain())
+
+    async def _drain(self) -> None:
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            while len(self._pending) > 0:
+                outbound = self._pending.popleft()
+                try:
+                    await self._write(outbound.to_json())
+                except Exception:
+                    # The connection is gone. Its handler closes the queue once it notices.
+                    self._pending.clear()
+                    self._task = None
+                    return
+                WEBSOCKET_MESSAGES.inc(delivery="sent")
+
+    def close(self) -> None:
+        self._pending.clear()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
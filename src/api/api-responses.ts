@@ -93,4 +93,37 @@ export interface CourseResponse {
 export interface ServerSettingsResponse {
     serverVersion: string
     repoRoot: string
-}
\ No newline at end of file
+}
+
+export interface SubmissionJobStageResponse {
+    stage: string
+    time: number
+}
+
+export interface SubmissionJobResponse {
+    id: string
+    assignment_id: number
+    status: string
+    done: boolean
+    stages: SubmissionJobStageResponse[]
+    commit_id: string | null
+    notebook_unchanged: boolean | null
+    error: string | null
+}
+
+export interface BootstrapStageResponse {
+    name: string
+    dependencies: string[]
+    status: 'pending' | 'running' | 'done' | 'failed' | 'skipped'
+    started_at: number | null
+    duration: number | null
+    error: string | null
+}
+
+export interface ReadinessResponse {
+    ready: boolean
+    failed: boolean
+    started_at: number | null
+    duration: number | null
+    stages: BootstrapStageResponse[]
+}
@@ -12,8 +12,13 @@ import {
     StudentResponse,
     SubmissionResponse,
     ServerSettingsResponse,
+    SubmissionJobResponse,
+    ReadinessResponse,
 } from './api-responses'
 
+// How often to check on a submission while it runs in the background on the server.
+const SUBMISSION_JOB_POLL_DELAY = 1000
+
 export interface GetAssignmentsResponse {
     assignments: IAssignment[] | null
     currentAssignment: ICurrentAssignment | null
@@ -26,6 +31,40 @@ export interface GetStudentAndCourseResponse {
 
 export interface NotebookFilesResponse {
     notebooks: { [assignmentId: string]: string[] }
+    version: number
+}
+
+/**
+ * Long-polling endpoints hold the request open until the value differs from `version`, then respond
+ * with the new value and its version, which should be passed back in on the next poll.
+ */
+export interface PolledResponse<T> {
+    version: string
+    value: T
+}
+
+interface RawGetAssignmentsResponse {
+    assignments: AssignmentResponse[] | null
+    current_assignment: AssignmentResponse | null
+}
+
+interface RawGetStudentAndCourseResponse {
+    student: StudentResponse
+    course: CourseResponse
+}
+
+export function parseAssignmentsResponse({ assignments, current_assignment }: RawGetAssignmentsResponse): GetAssignmentsResponse {
+    return {
+        assignments: assignments ? assignments.map((data) => Assignment.fromResponse(data)) : null,
+        currentAssignment: current_assignment ? Assignment.fromResponse(current_assignment) as ICurrentAssignment : null
+    }
+}
+
+export function parseStudentAndCourseResponse({ student, course }: RawGetStudentAndCourseResponse): GetStudentAndCourseResponse {
+    return {
+        student: Student.fromResponse(student),
+        course: Course.fromResponse(course)
+    }
 }
 
 export async function listNotebookFiles(): Promise<NotebookFilesResponse> {
@@ -36,58 +75,48 @@ export async function listNotebookFiles(): Promise<NotebookFilesResponse> {
 }
 
 export async function getStudentAndCourse(): Promise<GetStudentAndCourseResponse> {
-    const { student, course } = await requestAPI<{
-        student: StudentResponse
-        course: CourseResponse
-    }>(`/course_student`, {
+    const data = await requestAPI<RawGetStudentAndCourseResponse>(`/course_student`, {
         method: 'GET'
     })
-    return {
-        student: Student.fromResponse(student),
-        course: Course.fromResponse(course)
-    }
+    return parseStudentAndCourseResponse(data)
 }
 
-export async function getStudentAndCoursePolled(currentValue?: object): Promise<GetStudentAndCourseResponse> {
-    const queryString = qs.stringify({ current_value: JSON.stringify(currentValue) })
-    const { student, course } = await requestAPI<{
-        student: StudentResponse
-        course: CourseResponse
-    }>(`/course_student/poll?${ queryString }`, {
+export async function listNotebookFilesPolled(version?: string): Promise<PolledResponse<NotebookFilesResponse>> {
+    const queryString = qs.stringify({ version })
+    const data = await requestAPI<PolledResponse<NotebookFilesResponse>>(`/notebook_files/poll?${ queryString }`, {
+        method: 'GET'
+    })
+    return data
+}
+
+export async function getStudentAndCoursePolled(version?: string): Promise<PolledResponse<GetStudentAndCourseResponse>> {
+    const queryString = qs.stringify({ version })
+    const data = await requestAPI<PolledResponse<RawGetStudentAndCourseResponse>>(`/course_student/poll?${ queryString }`, {
         method: 'GET'
     })
     return {
-        student: Student.fromResponse(student),
-        course: Course.fromResponse(course)
+        version: data.version,
+        value: parseStudentAndCourseResponse(data.value)
     }
 }
 
 
 export async function getAssignments(path: string): Promise<GetAssignmentsResponse> {
     const queryString = qs.stringify({ path })
-    const { assignments, current_assignment } = await requestAPI<{
-        assignments: AssignmentResponse[] | null
-        current_assignment: AssignmentResponse | null
-    }>(`/assignments?${ queryString }`, {
+    const data = await requestAPI<RawGetAssignmentsResponse>(`/assignments?${ queryString }`, {
         method: 'GET'
     })
-    return {
-        assignments: assignments ? assignments.map((data) => Assignment.fromResponse(data)) : null,
-        currentAssignment: current_assignment ? Assignment.fromResponse(current_assignment) as ICurrentAssignment : null
-    }
+    return parseAssignmentsResponse(data)
 }
 
-export async function getAssignmentsPolled(path: string, currentValue?: object): Promise<GetAssignmentsResponse> {
-    const queryString = qs.stringify({ path, current_value: JSON.stringify(currentValue) })
-    const { assignments, current_assignment } = await requestAPI<{
-        assignments: AssignmentResponse[] | null
-        current_assignment: AssignmentResponse | null
-    }>(`/assignments/poll?${ queryString }`, {
+export async function getAssignmentsPolled(path: string, version?: string): Promise<PolledResponse<GetAssignmentsResponse>> {
+    const queryString = qs.stringify({ path, version })
+    const data = await requestAPI<PolledResponse<RawGetAssignmentsResponse>>(`/assignments/poll?${ queryString }`, {
         method: 'GET'
     })
     return {
-        assignments: assignments ? assignments.map((data) => Assignment.fromResponse(data)) : null,
-        currentAssignment: current_assignment ? Assignment.fromResponse(current_assignment) as ICurrentAssignment : null
+        version: data.version,
+        value: parseAssignmentsResponse(data.value)
     }
 }
 
@@ -117,12 +146,25 @@ export async function getServerSettings(): Promise<IServerSettings> {
     }
 }
 
+export async function getReadiness(): Promise<ReadinessResponse> {
+    return await requestAPI<ReadinessResponse>('/readiness', {
+        method: 'GET'
+    })
+}
+
+export async function getSubmissionJob(jobId: string): Promise<SubmissionJobResponse> {
+    const { job } = await requestAPI<{ job: SubmissionJobResponse }>(`/submission_jobs/${ jobId }`, {
+        method: 'GET'
+    })
+    return job
+}
+
 export async function submitAssignment(
     currentPath: string,
     summary: string,
     description?: string
-): Promise<void> {
-    const res = await requestAPI<void>(`/submit_assignment`, {
+): Promise<SubmissionJobResponse> {
+    let { job } = await requestAPI<{ job: SubmissionJobResponse }>(`/submit_assignment`, {
         method: 'POST',
         body: JSON.stringify({
             summary,
@@ -130,6 +172,13 @@ export async function submitAssignment(
             current_path: currentPath
         })
     })
+    // The server returns as soon as the submission is queued, so wait for it to finish.
+    while (!job.done) {
+        await new Promise((resolve) => setTimeout(resolve, SUBMISSION_JOB_POLL_DELAY))
+        job = await getSubmissionJob(job.id)
+    }
+    if (job.status === 'failed') throw new Error(job.error ?? 'Submission failed')
+    return job
 }
 
 export async function cloneStudentRepository(repositoryUrl: string, currentPath: string): Promise<string> {
@@ -77,10 +77,17 @@ export const AssignmentSubmitForm = ({ }: AssignmentSubmitFormProps) => {
             setSummaryText("")
             setDescriptionText("")
 
-            snackbar.open({
-                type: 'success',
-                message: 'Successfully submitted assignment!'
-            })
+            if (submission.notebook_unchanged) {
+                snackbar.open({
+                    type: 'warning',
+                    message: 'Submitted assignment, but your notebook is unchanged since your previous submission.'
+                })
+            } else {
+                snackbar.open({
+                    type: 'success',
+                    message: 'Successfully submitted assignment!'
+                })
+            }
         } catch (e: any) {
             snackbar.open({
                 type: 'error',
@@ -1,4 +1,4 @@
-import React, { createContext, useContext, ReactNode, useState, useMemo, useEffect, useCallback } from 'react'
+import React, { createContext, useContext, ReactNode, useState, useMemo, useEffect, useCallback, useRef } from 'react'
 import { IChangedArgs, URLExt } from '@jupyterlab/coreutils'
 import { ServerConnection } from '@jupyterlab/services'
 import { FileBrowserModel, IDefaultFileBrowser } from '@jupyterlab/filebrowser'
@@ -6,7 +6,10 @@ import { showDialog, Dialog } from '@jupyterlab/apputils'
 import { Button } from '@jupyterlab/ui-components'
 import { useSnackbar } from './snackbar-context'
 import { IEduhelxSubmissionModel } from '../tokens'
-import { IAssignment, IStudent, ICurrentAssignment, ICourse, getAssignmentsPolled, GetAssignmentsResponse, getStudentAndCoursePolled, getStudentAndCourse, getAssignments, listNotebookFiles } from '../api'
+import {
+    IAssignment, IStudent, ICurrentAssignment, ICourse, getAssignmentsPolled, GetAssignmentsResponse, getStudentAndCoursePolled,
+    getStudentAndCourse, getAssignments, listNotebookFiles, listNotebookFilesPolled, parseAssignmentsResponse, parseStudentAndCourseResponse
+} from '../api'
 
 interface StudentNotebookExists {
     (assignment: IAssignment, directoryPath?: string | undefined): boolean
@@ -33,6 +36,11 @@ const WEBSOCKET_URL = URLExt.join(
     "eduhelx-jupyterlab-student",
     "ws"
 )
+const getWebsocketUrl = (epoch: string | null, lastSeq: number) => {
+    // Resume from the last broadcast message we received, if the server hasn't restarted since.
+    if (epoch === null) return WEBSOCKET_URL
+    return WEBSOCKET_URL + URLExt.objectToQueryString({ epoch, last_seq: lastSeq })
+}
 const WEBSOCKET_REOPEN_DELAY = 1000
 const POLL_DELAY = 15000
 
@@ -47,7 +55,13 @@ export const AssignmentProvider = ({ fileBrowser, children }: IAssignmentProvide
     const [student, setStudent] = useState<IStudent|undefined>(undefined)
     const [course, setCourse] = useState<ICourse|undefined>(undefined)
     const [notebookFiles, setNotebookFiles] = useState<{ [key: string]: string[] }|undefined>(undefined)
-    const [ws, setWs] = useState<WebSocket>(() => new WebSocket(WEBSOCKET_URL))
+    // Identifies the server process, whose broadcast messages are sequenced by `seq`.
+    const wsEpochRef = useRef<string|null>(null)
+    const wsLastSeqRef = useRef<number>(0)
+    const [ws, setWs] = useState<WebSocket>(() => new WebSocket(getWebsocketUrl(wsEpochRef.current, wsLastSeqRef.current)))
+    // While the websocket is connected, the server pushes state to us and we don't need to poll for it.
+    const [wsConnected, setWsConnected] = useState<boolean>(false)
+    const currentPathRef = useRef<string|null>(null)
 
     const loading = useMemo(() => (
         currentAssignment === undefined ||
@@ -65,12 +79,42 @@ export const AssignmentProvider = ({ fileBrowser, children }: IAssignmentProvide
 
     useEffect(() => {
         const triggerReconnect = () => {
+            setWsConnected(false)
             ws.close()
-            setWs(new WebSocket(WEBSOCKET_URL))
+            setWs(new WebSocket(getWebsocketUrl(wsEpochRef.current, wsLastSeqRef.current)))
         }
 
+        ws.addEventListener("open", () => setWsConnected(true))
         ws.addEventListener("message", (e) => {
-            const { type, ...data } = JSON.parse(e.data)
+            const { type, seq, ...data } = JSON.parse(e.data)
+            if (type === "hello") {
+                if (data.epoch !== wsEpochRef.current) {
+                    wsEpochRef.current = data.epoch
+                    wsLastSeqRef.current = 0
+                }
+                return
+            }
+            if (seq !== undefined) {
+                // Already received before reconnecting.
+                if (seq <= wsLastSeqRef.current) return
+                wsLastSeqRef.current = seq
+            }
+            if (type === "state") {
+                const { key, value } = data
+                if (key === "assignments") {
+                    // Ignore state computed for a directory that the user has since navigated away from.
+                    if (data.path !== currentPathRef.current) return
+                    const { assignments, currentAssignment } = parseAssignmentsResponse(value)
+                    setAssignments(assignments)
+                    setCurrentAssignment(currentAssignment)
+                } else if (key === "course_student") {
+                    const { student, course } = parseStudentAndCourseResponse(value)
+                    setStudent(student)
+                    setCourse(course)
+                } else if (key === "notebook_files") {
+                    setNotebookFiles(value.notebooks)
+                }
+            }
             if (type === "downsync") showDialog({
                 title: "New files have been added",
                 body: (
@@ -85,10 +129,20 @@ export const AssignmentProvider = ({ fileBrowser, children }: IAssignmentProvide
         })
         ws.addEventListener("close", triggerReconnect)
         return () => {
+            ws.removeEventListener("close", triggerReconnect)
             ws.close()
         }
     }, [ws])
 
+    useEffect(() => {
+        currentPathRef.current = currentPath
+        if (!wsConnected) return
+        ws.send(JSON.stringify({
+            type: "subscribe",
+            path: currentPath
+        }))
+    }, [ws, wsConnected, currentPath])
+
     useEffect(() => {
         setCurrentPath(fileBrowser.model.path)
 
@@ -104,14 +158,17 @@ export const AssignmentProvider = ({ fileBrowser, children }: IAssignmentProvide
     useEffect(() => {
         setAssignments(undefined)
         setCurrentAssignment(undefined)
+        // Assignments are pushed over the websocket whenever they change.
+        if (wsConnected) return
         
         let cancelled = false
         let timeoutId: number | undefined = undefined
+        let version: string | undefined = undefined
         const poll = async () => {
             let value
             if (currentPath !== null) {
                 try {
-                    value = await getAssignments(currentPath)
+                    ({ version, value } = await getAssignmentsPolled(currentPath, version))
                 } catch (e: any) {
                     console.error(e)
                     snackbar.open({
@@ -128,25 +185,28 @@ export const AssignmentProvider = ({ fileBrowser, children }: IAssignmentProvide
                 setAssignments(undefined)
                 setCurrentAssignment(undefined)
             }
-            timeoutId = window.setTimeout(poll, POLL_DELAY)
+            // The server holds long-polls open until something changes, so we can repoll right away.
+            timeoutId = window.setTimeout(poll, value !== undefined ? 0 : POLL_DELAY)
         }
         poll()
         return () => {
             cancelled = true
             window.clearTimeout(timeoutId)
         }
-    }, [currentPath])
+    }, [currentPath, wsConnected])
 
     useEffect(() => {
+        if (wsConnected) return
         setCourse(undefined)
         setStudent(undefined)
 
         let cancelled = false
         let timeoutId: number | undefined = undefined
+        let version: string | undefined = undefined
         const poll = async () => {
             let value
             try {
-                value = await getStudentAndCourse()
+                ({ version, value } = await getStudentAndCoursePolled(version))
             } catch (e: any) {
                 console.error(e)
                 snackbar.open({
@@ -162,24 +222,26 @@ export const AssignmentProvider = ({ fileBrowser, children }: IAssignmentProvide
                 setCourse(undefined)
                 setStudent(undefined)
             }
-            timeoutId = window.setTimeout(poll, POLL_DELAY)
+            timeoutId = window.setTimeout(poll, value !== undefined ? 0 : POLL_DELAY)
         }
         poll()
         return () => {
             cancelled = true
             window.clearTimeout(timeoutId)
         }
-    }, [])
+    }, [wsConnected])
 
     useEffect(() => {
+        if (wsConnected) return
         setNotebookFiles(undefined)
 
         let cancelled = false
         let timeoutId: number | undefined = undefined
+        let version: string | undefined = undefined
         const poll = async () => {
             let value
             try {
-                value = await listNotebookFiles()
+                ({ version, value } = await listNotebookFilesPolled(version))
             } catch (e: any) {
                 console.error(e)
                 snackbar.open({
@@ -193,16 +255,14 @@ export const AssignmentProvider = ({ fileBrowser, children }: IAssignmentProvide
             } else {
                 setNotebookFiles(undefined)
             }
-            // We don't use POLL_DELAY for fetching notebook files, since this needs to be reflected more rapidly
-            // to the user and also doesn't involve any API calls, only scanning the directory for ipynb files.
-            timeoutId = window.setTimeout(poll, 2500)
+            timeoutId = window.setTimeout(poll, value !== undefined ? 0 : POLL_DELAY)
         }
         poll()
         return () => {
             cancelled = true
             window.clearTimeout(timeoutId)
         }
-    }, [])
+    }, [wsConnected])
 
     return (
         <AssignmentContext.Provider value={{